@@ -7,7 +7,8 @@ from flask import Flask
 from sqlalchemy import select, func
 
 from models import Base, Purchase
-from db import engine, db
+from db import db, ensure_schema, init_app as init_db_session
+from cli import register_cli
 
 from routes.purchase import bp_purchase
 from routes.tickets import bp_tickets
@@ -15,6 +16,9 @@ from routes.ftp import bp_ftp
 from routes.webhooks import bp_webhooks
 from routes.admin import bp_admin
 from app_services.finalize_purchase import finalize_purchase_factory
+from app_services import (
+    background, db_metrics, expiry, finalize_recovery, metrics, profiler, reconcile, storage_gc, ticket_sig,
+)
 from routes.admin_tickets import bp_admin_tickets
 from routes.admin_pending import bp_admin_pending
 from routes.admin_panel import bp_admin_panel
@@ -26,6 +30,10 @@ from routes.admin_shows import bp_admin_shows
 from routes.home import bp_home
 from routes.admin_reservations import bp_admin_reservations
 from routes.whatsapp import bp_whats
+from routes.admin_profiler import bp_admin_profiler
+from routes.admin_bank_import import bp_admin_bank_import
+from routes.admin_archive import bp_admin_archive
+from routes.admin_sales import bp_admin_sales
 
 
 load_dotenv()
@@ -46,8 +54,25 @@ def create_app() -> Flask:
         os.getenv("TICKET_BASE_IMAGE_PATH", "static/ticket_base.png")
     ).resolve()
 
-    # cria tabelas
-    Base.metadata.create_all(engine)
+    # ✅ schema é criado por `flask --app wsgi init-db` (build do Render).
+    # Em dev dá pra manter o comportamento antigo com DB_AUTO_CREATE=1.
+    if os.getenv("DB_AUTO_CREATE") == "1":
+        ensure_schema(Base.metadata)
+
+    # ✅ 1 sessão de banco por request (fechada no teardown)
+    init_db_session(app)
+
+    # ✅ contagem/tempo de SQL por request + log de queries lentas
+    db_metrics.init_app(app)
+
+    # ✅ /metrics (Prometheus) + latência por endpoint
+    metrics.init_app(app)
+
+    # ✅ profiler sob demanda (armado em /admin/profiler)
+    profiler.init_app(app)
+
+    # ✅ chaves do QR assinado conferidas no boot
+    ticket_sig.init_app(app)
 
     # ✅ BLUEPRINTS
     app.register_blueprint(bp_home)
@@ -67,11 +92,32 @@ def create_app() -> Flask:
     app.register_blueprint(bp_admin_shows)
     app.register_blueprint(bp_admin_reservations)
     app.register_blueprint(bp_whats)
+    app.register_blueprint(bp_admin_profiler)
+    app.register_blueprint(bp_admin_bank_import)
+    app.register_blueprint(bp_admin_archive)
+    app.register_blueprint(bp_admin_sales)
 
 
     # ✅ pluga o finalizador
     app.extensions["finalize_purchase"] = finalize_purchase_factory()
 
+    # ✅ fila de jobs em background (e-mails em lote, finalização)
+    background.init_app(app)
+
+    # ✅ varredura de Pix/reservas vencidas (libera lotação)
+    expiry.init_app(app)
+
+    # ✅ conciliação com PagBank/MP (webhook perdido)
+    reconcile.init_app(app)
+
+    # ✅ limpeza do disco local (cota + idade)
+    storage_gc.init_app(app)
+
+    # ✅ compra paga sem ingressos (fila do background perdida no restart)
+    finalize_recovery.init_app(app)
+
+    register_cli(app)
+
     # ✅ badges globais pro admin
     @app.context_processor
     def inject_admin_badges():
@@ -90,6 +136,3 @@ def create_app() -> Flask:
         return data
 
     return app  # ✅ AGORA ESTÁ NO LUGAR CERTO
-
-
-app = create_app()
@@ -0,0 +1,141 @@
+# app_services/archive.py
+"""
+Arquivo de temporada: compras de shows que já passaram saem das tabelas
+quentes (purchases/payments/tickets) para purchases_archive,
+payments_archive e tickets_archive (mesmas colunas e ids + archived_at).
+
+Cada lote (ARCHIVE_BATCH compras, padrão 500) é UMA transação:
+INSERT ... SELECT nas 3 tabelas de arquivo + DELETE nas quentes. Se cair no
+meio, nada fica pela metade e é só rodar de novo.
+
+Quais shows: os da tabela `shows` cuja data (date_text) passou há mais de
+ARCHIVE_AFTER_DAYS (padrão 7) — ou os nomes passados no CLI:
+
+    flask --app wsgi archive-season --dry-run
+    flask --app wsgi archive-season --show "Show X" --show "Show Y"
+
+Relatórios que precisam da história toda usam purchases_union() (UNION ALL
+das duas tabelas, com a coluna `archived`).
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, insert, literal, select, union_all
+
+from db import db
+from app_services import occupancy
+from models import (
+    Payment, PaymentArchive, Purchase, PurchaseArchive, Show, Ticket, TicketArchive,
+)
+
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+
+# (tabela quente, tabela de arquivo, coluna que liga à compra)
+_PAIRS = (
+    (Purchase, PurchaseArchive, "id"),
+    (Payment, PaymentArchive, "purchase_id"),
+    (Ticket, TicketArchive, "purchase_id"),
+)
+
+
+def now_sp():
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+def past_shows(now: Optional[datetime] = None) -> List[str]:
+    """Nomes dos shows cuja data passou há mais de ARCHIVE_AFTER_DAYS."""
+    from routes.home import _parse_show_datetime
+
+    now = now or now_sp()
+    cutoff = now - timedelta(days=int(os.getenv("ARCHIVE_AFTER_DAYS", "7")))
+    with db() as s:
+        shows = s.execute(select(Show.name, Show.date_text)).all()
+    out = []
+    for name, date_text in shows:
+        dt = _parse_show_datetime(date_text or "")
+        # sem ano no texto o parser pode jogar para o ano que vem: aí não arquiva (seguro)
+        if dt is not None and dt < cutoff:
+            out.append(name)
+    return out
+
+
+def counts(show_names: List[str]) -> Dict[str, int]:
+    """Compras por show que seriam arquivadas (para o --dry-run)."""
+    if not show_names:
+        return {}
+    with db() as s:
+        rows = s.execute(
+            select(Purchase.show_name, func.count())
+            .where(Purchase.show_name.in_(show_names))
+            .group_by(Purchase.show_name)
+        ).all()
+    return {name: int(n) for name, n in rows}
+
+
+def _copy(s, hot, cold, link: str, ids: List[int], now: datetime) -> None:
+    cols = [c.name for c in hot.__table__.columns]
+    src = select(*[hot.__table__.c[c] for c in cols], literal(now).label("archived_at")).where(
+        hot.__table__.c[link].in_(ids)
+    )
+    s.execute(insert(cold.__table__).from_select(cols + ["archived_at"], src))
+
+
+def _archive_batch(s, ids: List[int], now: datetime) -> None:
+    for hot, cold, link in _PAIRS:
+        _copy(s, hot, cold, link, ids, now)
+    # filhos primeiro (FK), compra por último
+    for hot, _, link in reversed(_PAIRS):
+        s.execute(
+            delete(hot)
+            .where(getattr(hot, link).in_(ids))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def archive_shows(show_names: List[str]) -> Dict[str, Any]:
+    """Arquiva tudo dos shows dados. Retorna {"purchases", "batches"}."""
+    result = {"purchases": 0, "batches": 0}
+    if not show_names:
+        return result
+
+    size = max(1, int(os.getenv("ARCHIVE_BATCH", "500")))
+    now = now_sp()
+    while True:
+        with db(fresh=True) as s:
+            ids = list(s.scalars(
+                select(Purchase.id)
+                .where(Purchase.show_name.in_(show_names))
+                .order_by(Purchase.id)
+                .limit(size)
+            ))
+            if not ids:
+                break
+            _archive_batch(s, ids, now)
+            # compras saíram sem passar pela máquina de estados: contador recalcula se precisar
+            occupancy.invalidate_shows(s, show_names)
+            s.commit()
+        result["purchases"] += len(ids)
+        result["batches"] += 1
+        if len(ids) < size:
+            break
+    return result
+
+
+def purchases_union():
+    """
+    UNION ALL compras quentes + arquivadas (mesmas colunas + `archived` 0/1).
+    Use como subquery: sel = purchases_union().subquery(); select(sel.c.show_name, ...)
+    """
+    cols = [c.name for c in Purchase.__table__.columns]
+    live = select(*[Purchase.__table__.c[c] for c in cols], literal(0).label("archived"))
+    old = select(*[PurchaseArchive.__table__.c[c] for c in cols], literal(1).label("archived"))
+    return union_all(live, old)
+
+
+def payments_union():
+    cols = [c.name for c in Payment.__table__.columns]
+    live = select(*[Payment.__table__.c[c] for c in cols])
+    old = select(*[PaymentArchive.__table__.c[c] for c in cols])
+    return union_all(live, old)
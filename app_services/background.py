@@ -0,0 +1,92 @@
+# app_services/background.py
+"""
+Fila de trabalho em background (in-process, sem broker externo).
+
+Um worker thread por processo executa os jobs em ordem, dentro de um
+app_context, para e-mails em lote e finalização de ingressos não
+segurarem o request do admin.
+Se o app não foi inicializado (ex.: script/CLI), o job roda na hora.
+
+periodic(): tarefa recorrente numa thread própria (varreduras), iniciada
+no 1º request — comandos do CLI (init-db etc.) não sobem threads.
+"""
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable
+
+_jobs: "queue.Queue[tuple[Callable[..., Any], tuple, dict]]" = queue.Queue()
+_app = None
+_worker: threading.Thread | None = None
+_lock = threading.Lock()
+
+
+def init_app(app) -> None:
+    global _app
+    _app = app
+
+
+def queue_depth() -> int:
+    return _jobs.qsize()
+
+
+def enqueue(fn: Callable[..., Any], *args, **kwargs) -> None:
+    if _app is None:
+        fn(*args, **kwargs)
+        return
+    _ensure_worker()
+    _jobs.put((fn, args, kwargs))
+
+
+def _ensure_worker() -> None:
+    global _worker
+    with _lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_run, name="background-jobs", daemon=True)
+            _worker.start()
+
+
+def _run() -> None:
+    while True:
+        fn, args, kwargs = _jobs.get()
+        try:
+            with _app.app_context():
+                fn(*args, **kwargs)
+        except Exception:
+            _app.logger.exception("[BACKGROUND] job %s falhou", getattr(fn, "__name__", fn))
+        finally:
+            _jobs.task_done()
+
+
+_periodic: dict[str, threading.Thread] = {}
+
+
+def _periodic_loop(app, name: str, interval: float, fn: Callable[[], Any]) -> None:
+    # jitter: workers que sobem juntos não rodam no mesmo segundo
+    time.sleep(random.uniform(0, min(interval, 30)))
+    while True:
+        try:
+            with app.app_context():
+                fn()
+        except Exception:
+            app.logger.exception("[PERIODIC] %s falhou", name)
+        time.sleep(interval)
+
+
+def periodic(app, name: str, interval: float, fn: Callable[[], Any]) -> None:
+    """Roda fn() a cada `interval` segundos (0 desliga), a partir do 1º request."""
+    if interval <= 0:
+        return
+
+    @app.before_request
+    def _start_periodic():
+        if name in _periodic:
+            return
+        with _lock:
+            if name not in _periodic:
+                t = threading.Thread(
+                    target=_periodic_loop, args=(app, name, interval, fn), name=name, daemon=True,
+                )
+                _periodic[name] = t
+                t.start()
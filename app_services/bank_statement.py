@@ -0,0 +1,354 @@
+# app_services/bank_statement.py
+"""
+Extrato bancário (OFX ou CSV) → sugestões de "Pix manual pago".
+
+1) parse_statement(): lê só os CRÉDITOS do extrato (valor, data, texto,
+   FITID). CSV aceita ";" ou "," e número/data no formato brasileiro.
+2) match_credits(): índice em memória {valor em centavos: compras pendentes
+   ordenadas por created_at} e, dentro de cada valor, índice invertido por
+   CPF inteiro, miolo do CPF mascarado (***.456.789-**) e nome. Para cada
+   crédito, só as compras do mesmo valor que dividem CPF/nome com ele, na
+   janela de tempo (bisect), são pontuadas; valor sozinho só casa quando a
+   janela tem uma compra. A atribuição final é gulosa pela maior pontuação
+   (1 crédito ↔ 1 compra). Compras com só 1 nome em comum e sem CPF nunca
+   passam de "baixa": ficam só as WEAK_KEEP melhores por crédito. Mesmo com
+   um preço só para o show inteiro, 5000 linhas × 3000 pendentes < 1 s
+   (bench/bank_match.py).
+
+Nada é gravado aqui: a tela do admin mostra as propostas e a confirmação vai
+pelo POST /admin/bulk/mark-paid que já existe.
+"""
+import csv
+import heapq
+import io
+import re
+import unicodedata
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional, Tuple
+
+# palavras que aparecem no histórico do banco e não são nome de gente
+_STOPWORDS = {
+    "pix", "recebido", "recebida", "transferencia", "transf", "ted", "doc", "credito", "cred",
+    "de", "da", "do", "das", "dos", "e", "conta", "ag", "pagamento", "pgto", "ltda", "me", "sa",
+}
+
+_CPF_FULL = re.compile(r"\b(\d{3})\.?(\d{3})\.?(\d{3})-?(\d{2})\b")
+_CPF_MASKED = re.compile(r"[*xX]{3}\.?(\d{3})\.?(\d{3})-?[*xX]{2}")
+
+_EPOCH = datetime(1970, 1, 1)
+
+# candidatos "fracos" (só 1 nome em comum, sem CPF) guardados por crédito
+WEAK_KEEP = 8
+
+
+# =========================================================
+# Parse
+# =========================================================
+def _decode(raw: bytes) -> str:
+    for enc in ("utf-8-sig", "cp1252"):
+        try:
+            return raw.decode(enc)
+        except UnicodeDecodeError:
+            continue
+    return raw.decode("latin-1", errors="replace")
+
+
+def _to_cents(value: str) -> Optional[int]:
+    s = (value or "").strip().replace("R$", "").replace(" ", "")
+    if not s:
+        return None
+    negative = s.startswith("-") or s.endswith("-") or (s.startswith("(") and s.endswith(")"))
+    s = s.strip("-()+")
+    if "," in s and s.rfind(",") > s.rfind("."):
+        s = s.replace(".", "").replace(",", ".")  # pt-BR: "." milhar, "," decimal
+    else:
+        s = s.replace(",", "")
+    try:
+        cents = int((Decimal(s) * 100).quantize(Decimal("1")))
+    except InvalidOperation:
+        return None
+    return -cents if negative else cents
+
+
+def _parse_ofx_date(value: str) -> Optional[datetime]:
+    digits = re.match(r"\d{8}(\d{6})?", (value or "").strip())
+    if not digits:
+        return None
+    raw = digits.group(0)
+    if len(raw) == 14:
+        return datetime.strptime(raw, "%Y%m%d%H%M%S")
+    return _end_of_day(datetime.strptime(raw, "%Y%m%d"))
+
+
+def _end_of_day(d: datetime) -> datetime:
+    # extrato só com a data: o crédito pode ser de qualquer hora daquele dia
+    return d + timedelta(days=1, seconds=-1)
+
+
+def _parse_br_date(value: str) -> Optional[datetime]:
+    v = (value or "").strip()
+    for fmt in ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%Y-%m-%d %H:%M:%S"):
+        try:
+            return datetime.strptime(v, fmt)
+        except ValueError:
+            continue
+    for fmt in ("%d/%m/%Y", "%d/%m/%y", "%Y-%m-%d"):
+        try:
+            return _end_of_day(datetime.strptime(v, fmt))
+        except ValueError:
+            continue
+    return None
+
+
+def parse_ofx(text: str) -> List[Dict[str, Any]]:
+    """OFX 1.x (SGML) ou 2.x (XML): um dict por <STMTTRN> de crédito."""
+    credits = []
+    for block in re.findall(r"<STMTTRN>(.*?)(?=</STMTTRN>|<STMTTRN>|</BANKTRANLIST>)", text, re.S | re.I):
+        fields = {k.upper(): v.strip() for k, v in re.findall(r"<(\w+)>([^<\r\n]*)", block)}
+        cents = _to_cents(fields.get("TRNAMT", ""))
+        if cents is None or cents <= 0:
+            continue
+        credits.append({
+            "fitid": fields.get("FITID", ""),
+            "amount_cents": cents,
+            "posted_at": _parse_ofx_date(fields.get("DTPOSTED", "")),
+            "text": " ".join(x for x in (fields.get("NAME", ""), fields.get("MEMO", "")) if x),
+        })
+    return credits
+
+
+_CSV_DATE = ("data", "date", "dt", "data lancamento", "data movimento")
+_CSV_AMOUNT = ("valor", "amount", "valor (r$)", "credito", "valor rs")
+_CSV_TEXT = ("descricao", "historico", "memo", "lancamento", "detalhe", "nome", "description")
+_CSV_ID = ("id", "fitid", "documento", "identificador", "nr documento")
+
+
+def _norm_header(h: str) -> str:
+    h = unicodedata.normalize("NFKD", h or "").encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"\s+", " ", h.strip().lower())
+
+
+def parse_csv(text: str) -> List[Dict[str, Any]]:
+    sample = text[:4096]
+    delimiter = ";" if sample.count(";") >= sample.count(",") else ","
+    rows = list(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+    # cabeçalho = primeira linha com colunas de data e valor reconhecíveis
+    for i, row in enumerate(rows[:20]):
+        heads = [_norm_header(c) for c in row]
+        col = {}
+        for key, names in (("date", _CSV_DATE), ("amount", _CSV_AMOUNT), ("text", _CSV_TEXT), ("id", _CSV_ID)):
+            col[key] = next((j for j, h in enumerate(heads) if h in names), None)
+        if col["date"] is not None and col["amount"] is not None:
+            break
+    else:
+        raise ValueError("CSV sem colunas de data e valor reconhecíveis.")
+
+    text_cols = [j for j, h in enumerate(heads) if h in _CSV_TEXT]
+    credits = []
+    for n, row in enumerate(rows[i + 1:], start=1):
+        if len(row) <= max(col["date"], col["amount"]):
+            continue
+        cents = _to_cents(row[col["amount"]])
+        if cents is None or cents <= 0:
+            continue
+        credits.append({
+            "fitid": row[col["id"]].strip() if col["id"] is not None and col["id"] < len(row) else f"linha-{n}",
+            "amount_cents": cents,
+            "posted_at": _parse_br_date(row[col["date"]]),
+            "text": " ".join(row[j].strip() for j in text_cols if j < len(row) and row[j].strip()),
+        })
+    return credits
+
+
+def parse_statement(raw: bytes, filename: str = "") -> List[Dict[str, Any]]:
+    text = _decode(raw)
+    if filename.lower().endswith(".ofx") or "<OFX>" in text[:2000].upper():
+        return parse_ofx(text)
+    return parse_csv(text)
+
+
+# =========================================================
+# Match
+# =========================================================
+def _name_tokens(value: str) -> set:
+    v = unicodedata.normalize("NFKD", value or "").encode("ascii", "ignore").decode("ascii").lower()
+    return {t for t in re.findall(r"[a-z]{2,}", v) if t not in _STOPWORDS}
+
+
+def _cpfs_in(text: str) -> Tuple[set, set]:
+    """CPFs do histórico: (inteiros, miolos de 6 dígitos dos mascarados)."""
+    full = {"".join(m.groups()) for m in _CPF_FULL.finditer(text)}
+    masked = {"".join(m.groups()) for m in _CPF_MASKED.finditer(text)}
+    return full, masked
+
+
+def _match_keys(cpf_digits: str, names: set) -> List[tuple]:
+    """Chaves do índice invertido de uma compra: CPF inteiro, miolo do CPF e cada nome."""
+    keys: List[tuple] = [("nome", n) for n in names]
+    if cpf_digits and len(cpf_digits) == 11:
+        keys += [("cpf", cpf_digits), ("miolo", cpf_digits[3:9])]
+    return keys
+
+
+def build_index(pending: List[Dict[str, Any]]) -> Dict[int, Dict[str, Any]]:
+    """
+    {amount_cents: {"at": [created_at ordenado], "secs": [o mesmo em segundos],
+                    "n_names": [...], "rows": [...], "keys": {chave: [posições]}}}
+
+    Preço × qtd se repete muito (um show = poucos valores para milhares de
+    compras): dentro do valor, "keys" leva do CPF/miolo/nome às posições em
+    "rows" (crescentes, então bisect recorta a janela de tempo também).
+    """
+    buckets: Dict[int, List[Dict[str, Any]]] = {}
+    for p in pending:
+        p["_names"] = _name_tokens(p.get("buyer_name") or "")
+        buckets.setdefault(p["amount_cents"], []).append(p)
+    index = {}
+    for amount, rows in buckets.items():
+        rows.sort(key=lambda r: r["created_at"])
+        keys: Dict[tuple, List[int]] = {}
+        for pos, r in enumerate(rows):
+            for k in _match_keys(r.get("cpf_digits") or "", r["_names"]):
+                keys.setdefault(k, []).append(pos)
+        index[amount] = {
+            "at": [r["created_at"] for r in rows],
+            "secs": [_secs(r["created_at"]) for r in rows],
+            "n_names": [len(r["_names"]) for r in rows],
+            "max_names": max(len(r["_names"]) for r in rows),
+            "rows": rows,
+            "keys": keys,
+        }
+    return index
+
+
+def _secs(dt: datetime) -> float:
+    return (dt - _EPOCH).total_seconds()
+
+
+def _candidates(bucket: Dict[str, Any], lo: int, hi: int, names: set, cpfs: Tuple[set, set]) -> Dict[int, list]:
+    """
+    {posição em rows: [nomes em comum, nota do CPF]} das compras em
+    rows[lo:hi] que dividem CPF, miolo de CPF ou nome com o crédito (as
+    únicas que pontuam). A nota sai da própria chave (1.0 CPF inteiro, 0.7
+    miolo), sem comparar conjuntos de novo.
+    Só o valor vale quando a janela tem uma compra só.
+    """
+    full, masked = cpfs
+    found: Dict[int, list] = {}
+    for kind, values, cpf in (("nome", names, 0.0), ("miolo", masked, 0.7), ("cpf", full, 1.0)):
+        for v in values:
+            positions = bucket["keys"].get((kind, v))
+            if not positions:
+                continue
+            for pos in positions[bisect_left(positions, lo):bisect_left(positions, hi)]:
+                hit = found.get(pos)
+                if hit is None:
+                    hit = found[pos] = [0, 0.0]
+                if cpf:
+                    hit[1] = max(hit[1], cpf)
+                else:
+                    hit[0] += 1
+    if not found and hi - lo == 1:
+        found[lo] = [0, 0.0]
+    return found
+
+
+def match_credits(
+    credits: List[Dict[str, Any]],
+    pending: List[Dict[str, Any]],
+    *,
+    window: timedelta = timedelta(hours=72),
+    slack: timedelta = timedelta(minutes=30),
+) -> List[Dict[str, Any]]:
+    """
+    pending: [{"purchase_id", "token", "buyer_name", "cpf_digits", "amount_cents", "created_at"}]
+    Crédito só casa com compra criada entre (crédito - window) e (crédito + slack).
+    Retorna 1 dict por crédito: {"credit", "purchase" | None, "score", "confidence", "reasons"}.
+    """
+    index = build_index(pending)
+    by_id = {p["purchase_id"]: p for p in pending}
+    ranked: Dict[int, list] = {}  # crédito -> [(score, purchase_id, cpf, nome)] do maior pro menor
+    window_s = window.total_seconds()
+
+    for ci, c in enumerate(credits):
+        bucket = index.get(c["amount_cents"])
+        if not bucket:
+            continue
+        at = c["posted_at"]
+        if at is not None:
+            lo = bisect_left(bucket["at"], at - window)
+            hi = bisect_right(bucket["at"], at + slack)
+        else:
+            lo, hi = 0, len(bucket["rows"])
+        if lo >= hi:
+            continue
+        names = _name_tokens(c["text"])
+        n_names = len(names)
+        at_s = _secs(at) if at is not None else None
+        rows, secs, n_lens = bucket["rows"], bucket["secs"], bucket["n_names"]
+        # nome = fração dos nomes do menor conjunto presentes no outro (extrato
+        # costuma abreviar; só "ANA" vale no máximo 50%), com a interseção já
+        # contada pelo índice: divisor = max(2, min(nomes do crédito, da compra))
+        divisor = [max(2, min(n_names, k)) for k in range(bucket["max_names"] + 1)]
+        strong, weak = [], []
+        for pos, (shared, cpf) in _candidates(bucket, lo, hi, names, _cpfs_in(c["text"])).items():
+            name = shared / divisor[n_lens[pos]] if shared else 0.0
+            score = 10 + cpf * 60 + name * 40
+            if at_s is not None:
+                # mais perto no tempo desempata (até +5)
+                d = at_s - secs[pos]
+                if d < 0:
+                    d = -d
+                if d < window_s:
+                    score += 5 - 5 * d / window_s
+            (weak if shared == 1 and not cpf else strong).append((score, -pos, cpf, name))
+        if len(weak) > WEAK_KEEP:
+            # 1 nome em comum e sem CPF: nota <= 35, nunca pré-marcada; basta a ponta
+            weak = heapq.nlargest(WEAK_KEEP, weak)
+        cands = strong + weak
+        if cands:
+            cands.sort(reverse=True)  # empate: compra criada antes (-pos)
+            ranked[ci] = [(score, rows[-npos]["purchase_id"], cpf, name) for score, npos, cpf, name in cands]
+
+    # atribuição gulosa pela maior pontuação: cada crédito anda na própria
+    # lista até achar compra livre (empate: crédito que veio antes no extrato)
+    heap = [(-cands[0][0], ci, 0) for ci, cands in ranked.items()]
+    heapq.heapify(heap)
+    used_purchase = set()
+    chosen: Dict[int, tuple] = {}
+    while heap:
+        _, ci, k = heapq.heappop(heap)
+        cands = ranked[ci]
+        score, pid, cpf, name = cands[k]
+        if pid in used_purchase:
+            if k + 1 < len(cands):
+                heapq.heappush(heap, (-cands[k + 1][0], ci, k + 1))
+            continue
+        used_purchase.add(pid)
+        reasons = ["valor"]
+        if cpf:
+            reasons.append("CPF" if cpf == 1.0 else "CPF parcial")
+        if name:
+            reasons.append(f"nome {int(name * 100)}%")
+        chosen[ci] = (score, pid, reasons)
+
+    # 2ª melhor pontuação de cada crédito (ambiguidade)
+    runner_up = {ci: cands[1][0] for ci, cands in ranked.items() if len(cands) > 1}
+
+    out = []
+    for ci, c in enumerate(credits):
+        if ci not in chosen:
+            out.append({"credit": c, "purchase": None, "score": 0, "confidence": "", "reasons": []})
+            continue
+        score, pid, reasons = chosen[ci]
+        confidence = "alta" if score >= 60 else ("media" if score >= 35 else "baixa")
+        # ✅ outro candidato quase empatado (nome comum, sem CPF): nunca vem pré-marcado
+        if score - runner_up.get(ci, 0.0) < 10:
+            confidence = "baixa"
+            reasons = reasons + ["ambíguo"]
+        out.append({"credit": c, "purchase": by_id[pid], "score": round(score, 1),
+                    "confidence": confidence, "reasons": reasons})
+    return out
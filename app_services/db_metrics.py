@@ -0,0 +1,132 @@
+# app_services/db_metrics.py
+"""
+Instrumentação de SQL por request (eventos do SQLAlchemy no engine).
+
+- Conta queries e tempo total de banco em cada request.
+- Loga queries lentas (DB_SLOW_QUERY_MS, padrão 200) com os parâmetros
+  mascarados (só os tipos aparecem no log; CPF/e-mail não vazam).
+- Em debug, para admin logado ou com DB_METRICS_HEADERS=1, devolve os headers
+  X-DB-Queries / X-DB-Time-ms / Server-Timing.
+- max_queries(n): helper de teste que falha se um bloco passar de n queries.
+
+    from app_services.db_metrics import max_queries
+    with max_queries(6):
+        client.get("/admin/pending")
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, session
+from sqlalchemy import event
+
+log = logging.getLogger("db.slow")
+
+_local = threading.local()
+_installed = False
+
+
+def _slow_ms() -> float:
+    return float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+
+
+def _redact(params) -> str:
+    if params is None:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}=<{type(v).__name__}>" for k, v in params.items()) + "}"
+    if isinstance(params, (list, tuple)):
+        if params and isinstance(params[0], (list, tuple, dict)):
+            return f"<{len(params)} linhas>"
+        return "(" + ", ".join(f"<{type(v).__name__}>" for v in params) + ")"
+    return f"<{type(params).__name__}>"
+
+
+def _short_sql(statement: str, limit: int = 500) -> str:
+    sql = re.sub(r"\s+", " ", statement or "").strip()
+    return sql if len(sql) <= limit else sql[:limit] + "…"
+
+
+def _record(elapsed: float) -> None:
+    if has_request_context():
+        stats = g.get("_db_stats")
+        if stats is None:
+            stats = g._db_stats = {"count": 0, "time": 0.0}
+        stats["count"] += 1
+        stats["time"] += elapsed
+
+    for counter in getattr(_local, "counters", ()):
+        counter["count"] += 1
+
+
+def install(engine) -> None:
+    """Registra os listeners no engine (uma vez por processo)."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("_query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get("_query_start")
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        _record(elapsed)
+
+        if elapsed * 1000 >= _slow_ms():
+            log.warning(
+                "[SLOW SQL] %.1f ms: %s params=%s",
+                elapsed * 1000, _short_sql(statement), _redact(parameters),
+            )
+
+
+def request_stats() -> dict:
+    """{'count': n, 'time': segundos} do request atual."""
+    if not has_request_context():
+        return {"count": 0, "time": 0.0}
+    return dict(g.get("_db_stats") or {"count": 0, "time": 0.0})
+
+
+def init_app(app) -> None:
+    from db import engine
+
+    install(engine)
+    always = os.getenv("DB_METRICS_HEADERS", "0") == "1"
+
+    @app.after_request
+    def _db_headers(resp):
+        if not (always or app.debug or session.get("is_admin")):
+            return resp
+        stats = request_stats()
+        ms = stats["time"] * 1000
+        resp.headers["X-DB-Queries"] = str(stats["count"])
+        resp.headers["X-DB-Time-ms"] = f"{ms:.1f}"
+        resp.headers.add("Server-Timing", f'db;dur={ms:.1f};desc="{stats["count"]} queries"')
+        return resp
+
+
+@contextmanager
+def max_queries(limit: int):
+    """
+    Falha (AssertionError) se o bloco executar mais de `limit` queries
+    na thread atual. Pensado para testes/CI com o test_client do Flask.
+    """
+    counter = {"count": 0}
+    counters = getattr(_local, "counters", None)
+    if counters is None:
+        counters = _local.counters = []
+    counters.append(counter)
+    try:
+        yield counter
+    finally:
+        counters.remove(counter)
+    if counter["count"] > limit:
+        raise AssertionError(f"{counter['count']} queries executadas (máximo {limit}).")
@@ -1,11 +1,18 @@
+import logging
 import os
 import ssl
 import smtplib
 import threading
+import time
+from contextlib import contextmanager
 from typing import Optional, Dict, List, Any
 from email.message import EmailMessage
 from datetime import datetime
 
+from app_services.metrics import SMTP_SEND
+
+log = logging.getLogger(__name__)
+
 
 def _cfg() -> Dict[str, object]:
     return {
@@ -21,7 +28,13 @@ def _cfg() -> Dict[str, object]:
     }
 
 
-def send_email(
+def _check_cfg(cfg: Dict[str, object]) -> None:
+    if not cfg["host"] or not cfg["user"] or not cfg["password"] or not cfg["from_addr"]:
+        raise RuntimeError("Configure SMTP_HOST/SMTP_PORT/SMTP_USERNAME/SMTP_PASSWORD/SMTP_FROM no Render.")
+
+
+def _build_message(
+    cfg: Dict[str, object],
     *,
     to_email: str,
     subject: str,
@@ -29,22 +42,7 @@ def send_email(
     body_html: Optional[str] = None,
     reply_to: Optional[str] = None,
     attachments: Optional[List[Dict[str, Any]]] = None,
-) -> str:
-    """
-    Envia e-mail via SMTP com suporte a anexos.
-    Retorna o Message-ID (string) para rastreamento.
-
-    attachments: lista de dicts no formato:
-      {
-        "filename": "comprovante.pdf",
-        "content_type": "application/pdf",
-        "data": b"...bytes..."
-      }
-    """
-    cfg = _cfg()
-    if not cfg["host"] or not cfg["user"] or not cfg["password"] or not cfg["from_addr"]:
-        raise RuntimeError("Configure SMTP_HOST/SMTP_PORT/SMTP_USERNAME/SMTP_PASSWORD/SMTP_FROM no Render.")
-
+) -> EmailMessage:
     msg = EmailMessage()
     msg["From"] = f'{cfg["from_name"]} <{cfg["from_addr"]}>'
     msg["To"] = to_email
@@ -75,41 +73,141 @@ def send_email(
 
         msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
 
-    timeout = int(cfg["timeout"])
-    debug = bool(cfg["debug"])
+    return msg
+
 
-    def _smtp_send(smtp_obj):
-        if debug:
-            smtp_obj.set_debuglevel(1)  # imprime conversa SMTP nos logs
-        smtp_obj.send_message(msg)
+@contextmanager
+def _smtp_session(cfg: Dict[str, object]):
+    """Abre conexão SMTP autenticada (STARTTLS 587 / SSL 465 / fallback)."""
+    timeout = int(cfg["timeout"])
 
     # 587 STARTTLS
     if cfg["tls"] and cfg["port"] == 587:
-        with smtplib.SMTP(cfg["host"], cfg["port"], timeout=timeout) as smtp:
-            smtp.ehlo()
-            smtp.starttls(context=ssl.create_default_context())
-            smtp.login(cfg["user"], cfg["password"])
-            _smtp_send(smtp)
-        return str(msg.get("Message-ID") or "")
+        smtp = smtplib.SMTP(cfg["host"], cfg["port"], timeout=timeout)
+        smtp.ehlo()
+        smtp.starttls(context=ssl.create_default_context())
 
     # 465 SSL direto (se SMTP_TLS=0 e porta 465)
-    if (not cfg["tls"]) and cfg["port"] == 465:
-        with smtplib.SMTP_SSL(cfg["host"], cfg["port"], timeout=timeout, context=ssl.create_default_context()) as smtp:
-            smtp.login(cfg["user"], cfg["password"])
-            _smtp_send(smtp)
-        return str(msg.get("Message-ID") or "")
+    elif (not cfg["tls"]) and cfg["port"] == 465:
+        smtp = smtplib.SMTP_SSL(cfg["host"], cfg["port"], timeout=timeout, context=ssl.create_default_context())
 
     # fallback
-    with smtplib.SMTP(cfg["host"], cfg["port"], timeout=timeout) as smtp:
+    else:
+        smtp = smtplib.SMTP(cfg["host"], cfg["port"], timeout=timeout)
         smtp.ehlo()
         if cfg["tls"]:
             smtp.starttls(context=ssl.create_default_context())
+
+    with smtp:
         smtp.login(cfg["user"], cfg["password"])
-        _smtp_send(smtp)
+        if cfg["debug"]:
+            smtp.set_debuglevel(1)  # imprime conversa SMTP nos logs
+        yield smtp
+
+
+def send_email(
+    *,
+    to_email: str,
+    subject: str,
+    body_text: str,
+    body_html: Optional[str] = None,
+    reply_to: Optional[str] = None,
+    attachments: Optional[List[Dict[str, Any]]] = None,
+) -> str:
+    """
+    Envia e-mail via SMTP com suporte a anexos.
+    Retorna o Message-ID (string) para rastreamento.
+
+    attachments: lista de dicts no formato:
+      {
+        "filename": "comprovante.pdf",
+        "content_type": "application/pdf",
+        "data": b"...bytes..."
+      }
+    """
+    cfg = _cfg()
+    _check_cfg(cfg)
+
+    msg = _build_message(
+        cfg,
+        to_email=to_email,
+        subject=subject,
+        body_text=body_text,
+        body_html=body_html,
+        reply_to=reply_to,
+        attachments=attachments,
+    )
+
+    start = time.perf_counter()
+    try:
+        with _smtp_session(cfg) as smtp:
+            smtp.send_message(msg)
+    except Exception:
+        SMTP_SEND.labels(result="error").observe(time.perf_counter() - start)
+        raise
+    SMTP_SEND.labels(result="ok").observe(time.perf_counter() - start)
 
     return str(msg.get("Message-ID") or "")
 
 
+def send_emails(messages: List[Dict[str, Any]]) -> List[Optional[Exception]]:
+    """
+    Envia vários e-mails reaproveitando UMA conexão SMTP.
+    messages: lista de kwargs de send_email.
+    Retorna, na mesma ordem, None (enviado) ou a exceção daquele e-mail.
+    Se a conexão cair no meio, reconecta uma vez e segue; se cair de novo, o
+    que não foi enviado volta com o erro (nunca None). Erro só ao fechar
+    a conexão (QUIT) vira aviso no log: o que foi aceito conta como enviado.
+    """
+    results: List[Optional[Exception]] = [None] * len(messages)
+    if not messages:
+        return results
+
+    cfg = _cfg()
+    try:
+        _check_cfg(cfg)
+    except RuntimeError as e:
+        return [e] * len(messages)
+
+    pending = list(range(len(messages)))
+    for _attempt in range(2):
+        if not pending:
+            break
+        retry: List[int] = []
+        answered: set = set()  # já tem resultado do servidor (enviado ou recusado)
+        try:
+            with _smtp_session(cfg) as smtp:
+                for i in pending:
+                    start = time.perf_counter()
+                    try:
+                        smtp.send_message(_build_message(cfg, **messages[i]))
+                        results[i] = None
+                        SMTP_SEND.labels(result="ok").observe(time.perf_counter() - start)
+                    except smtplib.SMTPServerDisconnected as e:
+                        # ✅ este e os seguintes ficam com o erro até a reconexão enviá-los
+                        retry = pending[pending.index(i):]
+                        for j in retry:
+                            results[j] = e
+                        break
+                    except Exception as e:
+                        results[i] = e
+                        SMTP_SEND.labels(result="error").observe(time.perf_counter() - start)
+                    answered.add(i)
+        except Exception as e:
+            unsent = [i for i in pending if i not in answered and i not in retry]
+            if not unsent:
+                # ✅ falha só no QUIT/fechamento: os e-mails já foram entregues, não reenvia
+                log.warning("[SMTP] erro ao fechar a conexão depois do lote (%s e-mails): %s", len(answered), e)
+            else:
+                # conexão/login falhou: quem não foi tentado fica com o erro
+                for i in unsent:
+                    results[i] = e
+                break
+        pending = retry
+
+    return results
+
+
 def send_email_async(**kwargs) -> None:
     """
     Dispara send_email em uma thread (não bloqueia o request).
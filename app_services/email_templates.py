@@ -457,3 +457,53 @@ def build_reservation_received_email(
 </html>"""
 
     return subject, text, html
+
+
+def build_expired_email(
+    *,
+    buyer_name: str,
+    show_name: str,
+    token: str,
+    payment: bool,
+) -> tuple[str, str, str]:
+    """
+    Aviso de Pix/reserva expirada (sweeper em app_services/expiry.py).
+    payment=True: Pix não pago no prazo; False: reserva não confirmada.
+    """
+    what = "o pagamento Pix" if payment else "a reserva"
+    subject = f"Prazo encerrado — {show_name}"
+    buy_url = f"{_base_url()}/" if _base_url() else ""
+
+    text = "\n".join([
+        f"Olá, {buyer_name}!",
+        "",
+        f"O prazo para {what} de {show_name} terminou e os lugares foram liberados.",
+        f"Token: {token}",
+        "",
+        "Se ainda quiser ir, é só fazer uma nova reserva" + (f": {buy_url}" if buy_url else "."),
+        "Se você já pagou, responde este e-mail com o comprovante que a gente resolve.",
+    ])
+
+    button = (
+        f'<a href="{buy_url}" style="display:inline-block;margin-top:12px;padding:10px 16px;'
+        f'background:#111827;color:#fff;border-radius:10px;text-decoration:none;">Fazer nova reserva</a>'
+        if buy_url else ""
+    )
+    html = f"""
+    <div style="font-family:Arial,sans-serif;max-width:640px;margin:0 auto;padding:16px">
+      <h2 style="margin:0 0 8px 0">Prazo encerrado</h2>
+      <div style="color:#666;margin-bottom:16px">{show_name}</div>
+
+      <div style="border:1px solid #eee;border-radius:14px;padding:14px;font-size:14px;line-height:1.6">
+        Olá, <b>{buyer_name}</b>! O prazo para {what} terminou e os lugares foram liberados.
+        <div style="color:#666;font-size:12px;margin-top:8px"><b>Token:</b> {token}</div>
+      </div>
+
+      {button}
+
+      <div style="color:#666;font-size:12px;margin-top:12px">
+        Se você já pagou, responde este e-mail com o comprovante que a gente resolve.
+      </div>
+    </div>
+    """
+    return subject, text, html
@@ -0,0 +1,190 @@
+# app_services/expiry.py
+"""
+Varredura de Pix/reservas vencidas: libera a lotação presa.
+
+- Pix (pending_payment): vence em Payment.expires_at (PagBank ou, no Pix
+  manual, MANUAL_PIX_EXPIRES_MINUTES depois da compra; padrão 72h, o mesmo
+  PIX_MATCH_WINDOW_HOURS da importação de extrato). Pagamento sem expires_at
+  (compras antigas) NUNCA expira aqui, nem quem já mandou comprovante: o
+  admin ainda vai conferir.
+- Reservas (reservation_pending*): só com RESERVATION_PENDING_TTL_HOURS > 0.
+
+Vencidas viram status "expired" em UPDATEs por lote (SWEEP_BATCH), saem do
+SUM de lotação do buy_post e da fila do /admin/pending, e os tickets "pending"
+do pré-render são apagados. EXPIRY_NOTIFY=1 avisa os compradores por e-mail
+(1 conexão SMTP por lote).
+
+Roda pelo CLI (`flask --app wsgi expire-pending`) ou por uma thread a cada
+EXPIRY_SWEEP_SECONDS (padrão 0 = desligada; ex.: 300 liga). Uma trava no banco
+(advisory lock) garante uma varredura por vez entre workers/instâncias.
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, exists, select, update
+
+from db import advisory_lock, db
+from models import Payment, Purchase, Ticket
+
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+
+RESERVATION_STATUSES = ("reservation_pending", "reservation_pending_price")
+
+
+def now_sp():
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+def manual_pix_ttl() -> timedelta:
+    # ✅ 72h: transferência feita no 2º/3º dia ainda casa na importação de extrato
+    return timedelta(minutes=int(os.getenv("MANUAL_PIX_EXPIRES_MINUTES", "4320")))
+
+
+def manual_pix_expires_at() -> datetime:
+    """Prazo do Pix manual gravado em Payment.expires_at no buy_post."""
+    return now_sp() + manual_pix_ttl()
+
+
+def _batch_size() -> int:
+    return max(1, int(os.getenv("SWEEP_BATCH", "500")))
+
+
+def _overdue_payments(now: datetime):
+    has_receipt = exists().where(Payment.purchase_id == Purchase.id, Payment.receipt_sha256.is_not(None))
+    overdue = exists().where(
+        Payment.purchase_id == Purchase.id,
+        Payment.status == "pending",
+        Payment.expires_at < now,  # NULL (legado, sem prazo gravado) não entra
+    )
+    return (
+        select(Purchase.id)
+        .where(Purchase.status == "pending_payment", overdue, ~has_receipt)
+        .order_by(Purchase.id)
+        .limit(_batch_size())
+    )
+
+
+def _overdue_reservations(now: datetime):
+    hours = int(os.getenv("RESERVATION_PENDING_TTL_HOURS", "0"))
+    if hours <= 0:
+        return None
+    return (
+        select(Purchase.id)
+        .where(Purchase.status.in_(RESERVATION_STATUSES), Purchase.created_at < now - timedelta(hours=hours))
+        .order_by(Purchase.id)
+        .limit(_batch_size())
+    )
+
+
+def _expire_batch(s, ids: List[int], from_statuses) -> List[Dict[str, Any]]:
+    """Um lote: UPDATE compras/pagamentos + DELETE tickets pending + feed. Retorna as expiradas."""
+    from app_services import purchase_state
+    from app_services.live_feed import publish_many
+
+    # só as que mudam de fato (o admin pode ter confirmado no meio tempo)
+    changed = purchase_state.transition_many(s, ids, "expired", actor="expiry", from_statuses=from_statuses)
+    done = [r["purchase_id"] for r in changed]
+    rows = s.execute(
+        select(Purchase.id, Purchase.token, Purchase.buyer_name, Purchase.buyer_email, Purchase.show_name)
+        .where(Purchase.id.in_(done))
+    ).all() if done else []
+    if done:
+        s.execute(
+            update(Payment)
+            .where(Payment.purchase_id.in_(done), Payment.status == "pending")
+            .values(status="expired")
+            .execution_options(synchronize_session=False)
+        )
+        s.execute(
+            delete(Ticket)
+            .where(Ticket.purchase_id.in_(done), Ticket.status == "pending")
+            .execution_options(synchronize_session=False)
+        )
+        publish_many(s, [(r.id, r.token, "expired") for r in rows], "expired")
+    s.commit()
+    return [r._asdict() for r in rows]
+
+
+def sweep() -> Dict[str, Any]:
+    """
+    Uma rodada completa. Retorna {"skipped", "payments", "reservations", "notify"}.
+    "notify" = itens para notify_expired() (o chamador decide se envia agora
+    ou em background).
+    """
+    result: Dict[str, Any] = {"skipped": False, "payments": 0, "reservations": 0, "notify": []}
+
+    with advisory_lock("expiry-sweeper") as ok:
+        if not ok:
+            result["skipped"] = True
+            return result
+
+        now = now_sp()
+        jobs = [
+            ("payments", _overdue_payments(now), ("pending_payment",), True),
+            ("reservations", _overdue_reservations(now), RESERVATION_STATUSES, False),
+        ]
+        for key, stmt, from_statuses, is_payment in jobs:
+            if stmt is None:
+                continue
+            while True:
+                with db(fresh=True) as s:
+                    ids = list(s.scalars(stmt))
+                    if not ids:
+                        break
+                    expired = _expire_batch(s, ids, from_statuses)
+                result[key] += len(expired)
+                result["notify"] += [dict(it, payment=is_payment) for it in expired]
+                if len(ids) < _batch_size() or not expired:
+                    break
+
+    return result
+
+
+def notify_expired(items: List[Dict[str, Any]]) -> None:
+    """E-mails de aviso em lotes de EXPIRY_NOTIFY_BATCH (1 conexão SMTP por lote)."""
+    from flask import current_app
+
+    from app_services.email_service import send_emails
+    from app_services.email_templates import build_expired_email
+
+    items = [it for it in items if (it.get("buyer_email") or "").strip()]
+    size = max(1, int(os.getenv("EXPIRY_NOTIFY_BATCH", "50")))
+    for i in range(0, len(items), size):
+        chunk = items[i:i + size]
+        messages = []
+        for it in chunk:
+            subject, text, html = build_expired_email(
+                buyer_name=it["buyer_name"] or "",
+                show_name=it["show_name"] or "",
+                token=it["token"],
+                payment=it["payment"],
+            )
+            messages.append({"to_email": it["buyer_email"].strip(), "subject": subject,
+                             "body_text": text, "body_html": html})
+        for it, err in zip(chunk, send_emails(messages)):
+            if err is not None:
+                current_app.logger.warning("[EXPIRY EMAIL] falhou token=%s err=%s", it["token"], err)
+
+
+def notify_enabled() -> bool:
+    return os.getenv("EXPIRY_NOTIFY", "0") == "1"
+
+
+def _sweep_and_notify() -> None:
+    from flask import current_app
+
+    from app_services import background
+
+    res = sweep()
+    if res["payments"] or res["reservations"]:
+        current_app.logger.info("[EXPIRY] pix=%s reservas=%s", res["payments"], res["reservations"])
+    if res["notify"] and notify_enabled():
+        background.enqueue(notify_expired, res["notify"])
+
+
+def init_app(app) -> None:
+    from app_services import background
+
+    background.periodic(app, "expiry-sweeper", float(os.getenv("EXPIRY_SWEEP_SECONDS", "0")), _sweep_and_notify)
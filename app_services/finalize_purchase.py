@@ -10,16 +10,12 @@ from flask import current_app
 from sqlalchemy import select
 
 from db import db
-from models import Purchase, Payment, Ticket, Event
+from models import Purchase, Payment, Ticket, Event, Show
 from config_ticket import QR_SIZE_PX
 
-from app_services.ticket_generator import (
-    generate_single_ticket_png,
-    make_qr_image,
-    paste_qr_on_png,
-    slug_filename,
-)
+from app_services import ticket_sig
 from app_services.ftp_uploader import upload_file
+from app_services.metrics import FINALIZE_TOTAL, PAID_TO_TICKETS, stage
 
 # no topo
 from zoneinfo import ZoneInfo
@@ -51,29 +47,6 @@ def _names_from_purchase(p: Purchase) -> List[str]:
     return names
 
 
-def _make_single_pdf_from_png(png_path: Path, pdf_path: Path) -> None:
-    """
-    PDF individual (1 página) a partir do PNG (já com QR).
-    """
-    from PIL import Image
-    img = Image.open(png_path).convert("RGB")
-    pdf_path.parent.mkdir(parents=True, exist_ok=True)
-    img.save(pdf_path)
-
-
-def _make_pdf_from_pngs(png_paths: List[Path], pdf_path: Path) -> None:
-    """
-    PDF geral (várias páginas) a partir dos PNGs (já com QR).
-    """
-    from PIL import Image
-    if not png_paths:
-        raise RuntimeError("Nenhum PNG para gerar PDF geral.")
-    imgs = [Image.open(p).convert("RGB") for p in png_paths]
-    first, rest = imgs[0], imgs[1:]
-    pdf_path.parent.mkdir(parents=True, exist_ok=True)
-    first.save(pdf_path, save_all=True, append_images=rest)
-
-
 def _make_zip(files: List[Path], zip_path: Path) -> None:
     zip_path.parent.mkdir(parents=True, exist_ok=True)
     with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as z:
@@ -90,21 +63,152 @@ def _assert_no_slash(name: str, what: str) -> None:
         raise RuntimeError(f"{what} inválido (não pode conter pastas): {name}")
 
 
+def _font_paths() -> tuple[Path, Path]:
+    return (
+        Path(os.getenv("TICKET_FONT_SHOW", "static/fonts/Kalam-Bold.ttf")).resolve(),
+        Path(os.getenv("TICKET_FONT_NAME", "static/fonts/Kalam-Bold.ttf")).resolve(),
+    )
+
+
+def _pdf_layout():
+    from app_services.ticket_pdf import TicketPdfLayout
+
+    return TicketPdfLayout(current_app.config["TICKET_BASE_IMAGE_PATH"], *_font_paths())
+
+
+def show_id_for(s, show_name: str) -> int:
+    """Id do show que vai no QR assinado (0 se o show não existe mais)."""
+    return int(s.scalar(select(Show.id).where(Show.name == show_name).order_by(Show.id).limit(1)) or 0)
+
+
+def _ticket_url(base_url: str, t: Ticket, show_id: int) -> str:
+    # emissão vem do ticket: PNG, PDF individual e PDF geral levam o MESMO QR
+    issued = t.issued_at or now_sp()
+    return ticket_sig.ticket_url(
+        base_url, ticket_id=t.id, token=t.token, show_id=show_id,
+        issued_at=int(issued.replace(tzinfo=SAO_PAULO_TZ).timestamp()),
+    )
+
+
+def new_tickets(s, purchase: Purchase, names: List[str], *, status: str) -> List[Ticket]:
+    """1 Ticket por pessoa (token + id alocados já aqui, via flush)."""
+    tickets: List[Ticket] = []
+    for idx, person_name in enumerate(names, start=1):
+        t = Ticket(
+            event_id=purchase.event_id,
+            purchase_id=purchase.id,
+            show_name=purchase.show_name or "",
+            buyer_name=purchase.buyer_name,
+            buyer_email=purchase.buyer_email,
+            buyer_phone=purchase.buyer_phone,
+            person_name=person_name,
+            person_type="buyer" if idx == 1 else "guest",
+            token=secrets.token_urlsafe(18),
+            status=status,
+            issued_at=now_sp(),
+        )
+        s.add(t)
+        tickets.append(t)
+    s.flush()  # garante t.id
+    return tickets
+
+
+def render_ticket_files(
+    tickets: List[Ticket],
+    *,
+    local_dir: Path,
+    event_slug: str,
+    base_url: str,
+    show_id: int = 0,
+) -> tuple[List[Path], List[Path]]:
+    """
+    Gera PNG (show + nome + QR individual, ver _ticket_url) e PDF de 1 página
+    para cada ticket. Retorna (pngs, pdfs) na ordem dos tickets.
+    """
+    # qrcode/Pillow/reportlab só carregam na primeira renderização (boot mais leve)
+    from app_services.ticket_generator import generate_single_ticket_png, make_qr_image
+
+    base_image_path: Path = current_app.config["TICKET_BASE_IMAGE_PATH"]
+    font_show_path, font_names_path = _font_paths()
+    layout = _pdf_layout()
+
+    local_dir.mkdir(parents=True, exist_ok=True)
+    png_paths: List[Path] = []
+    pdf_paths: List[Path] = []
+
+    for t in tickets:
+        qr_data = _ticket_url(base_url, t, show_id)
+
+        # ✅ QR individual do ticket
+        with stage("qr"):
+            qr_img = make_qr_image(qr_data, size_px=QR_SIZE_PX)
+
+        # gera PNG com show + nome + QR (paleta/zlib em ticket_generator.encode_png)
+        with stage("render"):
+            png_path = generate_single_ticket_png(
+                storage_dir=local_dir,
+                event_slug=event_slug,
+                ticket_id=t.id,
+                person_name=t.person_name,
+                show_name=t.show_name,
+                base_image_path=base_image_path,
+                font_show_path=font_show_path,
+                font_names_path=font_names_path,
+                qr_img=qr_img,
+                qr_margin=40,
+            )
+
+        # ✅ PDF individual em vetor (arte + texto + QR), não o PNG rasterizado
+        pdf_path = (png_path.parent / (png_path.stem + ".pdf")).resolve()
+        with stage("pdf"):
+            layout.write(pdf_path, [(t.show_name, t.person_name, qr_data)])
+
+        png_paths.append(png_path)
+        pdf_paths.append(pdf_path)
+
+    return png_paths, pdf_paths
+
+
+def render_bundle(
+    local_dir: Path,
+    token: str,
+    tickets: List[Ticket],
+    png_paths: List[Path],
+    pdf_paths: List[Path],
+    *,
+    base_url: str,
+    show_id: int = 0,
+) -> tuple[Path, Path]:
+    """PDF geral (1 fundo compartilhado entre as páginas) + ZIP da compra. Retorna (pdf_all, zip)."""
+    pdf_all_path = (local_dir / f"{token}-ingressos.pdf").resolve()
+    with stage("pdf"):
+        _pdf_layout().write(
+            pdf_all_path,
+            [(t.show_name, t.person_name, _ticket_url(base_url, t, show_id)) for t in tickets],
+        )
+
+    zip_path = (local_dir / f"{token}-ingressos.zip").resolve()
+    with stage("zip"):
+        _make_zip([pdf_all_path] + pdf_paths + png_paths, zip_path)
+
+    return pdf_all_path, zip_path
+
+
 def finalize_purchase_factory() -> Callable[[int], None]:
     """
     Ao confirmar pagamento (webhook/admin):
-    - cria 1 Ticket por pessoa
-    - gera PNG/PDF individual com QR individual (/ticket/<ticket.token>)
+    - reaproveita o pré-render (tickets "pending" + arquivos) se ainda bater
+      com a compra; senão cria 1 Ticket por pessoa e renderiza na hora
+    - gera PNG/PDF individual com QR individual (/T/<payload assinado> ou /ticket/<ticket.token>)
     - faz upload FTP e salva URL pública em Ticket.png_path / Ticket.pdf_path
     - também gera bundle (PDF geral + ZIP) e salva em Payment.tickets_pdf_url / tickets_zip_url
     """
 
     def finalize(purchase_id: int) -> None:
-        storage_dir: Path = current_app.config["STORAGE_DIR"]
-        base_image_path: Path = current_app.config["TICKET_BASE_IMAGE_PATH"]
+        from app_services import prerender
+        from app_services.ticket_generator import derivative_paths, slug_filename
 
-        font_show_path = Path(os.getenv("TICKET_FONT_SHOW", "static/fonts/Kalam-Bold.ttf")).resolve()
-        font_names_path = Path(os.getenv("TICKET_FONT_NAME", "static/fonts/Kalam-Bold.ttf")).resolve()
+        storage_dir: Path = current_app.config["STORAGE_DIR"]
 
         public_base = (os.getenv("FTP_PUBLIC_BASE") or "").strip().rstrip("/")
         if not public_base:
@@ -116,7 +220,7 @@ def finalize_purchase_factory() -> Callable[[int], None]:
         if not base_url:
             raise RuntimeError("BASE_URL não configurado.")
 
-        with db() as s:
+        with prerender.purchase_lock(purchase_id), db() as s:
             purchase: Optional[Purchase] = s.get(Purchase, purchase_id)
             if not purchase:
                 return
@@ -146,89 +250,59 @@ def finalize_purchase_factory() -> Callable[[int], None]:
             # evento
             ev: Optional[Event] = s.get(Event, purchase.event_id)
             event_slug = (ev.slug if ev else "evento")
-            show_name = purchase.show_name or ""
-
             names = _names_from_purchase(purchase) or ["Convidado"]
 
             # pasta local por compra
             local_dir = (storage_dir / "tickets" / purchase.token).resolve()
             local_dir.mkdir(parents=True, exist_ok=True)
 
-            png_paths: List[Path] = []
-            pdf_paths: List[Path] = []
-
-            # ✅ gera ingressos individuais
-            for idx, person_name in enumerate(names, start=1):
-                t = Ticket(
-                    event_id=purchase.event_id,
-                    purchase_id=purchase.id,
-                    show_name=show_name,
-                    buyer_name=purchase.buyer_name,
-                    buyer_email=purchase.buyer_email,
-                    buyer_phone=purchase.buyer_phone,
-                    person_name=person_name,
-                    person_type="buyer" if idx == 1 else "guest",
-                    token=secrets.token_urlsafe(18),
-                    status="issued",
-                    issued_at=now_sp(),
+            # ✅ pré-render válido: só vira status e publica
+            ready = prerender.load(s, purchase, local_dir=local_dir, event_slug=event_slug, base_url=base_url)
+            if ready:
+                tickets, png_paths, pdf_paths = ready["tickets"], ready["png"], ready["pdf"]
+                pdf_all_path, zip_path = ready["bundle_pdf"], ready["zip"]
+                for t in tickets:
+                    # issued_at fica o do pré-render: é a emissão assinada no QR dos arquivos
+                    t.status = "issued"
+                prerender.forget(local_dir)
+            else:
+                prerender.discard(s, purchase.id, local_dir)
+                tickets = new_tickets(s, purchase, names, status="issued")
+                show_id = show_id_for(s, purchase.show_name)
+                png_paths, pdf_paths = render_ticket_files(
+                    tickets, local_dir=local_dir, event_slug=event_slug, base_url=base_url, show_id=show_id,
                 )
-                s.add(t)
-                s.flush()  # garante t.id
-
-                # ✅ QR individual do ticket
-                qr_target_url = f"{base_url}/ticket/{t.token}"
-                qr_img = make_qr_image(qr_target_url, size_px=QR_SIZE_PX)
-
-
-                # gera PNG com show + nome
-                png_path = generate_single_ticket_png(
-                    storage_dir=local_dir,
-                    event_slug=event_slug,
-                    ticket_id=t.id,
-                    person_name=person_name,
-                    show_name=show_name,
-                    base_image_path=base_image_path,
-                    font_show_path=font_show_path,
-                    font_names_path=font_names_path,
+                pdf_all_path, zip_path = render_bundle(
+                    local_dir, purchase.token, tickets, png_paths, pdf_paths, base_url=base_url, show_id=show_id,
                 )
 
-                # cola QR no PNG
-                paste_qr_on_png(png_path, qr_img, margin=40)
-
-                # gera PDF individual (1 página) a partir do PNG (já com QR)
-                pdf_path = (png_path.parent / (png_path.stem + ".pdf")).resolve()
-                _make_single_pdf_from_png(png_path, pdf_path)
-
-                png_paths.append(png_path)
-                pdf_paths.append(pdf_path)
-
+            for t, png_path, pdf_path in zip(tickets, png_paths, pdf_paths):
                 # ✅ nome do arquivo baseado em nome+sobreNome (slug) + id (evita colisão)
-                safe_name = slug_filename(person_name)
+                safe_name = slug_filename(t.person_name)
                 png_remote = f"{safe_name}-{t.id}.png"
                 pdf_remote = f"{safe_name}-{t.id}.pdf"
 
                 _assert_no_slash(png_remote, "png_remote")
                 _assert_no_slash(pdf_remote, "pdf_remote")
 
-                ok_png, info_png = upload_file(png_path, png_remote)
-                if not ok_png:
-                    raise RuntimeError(str(info_png))
+                with stage("ftp_upload"):
+                    ok_png, info_png = upload_file(png_path, png_remote)
+                    if not ok_png:
+                        raise RuntimeError(str(info_png))
 
-                ok_pdf, info_pdf = upload_file(pdf_path, pdf_remote)
-                if not ok_pdf:
-                    raise RuntimeError(str(info_pdf))
+                    ok_pdf, info_pdf = upload_file(pdf_path, pdf_remote)
+                    if not ok_pdf:
+                        raise RuntimeError(str(info_pdf))
+
+                    # WebP/AVIF opcionais (TICKET_PNG_DERIVATIVES): mesma URL do PNG, outra extensão
+                    for extra in derivative_paths(png_path):
+                        ok_extra, info_extra = upload_file(extra, f"{safe_name}-{t.id}{extra.suffix}")
+                        if not ok_extra:
+                            raise RuntimeError(str(info_extra))
 
                 # salva URL pública no Ticket (links individuais)
                 t.png_path = f"{public_base}/{png_remote}"
                 t.pdf_path = f"{public_base}/{pdf_remote}"
-                s.add(t)
-
-            # ✅ bundle (PDF geral + ZIP)
-            pdf_all_path = (local_dir / f"{purchase.token}-ingressos.pdf").resolve()
-            _make_pdf_from_pngs(png_paths, pdf_all_path)
-
-            zip_path = (local_dir / f"{purchase.token}-ingressos.zip").resolve()
-            _make_zip([pdf_all_path] + pdf_paths + png_paths, zip_path)
 
             # ✅ aqui é a correção principal: REMOTO = somente NOME do arquivo
             pdf_all_remote = pdf_all_path.name
@@ -237,13 +311,14 @@ def finalize_purchase_factory() -> Callable[[int], None]:
             _assert_no_slash(pdf_all_remote, "pdf_all_remote")
             _assert_no_slash(zip_remote, "zip_remote")
 
-            ok_pdf_all, info_pdf_all = upload_file(pdf_all_path, pdf_all_remote)
-            if not ok_pdf_all:
-                raise RuntimeError(str(info_pdf_all))
+            with stage("ftp_upload"):
+                ok_pdf_all, info_pdf_all = upload_file(pdf_all_path, pdf_all_remote)
+                if not ok_pdf_all:
+                    raise RuntimeError(str(info_pdf_all))
 
-            ok_zip, info_zip = upload_file(zip_path, zip_remote)
-            if not ok_zip:
-                raise RuntimeError(str(info_zip))
+                ok_zip, info_zip = upload_file(zip_path, zip_remote)
+                if not ok_zip:
+                    raise RuntimeError(str(info_zip))
 
             payment.tickets_pdf_url = f"{public_base}/{pdf_all_remote}"
             payment.tickets_zip_url = f"{public_base}/{zip_remote}"
@@ -252,10 +327,21 @@ def finalize_purchase_factory() -> Callable[[int], None]:
             s.add(payment)
             s.commit()
 
-            print("[FINALIZE] FTP_PUBLIC_BASE:", public_base)
-            print("[FINALIZE] purchase", purchase.id)
-            print("[FINALIZE] tickets:", len(names))
-            print("[FINALIZE] bundle PDF:", payment.tickets_pdf_url)
-            print("[FINALIZE] bundle ZIP:", payment.tickets_zip_url)
+            if payment.paid_at:
+                PAID_TO_TICKETS.observe(max(0.0, (payment.tickets_generated_at - payment.paid_at).total_seconds()))
+
+            current_app.logger.info(
+                "[FINALIZE] purchase=%s tickets=%s prerender=%s pdf=%s zip=%s",
+                purchase.id, len(tickets), bool(ready), payment.tickets_pdf_url, payment.tickets_zip_url,
+            )
+
+    def finalize_measured(purchase_id: int) -> None:
+        try:
+            with stage("total"):
+                finalize(purchase_id)
+        except Exception:
+            FINALIZE_TOTAL.labels(result="error").inc()
+            raise
+        FINALIZE_TOTAL.labels(result="ok").inc()
 
-    return finalize
+    return finalize_measured
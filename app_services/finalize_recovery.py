@@ -0,0 +1,97 @@
+# app_services/finalize_recovery.py
+"""
+Rede de segurança da finalização: compra paga que ficou sem ingressos.
+
+A finalização em lote (mark-paid em massa, conciliação) vai para a fila
+in-process do background; restart/deploy no meio perde a fila e a compra
+fica "paid" sem PDF/ZIP. A varredura acha essas compras e finaliza de novo:
+
+- status "paid", pagamento pago sem tickets_pdf_url/tickets_zip_url;
+- a transição para "paid" (purchase_transitions, UTC) tem mais de
+  FINALIZE_RECOVERY_MIN_AGE_MINUTES (padrão 15): a fila normal já teve
+  tempo, e compras pagas antes do log de transições não entram (nada de
+  reprocessar o legado no primeiro deploy);
+- FINALIZE_RECOVERY_BATCH por rodada (padrão 20), finalização em linha.
+
+Roda pelo CLI (`flask --app wsgi finalize-stuck`) ou a cada
+FINALIZE_RECOVERY_SECONDS (padrão 600; 0 desliga), com advisory lock.
+A finalização é idempotente (bundle já gerado = nada a fazer).
+"""
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from sqlalchemy import exists, or_, select
+
+from db import advisory_lock, db
+from models import Payment, Purchase, PurchaseTransition
+
+
+def _batch_size() -> int:
+    return max(1, int(os.getenv("FINALIZE_RECOVERY_BATCH", "20")))
+
+
+def stuck_ids(s, *, limit: int) -> List[int]:
+    """Compras pagas há mais de MIN_AGE sem bundle de ingressos (mais antigas primeiro)."""
+    min_age = timedelta(minutes=int(os.getenv("FINALIZE_RECOVERY_MIN_AGE_MINUTES", "15")))
+    paid_long_ago = exists().where(
+        PurchaseTransition.purchase_id == Purchase.id,
+        PurchaseTransition.to_status == "paid",
+        PurchaseTransition.created_at < datetime.utcnow() - min_age,
+    )
+    paid_payment = exists().where(Payment.purchase_id == Purchase.id, Payment.status == "paid")
+    # mesma idempotência do finalize: bundle (PDF ou ZIP) já gerado = finalizada
+    with_bundle = exists().where(
+        Payment.purchase_id == Purchase.id,
+        or_(Payment.tickets_pdf_url.is_not(None), Payment.tickets_zip_url.is_not(None)),
+    )
+    return list(s.scalars(
+        select(Purchase.id)
+        .where(Purchase.status == "paid", paid_long_ago, paid_payment, ~with_bundle)
+        .order_by(Purchase.id)
+        .limit(limit)
+    ))
+
+
+def recover() -> Dict[str, Any]:
+    """
+    Uma rodada. Retorna {"skipped", "found", "finalized", "errors"}.
+    Roda dentro de um app_context (finalizador em current_app.extensions).
+    """
+    from flask import current_app
+
+    result: Dict[str, Any] = {"skipped": False, "found": 0, "finalized": 0, "errors": []}
+
+    finalize_fn = current_app.extensions.get("finalize_purchase")
+    if not callable(finalize_fn):
+        return result
+
+    with advisory_lock("finalize-recovery") as ok:
+        if not ok:
+            result["skipped"] = True
+            return result
+
+        with db(fresh=True) as s:
+            ids = stuck_ids(s, limit=_batch_size())
+        result["found"] = len(ids)
+        if ids:
+            # ✅ alguém fica sabendo: compra paga sem ingresso não passa em silêncio
+            current_app.logger.warning("[FINALIZE RECOVERY] compras pagas sem ingressos: %s", ids)
+
+        for pid in ids:
+            try:
+                finalize_fn(pid)
+                result["finalized"] += 1
+            except Exception as e:
+                result["errors"].append((pid, str(e)))
+                current_app.logger.exception("[FINALIZE RECOVERY] finalização falhou purchase_id=%s", pid)
+
+    return result
+
+
+def init_app(app) -> None:
+    from app_services import background
+
+    background.periodic(
+        app, "finalize-recovery", float(os.getenv("FINALIZE_RECOVERY_SECONDS", "600")), recover,
+    )
@@ -1,8 +1,8 @@
 # app_services/ftp_uploader.py
 import os
-from ftplib import FTP, FTP_TLS
+from ftplib import FTP, FTP_TLS, error_perm
 from pathlib import Path
-from typing import Tuple, Dict, Any
+from typing import Any, Dict, List, Tuple
 
 
 def _cfg():
@@ -62,9 +62,14 @@ def _ensure_remote_dir(ftp, remote_dir: str):
             ftp.cwd(part)
 
 
-def upload_file(local_path: str | Path, remote_filename: str) -> Tuple[bool, Dict[str, Any] | str]:
+def upload_files(files: List[Tuple[str | Path, str]]) -> Tuple[bool, List[Dict[str, Any]] | str]:
+    """
+    Vários arquivos numa sessão FTP só (1 connect/TLS/login/cwd para todos).
+    files = [(caminho_local, nome_remoto), ...]. Se um host falhar no meio,
+    tenta o próximo desde o início.
+    """
     cfg = _cfg()
-    local_path = str(local_path)
+    last = "[FTP ERRO] nenhum host tentado"
 
     for host in cfg["hosts"]:
         try:
@@ -76,13 +81,57 @@ def upload_file(local_path: str | Path, remote_filename: str) -> Tuple[bool, Dic
                 username=cfg["username"],
                 password=cfg["password"],
             )
+            done = []
             with ftp:
                 _ensure_remote_dir(ftp, cfg["dir"])
-                with open(local_path, "rb") as f:
-                    ftp.storbinary(f"STOR {remote_filename}", f)
+                for local_path, remote_filename in files:
+                    with open(str(local_path), "rb") as f:
+                        ftp.storbinary(f"STOR {remote_filename}", f)
+                    public_url = f"{cfg['public_base']}/{remote_filename}" if cfg["public_base"] else ""
+                    done.append({"host": host, "file": remote_filename, "public_url": public_url})
+            return True, done
+
+        except Exception as e:
+            last = f"[FTP ERRO] host={host} -> {e}"
+
+    return False, last
+
+
+def upload_file(local_path: str | Path, remote_filename: str) -> Tuple[bool, Dict[str, Any] | str]:
+    ok, info = upload_files([(local_path, remote_filename)])
+    return (True, info[0]) if ok else (False, info)
+
+
+def delete_files(remote_filenames: List[str]) -> Tuple[bool, Dict[str, int] | str]:
+    """
+    Apaga vários arquivos numa sessão FTP só. Arquivo que já não existe
+    (550) conta como "missing", não como erro — o job pode rodar de novo.
+    """
+    cfg = _cfg()
+    last = "[FTP ERRO] nenhum host tentado"
 
-            public_url = f"{cfg['public_base']}/{remote_filename}" if cfg["public_base"] else ""
-            return True, {"host": host, "file": remote_filename, "public_url": public_url}
+    for host in cfg["hosts"]:
+        try:
+            ftp = _ftp_connect(
+                host=host,
+                port=cfg["port"],
+                security=cfg["security"],
+                passive=cfg["passive"],
+                username=cfg["username"],
+                password=cfg["password"],
+            )
+            stats = {"deleted": 0, "missing": 0}
+            with ftp:
+                _ensure_remote_dir(ftp, cfg["dir"])
+                for name in remote_filenames:
+                    try:
+                        ftp.delete(name)
+                        stats["deleted"] += 1
+                    except error_perm as e:
+                        if not str(e).startswith("550"):
+                            raise
+                        stats["missing"] += 1
+            return True, stats
 
         except Exception as e:
             last = f"[FTP ERRO] host={host} -> {e}"
@@ -0,0 +1,116 @@
+# app_services/live_feed.py
+"""
+Feed ao vivo das compras (SSE do /admin/pending).
+
+- publish(): grava um PurchaseEvent na MESMA sessão/transação da mudança e,
+  depois do commit, acorda os streams deste processo (pub/sub em memória).
+- Outros workers do gunicorn enxergam o evento pelo cursor no banco
+  (id > último visto), consultado a cada LIVE_FEED_POLL_SECONDS.
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, select, delete, func, insert
+
+from db import db
+from models import Purchase, PurchaseEvent
+
+
+class _Broker:
+    """Condition + contador: streams esperam até o contador mudar (ou timeout)."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._seq = 0
+
+    @property
+    def seq(self) -> int:
+        return self._seq
+
+    def notify(self) -> None:
+        with self._cond:
+            self._seq += 1
+            self._cond.notify_all()
+
+    def wait(self, seen: int, timeout: float) -> int:
+        with self._cond:
+            self._cond.wait_for(lambda: self._seq != seen, timeout=timeout)
+            return self._seq
+
+
+broker = _Broker()
+
+
+def publish(s, purchase: Purchase, kind: str) -> None:
+    """Registra o evento na sessão `s` (commit fica com o chamador)."""
+    s.add(PurchaseEvent(
+        purchase_id=purchase.id,
+        token=purchase.token,
+        kind=kind,
+        status=purchase.status,
+        created_at=datetime.utcnow(),
+    ))
+    event.listen(s, "after_commit", lambda _s: broker.notify(), once=True)
+
+
+def publish_many(s, rows, kind: str) -> None:
+    """Versão em lote: rows = [(purchase_id, token, status), ...] num único INSERT."""
+    rows = list(rows)
+    if not rows:
+        return
+    now = datetime.utcnow()
+    s.execute(insert(PurchaseEvent), [
+        {"purchase_id": pid, "token": token, "kind": kind, "status": status, "created_at": now}
+        for pid, token, status in rows
+    ])
+    event.listen(s, "after_commit", lambda _s: broker.notify(), once=True)
+
+
+def last_event_id() -> int:
+    with db() as s:
+        return int(s.scalar(select(func.max(PurchaseEvent.id))) or 0)
+
+
+def prune_events(*, older_than_hours: int | None = None) -> None:
+    hours = older_than_hours or int(os.getenv("LIVE_FEED_RETENTION_HOURS", "48"))
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    with db() as s:
+        s.execute(delete(PurchaseEvent).where(PurchaseEvent.created_at < cutoff))
+        s.commit()
+
+
+def _fetch_since(last_id: int, limit: int = 200) -> list:
+    # sessão própria: o stream vive bem mais que o request
+    with db(fresh=True) as s:
+        return list(s.execute(
+            select(PurchaseEvent.id, PurchaseEvent.token, PurchaseEvent.kind, PurchaseEvent.status)
+            .where(PurchaseEvent.id > last_id)
+            .order_by(PurchaseEvent.id.asc())
+            .limit(limit)
+        ).all())
+
+
+def sse_stream(last_id: int):
+    """
+    Gerador text/event-stream. Encerra depois de LIVE_FEED_STREAM_SECONDS;
+    o EventSource reconecta sozinho mandando Last-Event-ID.
+    """
+    poll = float(os.getenv("LIVE_FEED_POLL_SECONDS", "5"))
+    lifetime = float(os.getenv("LIVE_FEED_STREAM_SECONDS", "300"))
+    deadline = time.monotonic() + lifetime
+
+    yield "retry: 3000\n\n"
+
+    seq = broker.seq
+    while time.monotonic() < deadline:
+        rows = _fetch_since(last_id)
+        for r in rows:
+            last_id = r.id
+            data = json.dumps({"token": r.token, "kind": r.kind, "status": r.status})
+            yield f"id: {r.id}\nevent: purchase\ndata: {data}\n\n"
+        if not rows:
+            yield ": ping\n\n"
+        seq = broker.wait(seq, timeout=poll)
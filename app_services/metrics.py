@@ -0,0 +1,172 @@
+# app_services/metrics.py
+"""
+Métricas Prometheus expostas em /metrics.
+
+- Latência por endpoint (histograma), etapas da finalização (render, qr, pdf,
+  zip, ftp_upload), envio SMTP, atraso de webhooks, conciliação, filas e disco.
+- Com várias instâncias do gunicorn, defina PROMETHEUS_MULTIPROC_DIR (antes do
+  boot) para os workers somarem os valores; o gunicorn.conf.py limpa a pasta.
+- prometheus_client é opcional: sem ele tudo vira no-op e /metrics responde 503.
+- /metrics só responde com METRICS_TOKEN definido, e exige
+  `Authorization: Bearer <token>`; sem token é 404 (vendas e filas não ficam
+  públicas na URL do Render).
+"""
+import hmac
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Blueprint, Response, abort, g, request
+
+MULTIPROC_DIR = (os.getenv("PROMETHEUS_MULTIPROC_DIR") or "").strip()
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+try:
+    from prometheus_client import (
+        CONTENT_TYPE_LATEST,
+        CollectorRegistry,
+        Counter,
+        Gauge,
+        Histogram,
+        generate_latest,
+        multiprocess,
+    )
+except ImportError:  # pragma: no cover - dependência opcional
+    Histogram = None
+
+bp_metrics = Blueprint("metrics", __name__)
+
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+_STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 30, 60)
+_LAG_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 900, 3600)
+
+
+class _Noop:
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, *args, **kwargs):
+        pass
+
+    def inc(self, *args, **kwargs):
+        pass
+
+    def set(self, *args, **kwargs):
+        pass
+
+
+if Histogram is not None:
+    REQUEST_LATENCY = Histogram(
+        "http_request_duration_seconds", "Latência das requisições por endpoint",
+        ["endpoint", "method", "status"], buckets=_LATENCY_BUCKETS,
+    )
+    FINALIZE_STAGE = Histogram(
+        "finalize_stage_seconds", "Tempo de cada etapa da finalização de ingressos",
+        ["stage"], buckets=_STAGE_BUCKETS,
+    )
+    FINALIZE_TOTAL = Counter("finalize_total", "Finalizações de compra", ["result"])
+    SMTP_SEND = Histogram(
+        "smtp_send_seconds", "Tempo de envio SMTP (por e-mail)",
+        ["result"], buckets=_STAGE_BUCKETS,
+    )
+    WEBHOOK_LAG = Histogram(
+        "webhook_lag_seconds", "Atraso entre o evento no provedor e o processamento aqui",
+        ["provider"], buckets=_LAG_BUCKETS,
+    )
+    PAID_TO_TICKETS = Histogram(
+        "paid_to_tickets_seconds", "Tempo entre pagamento confirmado e ingressos gerados",
+        buckets=_LAG_BUCKETS,
+    )
+    RECONCILE_CHECKS = Counter(
+        "reconcile_checks_total", "Consultas de conciliação aos provedores", ["provider", "result"],
+    )
+    QUEUE_DEPTH = Gauge(
+        "queue_depth", "Itens aguardando por fila", ["queue"], multiprocess_mode="livemax",
+    )
+    STORAGE_BYTES = Gauge(
+        "storage_bytes", "Uso do STORAGE_DIR por área (última passada do GC)", ["area"],
+        multiprocess_mode="livemax",
+    )
+    PURCHASE_TRANSITIONS = Counter(
+        "purchase_transitions_total", "Mudanças de status de compra", ["from_status", "to_status"],
+    )
+else:
+    REQUEST_LATENCY = FINALIZE_STAGE = FINALIZE_TOTAL = SMTP_SEND = _Noop()
+    WEBHOOK_LAG = PAID_TO_TICKETS = QUEUE_DEPTH = RECONCILE_CHECKS = STORAGE_BYTES = _Noop()
+    PURCHASE_TRANSITIONS = _Noop()
+
+
+@contextmanager
+def timed(metric, **labels):
+    """Mede o bloco e registra no histograma (com labels, se houver)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        (metric.labels(**labels) if labels else metric).observe(time.perf_counter() - start)
+
+
+def stage(name: str):
+    """Atalho: with stage("pdf"): ...  → finalize_stage_seconds{stage="pdf"}"""
+    return timed(FINALIZE_STAGE, stage=name)
+
+
+def _refresh_queue_depths() -> None:
+    """Filas lidas na hora do scrape (baratas: 1 COUNT + tamanho da fila em memória)."""
+    from sqlalchemy import func, select
+
+    from app_services import background
+    from db import db
+    from models import Purchase
+
+    QUEUE_DEPTH.labels(queue="background_jobs").set(background.queue_depth())
+    with db() as s:
+        pending = s.scalar(
+            select(func.count()).select_from(Purchase).where(
+                Purchase.status.in_(["pending_payment", "reservation_pending", "reservation_pending_price"])
+            )
+        ) or 0
+    QUEUE_DEPTH.labels(queue="admin_pending").set(pending)
+
+
+@bp_metrics.get("/metrics")
+def metrics_endpoint():
+    token = (os.getenv("METRICS_TOKEN") or "").strip()
+    if not token:
+        abort(404)
+    if not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        abort(401)
+
+    if Histogram is None:
+        return Response("prometheus_client não instalado\n", status=503, mimetype="text/plain")
+
+    _refresh_queue_depths()
+
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(data, mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app) -> None:
+    app.register_blueprint(bp_metrics)
+
+    @app.before_request
+    def _metrics_start():
+        g._metrics_t0 = time.perf_counter()
+
+    @app.after_request
+    def _metrics_observe(resp):
+        t0 = g.pop("_metrics_t0", None)
+        endpoint = request.endpoint or "404"
+        if t0 is not None and endpoint != "metrics.metrics_endpoint":
+            REQUEST_LATENCY.labels(
+                endpoint=endpoint,
+                method=request.method,
+                status=f"{resp.status_code // 100}xx",
+            ).observe(time.perf_counter() - t0)
+        return resp
@@ -0,0 +1,136 @@
+# app_services/occupancy.py
+"""
+Lotação por show sem SUM em purchases a cada compra.
+
+show_occupancy guarda as pessoas ocupando lugar por (event_id, show_name);
+é uma projeção do log de transições (purchase_state.on_transition): cada
+mudança soma/subtrai ticket_qty na mesma transação. O UPDATE trava a linha
+do show, então duas compras simultâneas no mesmo show serializam ali e o
+buy_post confere a lotação de novo depois de entrar (nada de "estourar" por
+corrida).
+
+Linha ausente = ainda não calculada: nasce do SUM na primeira mudança (ou
+é lida do SUM por current()). Mudanças que não passam pela máquina de
+estados (edição de qtd/show, arquivo) só invalidam a linha.
+
+Se desconfiar do contador: `flask --app wsgi rebuild-occupancy`.
+"""
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from models import Purchase, ShowOccupancy
+
+# status que ocupam lugar no show
+OCCUPYING = ("reservation_pending", "reservation_pending_price", "pending_payment", "paid", "reserved")
+
+Key = Tuple[int, str]
+
+
+def _sum(s, event_id: int, show_name: str) -> int:
+    return int(s.scalar(
+        select(func.coalesce(func.sum(Purchase.ticket_qty), 0))
+        .where(
+            Purchase.event_id == event_id,
+            Purchase.show_name == show_name,
+            Purchase.status.in_(OCCUPYING),
+        )
+    ) or 0)
+
+
+def current(s, event_id: int, show_name: str) -> int:
+    """Pessoas ocupando lugar no show agora."""
+    people = s.scalar(
+        select(ShowOccupancy.people)
+        .where(ShowOccupancy.event_id == event_id, ShowOccupancy.show_name == show_name)
+    )
+    return int(people) if people is not None else _sum(s, event_id, show_name)
+
+
+def _delta(r) -> int:
+    qty = int(r["qty"] or 0)
+    return (qty if r["to_status"] in OCCUPYING else 0) - (qty if r["from_status"] in OCCUPYING else 0)
+
+
+def apply(s, records) -> None:
+    """Projeção: aplica os deltas das transições (status já gravado na sessão)."""
+    deltas: Dict[Key, int] = {}
+    for r in records:
+        d = _delta(r)
+        if d and r["event_id"] is not None and r["show_name"]:
+            key = (r["event_id"], r["show_name"])
+            deltas[key] = deltas.get(key, 0) + d
+
+    now = datetime.utcnow()
+    # ordem fixa de travamento entre transações = sem deadlock entre lotes
+    for (event_id, show_name), d in sorted(deltas.items()):
+        if not d:
+            continue
+        if _bump(s, event_id, show_name, d, now):
+            continue
+        # primeira vez: o SUM já enxerga esta transação (flush feito)
+        try:
+            with s.begin_nested():
+                s.execute(insert(ShowOccupancy).values(
+                    event_id=event_id, show_name=show_name,
+                    people=_sum(s, event_id, show_name), updated_at=now,
+                ))
+        except IntegrityError:
+            # outro worker criou a linha no meio tempo: o valor dele não tem o nosso delta
+            _bump(s, event_id, show_name, d, now)
+
+
+def _bump(s, event_id: int, show_name: str, d: int, now: datetime) -> bool:
+    res = s.execute(
+        update(ShowOccupancy)
+        .where(ShowOccupancy.event_id == event_id, ShowOccupancy.show_name == show_name)
+        .values(people=ShowOccupancy.people + d, updated_at=now)
+        .execution_options(synchronize_session=False)
+    )
+    return bool(res.rowcount)
+
+
+def invalidate(s, keys: Iterable[Key]) -> None:
+    """Descarta os contadores (recalculados do SUM no próximo uso)."""
+    keys = sorted({(e, n) for e, n in keys if e is not None and n})
+    if keys:
+        s.execute(
+            delete(ShowOccupancy)
+            .where(tuple_(ShowOccupancy.event_id, ShowOccupancy.show_name).in_(keys))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def invalidate_shows(s, show_names: List[str]) -> None:
+    if show_names:
+        s.execute(
+            delete(ShowOccupancy)
+            .where(ShowOccupancy.show_name.in_(show_names))
+            .execution_options(synchronize_session=False)
+        )
+
+
+def rebuild(s) -> int:
+    """Recalcula todos os contadores a partir de purchases. Retorna quantos shows."""
+    now = datetime.utcnow()
+    rows = s.execute(
+        select(Purchase.event_id, Purchase.show_name, func.coalesce(func.sum(Purchase.ticket_qty), 0))
+        .where(Purchase.status.in_(OCCUPYING), Purchase.event_id.is_not(None), Purchase.show_name.is_not(None))
+        .group_by(Purchase.event_id, Purchase.show_name)
+    ).all()
+    s.execute(delete(ShowOccupancy))
+    if rows:
+        s.execute(insert(ShowOccupancy), [
+            {"event_id": e, "show_name": n, "people": int(p), "updated_at": now} for e, n, p in rows
+        ])
+    return len(rows)
+
+
+def snapshot(s, event_id: Optional[int] = None) -> Dict[Key, int]:
+    """{(event_id, show_name): pessoas} dos contadores já calculados."""
+    stmt = select(ShowOccupancy.event_id, ShowOccupancy.show_name, ShowOccupancy.people)
+    if event_id is not None:
+        stmt = stmt.where(ShowOccupancy.event_id == event_id)
+    return {(e, n): int(p) for e, n, p in s.execute(stmt).all()}
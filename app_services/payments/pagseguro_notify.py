@@ -9,6 +9,7 @@ from sqlalchemy import select
 
 from db import db
 from models import Payment, Purchase
+from app_services import purchase_state
 
 bp_pagseguro_notify = Blueprint("pagseguro_notify", __name__)
 
@@ -144,7 +145,12 @@ def pagseguro_notification():
         if tx_code:
             payment.external_id = tx_code  # útil para auditoria
 
-        purchase.status = "paid"
+        try:
+            purchase_state.transition(s, purchase, "paid", actor="webhook:pagseguro")
+        except purchase_state.InvalidTransition as e:
+            # pagamento fica registrado; compra cancelada não é finalizada (admin resolve)
+            current_app.logger.warning("[PAGSEGURO NOTIFY] %s purchase_id=%s", e, purchase.id)
+            return {"ok": True}
 
     # finaliza fora do commit (se der erro, não desfaz o "paid")
     _finalize_purchase(purchase)
@@ -0,0 +1,117 @@
+# app_services/pix_brcode.py
+"""
+Pix "copia e cola" (BR Code / EMV MPM) gerado localmente.
+
+Monta o payload EMV com chave, valor e txid da compra e calcula o CRC16
+(CCITT-FALSE). O PNG do QR é renderizado sob demanda e fica em cache em
+memória (mesmo payload => mesmos bytes), então não precisamos mais baixar
+imagem do provedor nem guardar base64 no banco.
+"""
+import os
+import re
+import unicodedata
+from functools import lru_cache
+from io import BytesIO
+
+
+def crc16_ccitt(data: bytes) -> int:
+    """CRC16/CCITT-FALSE (poly 0x1021, init 0xFFFF) — exigido pelo BR Code."""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = ((crc << 1) ^ 0x1021) & 0xFFFF
+            else:
+                crc = (crc << 1) & 0xFFFF
+    return crc
+
+
+def _tlv(tag: str, value: str) -> str:
+    if len(value) > 99:
+        raise ValueError(f"Campo EMV {tag} excede 99 caracteres.")
+    return f"{tag}{len(value):02d}{value}"
+
+
+def _ascii_upper(texto: str, max_len: int) -> str:
+    texto = unicodedata.normalize("NFKD", texto or "").encode("ascii", "ignore").decode("ascii")
+    texto = re.sub(r"[^A-Za-z0-9 ]+", " ", texto)
+    texto = re.sub(r"\s+", " ", texto).strip().upper()
+    return texto[:max_len]
+
+
+def txid_from_token(token: str) -> str:
+    """txid do Pix: só [A-Za-z0-9], até 25 caracteres ("***" se vazio)."""
+    txid = re.sub(r"[^A-Za-z0-9]", "", token or "")[:25]
+    return txid or "***"
+
+
+def build_pix_payload(
+    *,
+    pix_key: str,
+    receiver_name: str,
+    receiver_city: str,
+    amount_cents: int | None = None,
+    txid: str = "***",
+    description: str = "",
+) -> str:
+    """
+    Retorna o payload BR Code (string do "Pix copia e cola").
+    amount_cents None/0 => QR sem valor (cliente digita).
+    """
+    key = (pix_key or "").strip()
+    if not key:
+        raise ValueError("Chave Pix vazia.")
+
+    gui = _tlv("00", "br.gov.bcb.pix") + _tlv("01", key)
+    desc = _ascii_upper(description, max(0, 99 - len(gui) - 4))
+    if desc:
+        gui += _tlv("02", desc)
+
+    payload = _tlv("00", "01") + _tlv("26", gui) + _tlv("52", "0000") + _tlv("53", "986")
+
+    if amount_cents:
+        payload += _tlv("54", f"{int(amount_cents) / 100:.2f}")
+
+    payload += _tlv("58", "BR")
+    payload += _tlv("59", _ascii_upper(receiver_name, 25) or "RECEBEDOR")
+    payload += _tlv("60", _ascii_upper(receiver_city, 15) or "BRASIL")
+    payload += _tlv("62", _tlv("05", txid_from_token(txid)))
+
+    payload += "6304"
+    return payload + f"{crc16_ccitt(payload.encode('utf-8')):04X}"
+
+
+def manual_pix_payload(*, amount_cents: int | None, token: str) -> str:
+    """
+    Payload para o fluxo Pix manual usando as env vars PIX_MANUAL_*.
+    Retorna "" se PIX_MANUAL_KEY não estiver configurada.
+    """
+    pix_key = (os.getenv("PIX_MANUAL_KEY") or "").strip()
+    if not pix_key:
+        return ""
+    return build_pix_payload(
+        pix_key=pix_key,
+        receiver_name=(os.getenv("PIX_MANUAL_RECEIVER_NAME") or "").strip(),
+        receiver_city=(os.getenv("PIX_MANUAL_CITY") or "BELO HORIZONTE").strip(),
+        amount_cents=amount_cents,
+        txid=token,
+    )
+
+
+@lru_cache(maxsize=int(os.getenv("PIX_QR_CACHE_SIZE", "256")))
+def render_qr_png(payload: str, box_size: int = 8) -> bytes:
+    """PNG (bytes) do QR para o payload. Cache LRU em memória."""
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_M
+
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_CORRECT_M, box_size=box_size, border=2)
+    qr.add_data(payload)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+    if hasattr(img, "get_image"):
+        img = img.get_image()
+
+    buf = BytesIO()
+    img.save(buf, format="PNG", optimize=True)
+    return buf.getvalue()
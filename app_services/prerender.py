@@ -0,0 +1,201 @@
+# app_services/prerender.py
+"""
+Pré-render especulativo dos ingressos enquanto a compra espera pagamento.
+
+Depois do buy_post (pending_payment) um job em background já cria os Tickets
+com status "pending" (token/id alocados), renderiza PNG/PDF individuais e o
+bundle (PDF geral + ZIP) em STORAGE_DIR/tickets/<token>/ e grava um manifesto
+com a "impressão digital" da compra (show, nomes, evento, BASE_URL, arte,
+chave do QR assinado).
+
+No mark-paid a finalização só confere o manifesto, vira os tickets para
+"issued" e publica (FTP). Se algo mudou (edição da reserva, arte nova), a
+impressão digital não bate e ela renderiza do zero como antes.
+
+Tickets "pending" não valem na portaria (tickets.py exige "issued" + pago).
+TICKET_PRERENDER=0 desliga.
+"""
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from config_ticket import QR_SIZE_PX
+from db import db
+from models import Event, Purchase, Ticket
+
+MANIFEST_NAME = "prerender.json"
+
+_locks_guard = threading.Lock()
+_locks: Dict[int, threading.Lock] = {}
+
+
+@contextmanager
+def purchase_lock(purchase_id: int):
+    """Serializa pré-render e finalização da mesma compra (neste processo)."""
+    with _locks_guard:
+        lock = _locks.setdefault(purchase_id, threading.Lock())
+    with lock:
+        yield
+
+
+def enabled() -> bool:
+    return os.getenv("TICKET_PRERENDER", "1") != "0"
+
+
+def fingerprint(purchase: Purchase, *, event_slug: str, base_url: str) -> str:
+    from app_services import ticket_sig
+    from app_services.finalize_purchase import _names_from_purchase
+    from app_services.ticket_pdf import LAYOUT_VERSION
+
+    base_image: Path = current_app.config["TICKET_BASE_IMAGE_PATH"]
+    try:
+        art_mtime = base_image.stat().st_mtime_ns
+    except OSError:
+        art_mtime = 0
+    raw = json.dumps([
+        purchase.token,
+        purchase.show_name or "",
+        _names_from_purchase(purchase) or ["Convidado"],
+        event_slug,
+        base_url,
+        QR_SIZE_PX,
+        os.getenv("TICKET_FONT_SHOW", ""),
+        os.getenv("TICKET_FONT_NAME", ""),
+        art_mtime,
+        LAYOUT_VERSION,
+        ticket_sig.active_kid(),  # chave nova (rotação) = QR novo
+    ], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def _manifest_path(local_dir: Path) -> Path:
+    return local_dir / MANIFEST_NAME
+
+
+def forget(local_dir: Path) -> None:
+    """Apaga só o manifesto (os arquivos continuam; tickets seguem no banco)."""
+    _manifest_path(local_dir).unlink(missing_ok=True)
+
+
+def discard(s, purchase_id: int, local_dir: Path) -> None:
+    """Remove pré-render antigo: tickets "pending" + manifesto."""
+    s.execute(
+        delete(Ticket)
+        .where(Ticket.purchase_id == purchase_id, Ticket.status == "pending")
+        .execution_options(synchronize_session=False)
+    )
+    forget(local_dir)
+
+
+def load(s, purchase: Purchase, *, local_dir: Path, event_slug: str, base_url: str) -> Optional[Dict[str, Any]]:
+    """
+    Pré-render válido para a compra (mesma impressão digital, tickets pending
+    e arquivos no disco) ou None.
+    """
+    try:
+        manifest = json.loads(_manifest_path(local_dir).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+    if manifest.get("fingerprint") != fingerprint(purchase, event_slug=event_slug, base_url=base_url):
+        return None
+
+    ids = [int(i) for i in manifest.get("ticket_ids") or []]
+    by_id = {t.id: t for t in s.scalars(
+        select(Ticket).where(Ticket.id.in_(ids), Ticket.purchase_id == purchase.id, Ticket.status == "pending")
+    )} if ids else {}
+    if not ids or len(by_id) != len(ids):
+        return None
+
+    png = [local_dir / n for n in manifest.get("png") or []]
+    pdf = [local_dir / n for n in manifest.get("pdf") or []]
+    bundle_pdf = local_dir / (manifest.get("bundle_pdf") or "")
+    zip_path = local_dir / (manifest.get("zip") or "")
+    files = png + pdf + [bundle_pdf, zip_path]
+    if len(png) != len(ids) or len(pdf) != len(ids) or not all(f.is_file() for f in files):
+        return None
+
+    return {
+        "tickets": [by_id[i] for i in ids],
+        "png": png,
+        "pdf": pdf,
+        "bundle_pdf": bundle_pdf,
+        "zip": zip_path,
+    }
+
+
+def prerender_purchase(purchase_id: int) -> None:
+    """Job: pré-renderiza os ingressos de uma compra pending_payment."""
+    if not enabled():
+        return
+
+    from app_services.finalize_purchase import (
+        _names_from_purchase,
+        new_tickets,
+        render_bundle,
+        render_ticket_files,
+        show_id_for,
+    )
+
+    base_url = (current_app.config.get("BASE_URL") or "").rstrip("/")
+    storage_dir = Path(current_app.config["STORAGE_DIR"])
+
+    with purchase_lock(purchase_id), db() as s:
+        purchase = s.get(Purchase, purchase_id)
+        if not purchase or (purchase.status or "").lower() != "pending_payment":
+            return
+
+        ev = s.get(Event, purchase.event_id)
+        event_slug = (ev.slug if ev else "evento")
+        local_dir = (storage_dir / "tickets" / purchase.token).resolve()
+
+        if load(s, purchase, local_dir=local_dir, event_slug=event_slug, base_url=base_url):
+            return
+
+        discard(s, purchase.id, local_dir)
+        names = _names_from_purchase(purchase) or ["Convidado"]
+        tickets = new_tickets(s, purchase, names, status="pending")
+        show_id = show_id_for(s, purchase.show_name)
+        png, pdf = render_ticket_files(
+            tickets, local_dir=local_dir, event_slug=event_slug, base_url=base_url, show_id=show_id,
+        )
+        bundle_pdf, zip_path = render_bundle(
+            local_dir, purchase.token, tickets, png, pdf, base_url=base_url, show_id=show_id,
+        )
+
+        _manifest_path(local_dir).write_text(json.dumps({
+            "fingerprint": fingerprint(purchase, event_slug=event_slug, base_url=base_url),
+            "ticket_ids": [t.id for t in tickets],
+            "png": [p.name for p in png],
+            "pdf": [p.name for p in pdf],
+            "bundle_pdf": bundle_pdf.name,
+            "zip": zip_path.name,
+        }), encoding="utf-8")
+        s.commit()
+
+    current_app.logger.info("[PRERENDER] purchase=%s tickets=%s", purchase_id, len(tickets))
+
+
+def enqueue(purchase_id: int) -> None:
+    if enabled():
+        from app_services import background
+
+        background.enqueue(prerender_purchase, purchase_id)
+
+
+def pending_ids(limit: int = 500) -> list[int]:
+    """Compras pending_payment mais recentes (para pré-render em lote)."""
+    with db() as s:
+        return list(s.scalars(
+            select(Purchase.id)
+            .where(Purchase.status == "pending_payment")
+            .order_by(Purchase.id.desc())
+            .limit(limit)
+        ))
@@ -0,0 +1,191 @@
+# app_services/profiler.py
+"""
+Profiler sob demanda para produção (armado pelo admin).
+
+O admin arma: "perfila as próximas N requisições cujo endpoint casa com
+<padrão>" (fnmatch, ex.: "admin_pending.*"). O estado fica num arquivo em
+STORAGE_DIR/profiles/armed.json, então vale para todos os workers.
+
+Modos:
+- "cprofile": cProfile determinístico → <id>.pstats + <id>.txt (top 60).
+- "sample":   amostragem da pilha da thread do request a cada
+              PROFILER_SAMPLE_MS (padrão 5ms) → <id>.collapsed
+              (formato "a;b;c N", abre no speedscope / flamegraph.pl).
+
+Desarmado, o custo por request é uma comparação de float: o arquivo só é
+consultado a cada PROFILER_POLL_SECONDS (padrão 5s).
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from fnmatch import fnmatch
+from pathlib import Path
+
+from flask import g, request
+
+MODES = ("cprofile", "sample")
+
+_lock = threading.Lock()
+_state = {"armed": None, "checked_at": 0.0}
+
+
+def profiles_dir(storage_dir: Path) -> Path:
+    d = Path(storage_dir) / "profiles"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _armed_path(storage_dir: Path) -> Path:
+    return profiles_dir(storage_dir) / "armed.json"
+
+
+def arm(storage_dir: Path, *, pattern: str, count: int, mode: str = "cprofile") -> dict:
+    cfg = {
+        "pattern": (pattern or "*").strip() or "*",
+        "remaining": max(1, min(int(count), 100)),
+        "mode": mode if mode in MODES else "cprofile",
+        "armed_at": time.time(),
+    }
+    with _lock:
+        _armed_path(storage_dir).write_text(json.dumps(cfg), encoding="utf-8")
+        _state["armed"] = cfg
+        _state["checked_at"] = time.monotonic()
+    return cfg
+
+
+def disarm(storage_dir: Path) -> None:
+    with _lock:
+        _armed_path(storage_dir).unlink(missing_ok=True)
+        _state["armed"] = None
+        _state["checked_at"] = time.monotonic()
+
+
+def current(storage_dir: Path) -> dict | None:
+    try:
+        return json.loads(_armed_path(storage_dir).read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _claim(storage_dir: Path, endpoint: str) -> str | None:
+    """Consome 1 "vaga" se o endpoint casar; retorna o modo ou None."""
+    now = time.monotonic()
+    poll = float(os.getenv("PROFILER_POLL_SECONDS", "5"))
+    if _state["armed"] is None and now - _state["checked_at"] < poll:
+        return None
+
+    with _lock:
+        if now - _state["checked_at"] >= poll:
+            _state["armed"] = current(storage_dir)
+            _state["checked_at"] = now
+        cfg = _state["armed"]
+        if not cfg or not fnmatch(endpoint, cfg["pattern"]):
+            return None
+
+        cfg["remaining"] -= 1
+        path = _armed_path(storage_dir)
+        if cfg["remaining"] <= 0:
+            path.unlink(missing_ok=True)
+            _state["armed"] = None
+        else:
+            path.write_text(json.dumps(cfg), encoding="utf-8")
+        return cfg["mode"]
+
+
+class _Sampler:
+    """Amostra a pilha de UMA thread (a do request) em intervalo fixo."""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=1)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {n}\n" for stack, n in self.stacks.most_common())
+
+
+def _profile_id(endpoint: str) -> str:
+    slug = re.sub(r"[^A-Za-z0-9_.-]+", "_", endpoint)[:60]
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}"
+
+
+def init_app(app) -> None:
+
+    @app.before_request
+    def _profiler_start():
+        mode = _claim(app.config["STORAGE_DIR"], request.endpoint or "")
+        if mode is None:
+            return
+        if mode == "sample":
+            interval = float(os.getenv("PROFILER_SAMPLE_MS", "5")) / 1000
+            prof = _Sampler(threading.get_ident(), interval)
+            prof.start()
+        else:
+            prof = cProfile.Profile()
+            prof.enable()
+        g._profiler = (mode, prof, time.perf_counter())
+
+    @app.teardown_request
+    def _profiler_stop(exc):
+        active = g.pop("_profiler", None)
+        if active is None:
+            return
+        mode, prof, t0 = active
+        elapsed_ms = (time.perf_counter() - t0) * 1000
+        out_dir = profiles_dir(app.config["STORAGE_DIR"])
+        pid = _profile_id(request.endpoint or "none")
+
+        try:
+            if mode == "sample":
+                prof.stop()
+                (out_dir / f"{pid}.collapsed").write_text(prof.collapsed(), encoding="utf-8")
+            else:
+                prof.disable()
+                prof.dump_stats(str(out_dir / f"{pid}.pstats"))
+                buf = io.StringIO()
+                buf.write(f"{request.method} {request.full_path}  {elapsed_ms:.1f} ms\n\n")
+                pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(60)
+                (out_dir / f"{pid}.txt").write_text(buf.getvalue(), encoding="utf-8")
+        except Exception:
+            app.logger.exception("[PROFILER] falha ao salvar perfil %s", pid)
+        else:
+            app.logger.info("[PROFILER] %s salvo (%s, %.1f ms)", pid, mode, elapsed_ms)
+
+
+def list_profiles(storage_dir: Path) -> list[dict]:
+    d = profiles_dir(storage_dir)
+    out = []
+    for p in sorted(d.iterdir(), key=lambda p: p.stat().st_mtime, reverse=True):
+        if p.suffix not in {".pstats", ".txt", ".collapsed"}:
+            continue
+        st = p.stat()
+        out.append({"name": p.name, "size": st.st_size, "mtime": st.st_mtime})
+    return out
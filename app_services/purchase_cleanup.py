@@ -0,0 +1,122 @@
+# app_services/purchase_cleanup.py
+"""
+Exclusão de compras em conjunto (set-based) + limpeza dos arquivos remotos.
+
+delete_purchases(): em vez de carregar cada Ticket/Payment como objeto e
+apagar um a um, faz 1 SELECT dos links + 3 DELETE ... WHERE IN (tickets,
+pagamentos, compras) por lote. As FKs têm ON DELETE CASCADE nas tabelas
+novas; os DELETEs explícitos dos filhos continuam porque tabelas antigas
+(create_all não altera FK) e o SQLite sem PRAGMA não cascateiam.
+
+Os PNG/PDF/ZIP que a finalização subiu no FTP saem por um job em background
+(cleanup_remote): 1 sessão FTP para todos os arquivos, em lotes de
+FTP_DELETE_BATCH. A pasta local STORAGE_DIR/tickets/<token> vai junto.
+
+A exclusão entra no log de transições (status → "deleted"), então lotação
+e demais agregados acompanham sem recalcular nada.
+"""
+import os
+import shutil
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlparse
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from app_services import purchase_state
+from models import Payment, Purchase, Ticket
+
+# mesmos formatos do ticket_generator.DERIVATIVE_FORMATS (sem importar o Pillow aqui)
+_DERIVATIVE_EXTS = (".webp", ".avif")
+
+
+def _basename(url: str) -> str:
+    return os.path.basename(urlparse(url or "").path)
+
+
+def remote_files(s, purchase_ids: List[int]) -> List[str]:
+    """Nomes remotos (FTP) de tudo que a finalização subiu para estas compras."""
+    names: List[str] = []
+    for png, pdf in s.execute(
+        select(Ticket.png_path, Ticket.pdf_path).where(Ticket.purchase_id.in_(purchase_ids))
+    ):
+        for url in (png, pdf):
+            name = _basename(url)
+            if name:
+                names.append(name)
+        png_name = _basename(png)
+        if png_name.endswith(".png"):
+            # derivados (TICKET_PNG_DERIVATIVES) têm o mesmo nome; os inexistentes contam como "missing"
+            names += [png_name[:-4] + ext for ext in _DERIVATIVE_EXTS]
+    for pdf_all, zip_all in s.execute(
+        select(Payment.tickets_pdf_url, Payment.tickets_zip_url).where(Payment.purchase_id.in_(purchase_ids))
+    ):
+        names += [n for n in (_basename(pdf_all), _basename(zip_all)) if n]
+    return list(dict.fromkeys(names))
+
+
+def delete_purchases(s, purchase_ids: List[int], *, actor: str = "admin") -> Dict[str, List[str]]:
+    """
+    Apaga compras + pagamentos + ingressos (sem commit: o chamador decide).
+    Retorna {"remote": nomes no FTP, "tokens": tokens apagados} para cleanup_remote().
+    """
+    if not purchase_ids:
+        return {"remote": [], "tokens": []}
+
+    rows = s.execute(
+        select(
+            Purchase.id, Purchase.token, Purchase.event_id, Purchase.show_name, Purchase.status,
+            Purchase.ticket_qty, Purchase.ticket_unit_price_cents,
+        ).where(Purchase.id.in_(purchase_ids))
+    ).all()
+    tokens = [r.token for r in rows]
+    remote = remote_files(s, purchase_ids)
+
+    for model in (Ticket, Payment):
+        s.execute(
+            delete(model)
+            .where(model.purchase_id.in_(purchase_ids))
+            .execution_options(synchronize_session=False)
+        )
+    s.execute(
+        delete(Purchase)
+        .where(Purchase.id.in_(purchase_ids))
+        .execution_options(synchronize_session=False)
+    )
+    purchase_state.record_deleted(s, rows, actor=actor)
+    return {"remote": remote, "tokens": tokens}
+
+
+def cleanup_remote(remote: List[str], tokens: List[str]) -> None:
+    """Job: apaga os arquivos no FTP (1 sessão por lote) e as pastas locais."""
+    from app_services.ftp_uploader import delete_files
+
+    storage_dir = Path(current_app.config["STORAGE_DIR"])
+    for token in tokens:
+        d = (storage_dir / "tickets" / token).resolve()
+        if d.parent == (storage_dir / "tickets").resolve():
+            shutil.rmtree(d, ignore_errors=True)
+
+    if not remote:
+        return
+    if not (os.getenv("FTP_HOSTS") or "").strip():
+        current_app.logger.info("[CLEANUP] FTP_HOSTS vazio: %s arquivo(s) remotos ficaram", len(remote))
+        return
+
+    size = max(1, int(os.getenv("FTP_DELETE_BATCH", "500")))
+    deleted = missing = 0
+    for i in range(0, len(remote), size):
+        ok, info = delete_files(remote[i:i + size])
+        if not ok:
+            raise RuntimeError(str(info))
+        deleted += info["deleted"]
+        missing += info["missing"]
+    current_app.logger.info("[CLEANUP] FTP apagados=%s inexistentes=%s", deleted, missing)
+
+
+def enqueue_cleanup(result: Dict[str, List[str]]) -> None:
+    from app_services import background
+
+    if result["remote"] or result["tokens"]:
+        background.enqueue(cleanup_remote, result["remote"], result["tokens"])
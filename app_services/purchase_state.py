@@ -0,0 +1,248 @@
+# app_services/purchase_state.py
+"""
+Máquina de estados da compra: TODA mudança de Purchase.status passa por aqui.
+
+- TRANSITIONS diz o que pode virar o quê; fora disso -> InvalidTransition
+  (o admin pode forçar pela edição, force=True — fica no log do mesmo jeito).
+- Cada mudança grava uma linha em purchase_transitions (append-only) com o
+  que os agregados precisam: show, pessoas, valor, quem mudou.
+- Quem deriva dados do status se pendura aqui em vez de varrer purchases:
+    on_transition(fn)  -> fn(s, records) DENTRO da transação (contadores no
+                          banco, ex.: app_services/occupancy.py);
+    subscribe(fn)      -> fn(records) DEPOIS do commit (métricas, caches,
+                          notificações). Rollback descarta.
+
+records = [{"purchase_id", "token", "event_id", "show_name", "from_status",
+            "to_status", "qty", "amount_cents", "actor", "at"}, ...]
+
+O commit continua com o chamador, como no live_feed.publish().
+"""
+import logging
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, func, insert, select, update
+
+from app_services import occupancy, sales_rollup
+from models import Purchase, PurchaseTransition
+
+# None = compra nova
+TRANSITIONS: Dict[Optional[str], frozenset] = {
+    None: frozenset({"reservation_pending", "reservation_pending_price", "pending_payment"}),
+    "reservation_pending": frozenset({"reserved", "cancelled", "rejected", "expired"}),
+    "reservation_pending_price": frozenset({"reserved", "pending_payment", "cancelled", "rejected", "expired"}),
+    "pending_payment": frozenset({"paid", "cancelled", "rejected", "expired"}),
+    "reserved": frozenset({"paid", "cancelled", "rejected"}),
+    # Pix/cartão que o provedor confirmou depois do prazo
+    "expired": frozenset({"paid", "cancelled"}),
+    "paid": frozenset({"cancelled"}),
+    "rejected": frozenset({"cancelled"}),
+    "cancelled": frozenset(),
+}
+
+# pseudo-status do log quando a compra é excluída (purchase_cleanup)
+DELETED = "deleted"
+
+log = logging.getLogger(__name__)
+
+_projections: List[Callable] = []
+_subscribers: List[Callable] = []
+
+
+class InvalidTransition(ValueError):
+    def __init__(self, from_status: Optional[str], to_status: str):
+        super().__init__(f"transição inválida: {from_status or '∅'} → {to_status}")
+        self.from_status = from_status
+        self.to_status = to_status
+
+
+def _norm(status: Optional[str]) -> Optional[str]:
+    return (status or "").strip().lower() or None
+
+
+def can(from_status: Optional[str], to_status: str) -> bool:
+    return _norm(to_status) in TRANSITIONS.get(_norm(from_status), frozenset())
+
+
+def sources(to_status: str) -> List[str]:
+    """Status de onde se pode chegar em `to_status`."""
+    to_status = _norm(to_status)
+    return [st for st, nxt in TRANSITIONS.items() if st is not None and to_status in nxt]
+
+
+def on_transition(fn: Callable) -> Callable:
+    """Registra projeção fn(s, records) que roda na transação da mudança."""
+    _projections.append(fn)
+    return fn
+
+
+def subscribe(fn: Callable) -> Callable:
+    """Registra assinante fn(records) chamado só depois do commit."""
+    _subscribers.append(fn)
+    return fn
+
+
+def _record(row, from_status, to_status, actor, at) -> Dict[str, Any]:
+    qty = int(row.ticket_qty or 0)
+    return {
+        "purchase_id": row.id,
+        "token": row.token,
+        "event_id": row.event_id,
+        "show_name": row.show_name,
+        "from_status": _norm(from_status),
+        "to_status": to_status,
+        "qty": qty,
+        "amount_cents": qty * int(row.ticket_unit_price_cents or 0),
+        "actor": actor,
+        "at": at,
+    }
+
+
+def _deliver(s) -> None:
+    records = s.info.pop("pending_transitions", None)
+    if not records:
+        return
+    for fn in _subscribers:
+        try:
+            fn(records)
+        except Exception:  # assinante não derruba quem fez a mudança
+            log.exception("[PURCHASE STATE] assinante falhou: %r", fn)
+
+
+def _discard(s) -> None:
+    s.info.pop("pending_transitions", None)
+
+
+def _emit(s, records: List[Dict[str, Any]]) -> None:
+    if not records:
+        return
+    s.execute(insert(PurchaseTransition), [
+        {
+            "purchase_id": r["purchase_id"],
+            "event_id": r["event_id"],
+            "show_name": r["show_name"],
+            "from_status": r["from_status"],
+            "to_status": r["to_status"],
+            "qty": r["qty"],
+            "amount_cents": r["amount_cents"],
+            "actor": r["actor"],
+            "created_at": r["at"],
+        }
+        for r in records
+    ])
+    for fn in _projections:
+        fn(s, records)
+
+    # também avisa o db() que há escrita para commitar
+    pending = s.info.setdefault("pending_transitions", [])
+    if not pending:
+        event.listen(s, "after_commit", _deliver, once=True)
+        event.listen(s, "after_rollback", _discard, once=True)
+    pending.extend(records)
+
+
+def record_created(s, purchase: Purchase, *, actor: str = "buyer") -> Dict[str, Any]:
+    """Compra nova (já adicionada à sessão): loga ∅ → status atual."""
+    to = _norm(purchase.status)
+    if to not in TRANSITIONS[None]:
+        raise InvalidTransition(None, to or "")
+    if purchase.id is None:
+        s.flush()
+    rec = _record(purchase, None, to, actor, datetime.utcnow())
+    _emit(s, [rec])
+    return rec
+
+
+def transition(s, purchase: Purchase, to_status: str, *, actor: str, force: bool = False) -> bool:
+    """
+    Muda o status de UMA compra carregada na sessão. Retorna False se ela já
+    estava em `to_status` (idempotente para webhooks repetidos).
+    status_version sobe pelo listener em models.py.
+    """
+    frm = _norm(purchase.status)
+    to = _norm(to_status)
+    if frm == to:
+        return False
+    if not force and not can(frm, to):
+        raise InvalidTransition(frm, to)
+    purchase.status = to
+    s.flush()  # autoflush=False: as projeções leem a tabela já com o status novo
+    _emit(s, [_record(purchase, frm, to, actor, datetime.utcnow())])
+    return True
+
+
+def transition_many(
+    s,
+    ids: Iterable[int],
+    to_status: str,
+    *,
+    actor: str,
+    from_statuses: Optional[Iterable[str]] = None,
+    values: Optional[Dict[str, Any]] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Versão set-based: trava as candidatas (SELECT ... FOR UPDATE), faz UM
+    UPDATE guardado pelo status de origem e loga tudo num INSERT.
+    `from_statuses` restringe as origens válidas; `values` = colunas extras
+    do mesmo UPDATE (ex.: rejected_at). Retorna os records das que mudaram.
+    Objetos Purchase já carregados na sessão NÃO são atualizados
+    (recarregue com populate_existing se precisar).
+    """
+    ids = list(ids)
+    to = _norm(to_status)
+    allowed = sources(to)
+    if from_statuses is not None:
+        wanted = {_norm(st) for st in from_statuses}
+        allowed = [st for st in allowed if st in wanted]
+    if not ids or not allowed:
+        return []
+
+    rows = s.execute(
+        select(
+            Purchase.id, Purchase.token, Purchase.event_id, Purchase.show_name, Purchase.status,
+            Purchase.ticket_qty, Purchase.ticket_unit_price_cents,
+        )
+        .where(Purchase.id.in_(ids), Purchase.status.in_(allowed))
+        .with_for_update()
+    ).all()
+    if not rows:
+        return []
+
+    s.execute(
+        update(Purchase)
+        .where(Purchase.id.in_([r.id for r in rows]), Purchase.status.in_(allowed))
+        .values(
+            status=to,
+            status_version=func.coalesce(Purchase.status_version, 0) + 1,
+            **(values or {}),
+        )
+        .execution_options(synchronize_session=False)
+    )
+    now = datetime.utcnow()
+    records = [_record(r, r.status, to, actor, now) for r in rows]
+    _emit(s, records)
+    return records
+
+
+def record_deleted(s, rows, *, actor: str) -> List[Dict[str, Any]]:
+    """
+    Compras excluídas (linhas com as colunas de Purchase usadas em _record +
+    status, lidas ANTES do DELETE): loga status → "deleted". Chamar depois do
+    DELETE, para as projeções já enxergarem a tabela sem elas.
+    """
+    now = datetime.utcnow()
+    records = [_record(r, r.status, DELETED, actor, now) for r in rows]
+    _emit(s, records)
+    return records
+
+
+def _count(records: List[Dict[str, Any]]) -> None:
+    from app_services.metrics import PURCHASE_TRANSITIONS
+
+    for r in records:
+        PURCHASE_TRANSITIONS.labels(from_status=r["from_status"] or "new", to_status=r["to_status"]).inc()
+
+
+subscribe(_count)
+on_transition(occupancy.apply)
+on_transition(sales_rollup.apply)
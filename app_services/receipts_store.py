@@ -0,0 +1,151 @@
+# app_services/receipts_store.py
+"""
+Comprovantes Pix guardados uma única vez em STORAGE_DIR/receipts.
+
+- O upload é copiado em blocos direto para um arquivo temporário no próprio
+  diretório do store, calculando o sha256 no caminho (nada de read() inteiro).
+- O nome final é o hash do conteúdo (receipts/ab/abcd....jpg), então o mesmo
+  comprovante enviado duas vezes ocupa espaço uma vez só.
+- Fotos de celular são reduzidas/recomprimidas depois, em background.
+"""
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import Any, BinaryIO, Dict, Optional
+
+CHUNK_SIZE = 64 * 1024
+
+EXT_BY_MIME = {
+    "application/pdf": "pdf",
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/jpg": "jpg",
+    "image/webp": "webp",
+    "image/heic": "heic",
+    "image/gif": "gif",
+}
+
+MIME_BY_EXT = {
+    "pdf": "application/pdf",
+    "png": "image/png",
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+    "heic": "image/heic",
+    "gif": "image/gif",
+}
+
+
+def receipts_dir(storage_dir: Path) -> Path:
+    d = Path(storage_dir) / "receipts"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def _is_sha256(sha: str) -> bool:
+    return len(sha or "") == 64 and all(c in "0123456789abcdef" for c in sha)
+
+
+def save_stream(stream: BinaryIO, *, storage_dir: Path, content_type: str, max_bytes: int) -> Dict[str, Any]:
+    """
+    Copia o stream para o store. Retorna:
+      {"sha256", "path", "size", "content_type", "deduped"}
+    Levanta ValueError se passar de max_bytes (o temporário é apagado).
+    """
+    base = receipts_dir(storage_dir)
+    ext = EXT_BY_MIME.get((content_type or "").lower(), "bin")
+
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp_name = tempfile.mkstemp(prefix=".upload-", dir=base)
+    try:
+        with os.fdopen(fd, "wb") as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ValueError("Arquivo maior que o limite permitido.")
+                h.update(chunk)
+                out.write(chunk)
+
+        sha = h.hexdigest()
+        existing = find_receipt(storage_dir, sha)
+        if existing:
+            os.unlink(tmp_name)
+            return {
+                "sha256": sha,
+                "path": existing,
+                "size": existing.stat().st_size,
+                "content_type": MIME_BY_EXT.get(existing.suffix.lstrip("."), "application/octet-stream"),
+                "deduped": True,
+            }
+
+        final = base / sha[:2] / f"{sha}.{ext}"
+        final.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_name, final)
+        return {
+            "sha256": sha,
+            "path": final,
+            "size": size,
+            "content_type": MIME_BY_EXT.get(ext, "application/octet-stream"),
+            "deduped": False,
+        }
+    except BaseException:
+        try:
+            os.unlink(tmp_name)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+def find_receipt(storage_dir: Path, sha: str) -> Optional[Path]:
+    """Caminho do comprovante pelo hash (qualquer extensão) ou None."""
+    sha = (sha or "").lower()
+    if not _is_sha256(sha):
+        return None
+    folder = Path(storage_dir) / "receipts" / sha[:2]
+    if not folder.is_dir():
+        return None
+    for p in folder.glob(f"{sha}.*"):
+        if p.is_file():
+            return p
+    return None
+
+
+def optimize_image(storage_dir: Path, sha: str) -> Optional[Path]:
+    """
+    Reduz foto de comprovante (lado maior até RECEIPT_MAX_PX, JPEG qualidade
+    RECEIPT_JPEG_QUALITY). Mantém o mesmo hash no nome (é a chave do upload
+    original) e só troca o arquivo se o resultado for menor.
+    Retorna o caminho final (ou None se o hash não existir).
+    """
+    path = find_receipt(storage_dir, sha)
+    if not path or path.suffix.lower() not in {".png", ".jpg", ".webp", ".gif"}:
+        return path
+
+    from PIL import Image, ImageOps
+
+    max_px = int(os.getenv("RECEIPT_MAX_PX", "1600"))
+    quality = int(os.getenv("RECEIPT_JPEG_QUALITY", "80"))
+
+    with Image.open(path) as im:
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "L"):
+            im = im.convert("RGB")
+        im.thumbnail((max_px, max_px))
+
+        fd, tmp_name = tempfile.mkstemp(prefix=".opt-", suffix=".jpg", dir=path.parent)
+        with os.fdopen(fd, "wb") as out:
+            im.save(out, format="JPEG", quality=quality, optimize=True, progressive=True)
+
+    target = path.with_suffix(".jpg")
+    if os.path.getsize(tmp_name) >= path.stat().st_size:
+        os.unlink(tmp_name)
+        return path
+
+    os.replace(tmp_name, target)
+    if target != path:
+        path.unlink(missing_ok=True)
+    return target
@@ -0,0 +1,255 @@
+# app_services/reconcile.py
+"""
+Conciliação: recupera pagamentos cujo webhook se perdeu.
+
+Seleciona Payments pending (PagBank/Mercado Pago) com external_id de compras
+ainda em pending_payment e consulta os provedores em paralelo:
+- pool limitado (RECONCILE_WORKERS, padrão 4) + limite de taxa global
+  (RECONCILE_RATE_PER_SEC, padrão 5) para não tomar 429;
+- a consulta HTTP acontece FORA da sessão do banco;
+- 1 nova tentativa em timeout/429/5xx.
+
+Os pagos viram "paid" em UPDATE por lote com guarda de status (webhook ou
+admin no meio tempo não geram transição dupla) e a finalização vai para a
+fila de background (perdida num restart, a finalize_recovery refaz).
+
+Roda pelo CLI (`flask --app wsgi reconcile-payments`) ou a cada
+RECONCILE_INTERVAL_SECONDS (padrão 0 = desligado), com advisory lock.
+PAGBANK_API_BASE / MP_API_BASE apontam para outro host (ex.: bench/reconcile.py).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+
+import requests
+from sqlalchemy import select, update
+
+from db import advisory_lock, db
+from models import Payment, Purchase
+from app_services.metrics import RECONCILE_CHECKS
+
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+
+PROVIDERS = ("pagbank", "mercadopago")
+
+_local = threading.local()
+
+
+def now_sp():
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+class _RateLimiter:
+    """Token bucket simples, compartilhado entre as threads do pool."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def _session() -> requests.Session:
+    """1 Session (keep-alive) por thread do pool."""
+    s = getattr(_local, "session", None)
+    if s is None:
+        s = _local.session = requests.Session()
+    return s
+
+
+def _timeout() -> float:
+    return float(os.getenv("RECONCILE_TIMEOUT_SECONDS", "10"))
+
+
+def _check_pagbank(external_id: str) -> bool:
+    import pagbank
+
+    order = pagbank.get_order(order_id=external_id, session=_session(), timeout=_timeout())
+    return any((c.get("status") or "").upper() == "PAID" for c in order.get("charges") or [])
+
+
+def _check_mercadopago(external_id: str, reference: str) -> bool:
+    # external_id do MP é a preference; o pagamento é achado pela external_reference
+    token = (os.getenv("MP_ACCESS_TOKEN") or "").strip()
+    if not token:
+        raise RuntimeError("MP_ACCESS_TOKEN não configurado")
+    base = (os.getenv("MP_API_BASE") or "https://api.mercadopago.com").rstrip("/")
+    r = _session().get(
+        f"{base}/v1/payments/search",
+        params={"external_reference": reference},
+        headers={"Authorization": f"Bearer {token}"},
+        timeout=_timeout(),
+    )
+    r.raise_for_status()
+    return any((p.get("status") or "") == "approved" for p in (r.json().get("results") or []))
+
+
+def _retryable(e: Exception) -> bool:
+    if isinstance(e, (requests.Timeout, requests.ConnectionError)):
+        return True
+    resp = getattr(e, "response", None)
+    return resp is not None and (resp.status_code == 429 or resp.status_code >= 500)
+
+
+def _check(item: Dict[str, Any], limiter: _RateLimiter) -> Optional[bool]:
+    """True = pago no provedor, False = ainda não, None = erro."""
+    for attempt in range(2):
+        limiter.acquire()
+        try:
+            if item["provider"] == "pagbank":
+                paid = _check_pagbank(item["external_id"])
+            else:
+                paid = _check_mercadopago(item["external_id"], item["reference"])
+            RECONCILE_CHECKS.labels(provider=item["provider"], result="paid" if paid else "pending").inc()
+            return paid
+        except Exception as e:
+            if attempt == 0 and _retryable(e):
+                time.sleep(0.5)
+                continue
+            RECONCILE_CHECKS.labels(provider=item["provider"], result="error").inc()
+            item["error"] = str(e)[:300]
+            return None
+    return None
+
+
+def _candidates(now: datetime) -> List[Dict[str, Any]]:
+    min_age = timedelta(seconds=int(os.getenv("RECONCILE_MIN_AGE_SECONDS", "120")))
+    max_age = timedelta(hours=int(os.getenv("RECONCILE_MAX_AGE_HOURS", "48")))
+    with db(fresh=True) as s:
+        rows = s.execute(
+            select(Payment.id, Payment.provider, Payment.external_id, Purchase.id.label("purchase_id"), Purchase.token)
+            .join(Purchase, Purchase.id == Payment.purchase_id)
+            .where(
+                Payment.status == "pending",
+                Payment.provider.in_(PROVIDERS),
+                Payment.external_id.is_not(None),
+                Purchase.status == "pending_payment",
+                Purchase.created_at < now - min_age,  # dá tempo do webhook chegar
+                Purchase.created_at > now - max_age,
+            )
+            .order_by(Payment.id.desc())
+            .limit(int(os.getenv("RECONCILE_BATCH", "200")))
+        ).all()
+    return [
+        {
+            "payment_id": r.id,
+            "purchase_id": r.purchase_id,
+            "provider": r.provider,
+            "external_id": r.external_id,
+            # mesmo formato do mp_start (routes/mercadopago_checkout.py)
+            "reference": f"purchase:{r.token}|payment:{r.id}",
+        }
+        for r in rows
+    ]
+
+
+def _apply_paid(items: List[Dict[str, Any]]) -> List[int]:
+    """Transição pending_payment → paid, idempotente. Retorna as compras que mudaram."""
+    from app_services import purchase_state
+    from app_services.live_feed import publish_many
+
+    by_purchase = {it["purchase_id"]: it["payment_id"] for it in items}
+    ids = list(by_purchase)
+    with db(fresh=True) as s:
+        # guarda: só as que estavam pending_payment (travadas até o commit)
+        changed = purchase_state.transition_many(
+            s, ids, "paid", actor="reconcile", from_statuses=["pending_payment"],
+        )
+        if changed:
+            s.execute(
+                update(Payment)
+                .where(Payment.id.in_([by_purchase[r["purchase_id"]] for r in changed]), Payment.status == "pending")
+                .values(status="paid", paid_at=now_sp())
+                .execution_options(synchronize_session=False)
+            )
+            publish_many(s, [(r["purchase_id"], r["token"], "paid") for r in changed], "paid")
+        s.commit()
+    return [r["purchase_id"] for r in changed]
+
+
+def _finalize_many(purchase_ids: List[int]) -> None:
+    from flask import current_app
+
+    finalize_fn = current_app.extensions.get("finalize_purchase")
+    if not callable(finalize_fn):
+        return
+    for pid in purchase_ids:
+        try:
+            finalize_fn(pid)
+        except Exception:
+            current_app.logger.exception("[RECONCILE] finalização falhou purchase_id=%s", pid)
+
+
+def reconcile(*, finalize_inline: bool = False) -> Dict[str, Any]:
+    """
+    Uma rodada. Retorna {"skipped", "checked", "paid", "errors", "seconds"}.
+    finalize_inline=True roda a finalização aqui (CLI); senão vai para a fila.
+    """
+    from flask import current_app
+
+    from app_services import background
+
+    started = time.perf_counter()
+    result: Dict[str, Any] = {"skipped": False, "checked": 0, "paid": 0, "errors": 0, "seconds": 0.0}
+
+    with advisory_lock("reconcile-payments") as ok:
+        if not ok:
+            result["skipped"] = True
+            return result
+
+        items = _candidates(now_sp())
+        if items:
+            limiter = _RateLimiter(
+                float(os.getenv("RECONCILE_RATE_PER_SEC", "5")),
+                burst=int(os.getenv("RECONCILE_BURST", "2")),
+            )
+            workers = max(1, int(os.getenv("RECONCILE_WORKERS", "4")))
+            with ThreadPoolExecutor(max_workers=min(workers, len(items)), thread_name_prefix="reconcile") as pool:
+                outcomes = list(pool.map(lambda it: _check(it, limiter), items))
+
+            paid = [it for it, out in zip(items, outcomes) if out is True]
+            errors = [it for it, out in zip(items, outcomes) if out is None]
+            for it in errors[:10]:
+                current_app.logger.warning(
+                    "[RECONCILE] %s payment=%s erro: %s", it["provider"], it["payment_id"], it.get("error"),
+                )
+
+            changed = _apply_paid(paid) if paid else []
+            if changed:
+                if finalize_inline:
+                    _finalize_many(changed)
+                else:
+                    background.enqueue(_finalize_many, changed)
+
+            result.update(checked=len(items), paid=len(changed), errors=len(errors))
+
+    result["seconds"] = round(time.perf_counter() - started, 3)
+    if result["paid"] or result["errors"]:
+        current_app.logger.info(
+            "[RECONCILE] verificados=%s pagos=%s erros=%s em %.1fs",
+            result["checked"], result["paid"], result["errors"], result["seconds"],
+        )
+    return result
+
+
+def init_app(app) -> None:
+    from app_services import background
+
+    background.periodic(app, "reconcile-payments", float(os.getenv("RECONCILE_INTERVAL_SECONDS", "0")), reconcile)
@@ -0,0 +1,213 @@
+# app_services/sales_rollup.py
+"""
+Vendas por hora e por show (tabela sales_hourly), para acompanhar a procura
+depois de um anúncio sem agregar purchases/payments ao vivo.
+
+- apply(): projeção do log de transições (purchase_state.on_transition);
+  cada mudança soma na linha (show, hora) dentro da mesma transação.
+    criação          -> created +1, people +qtd
+    -> paid          -> paid +1, revenue_cents +valor (bruto: estorno não desconta)
+    -> cancelled/rejected -> cancelled +1
+    -> expired       -> expired +1
+- backfill(): recalcula a partir das datas gravadas (created_at, transição
+  para "paid" do log — paid_at só para compras anteriores ao log —,
+  rejected_at, expires_at), incluindo as tabelas de arquivo:
+
+    flask --app wsgi sales-backfill                    # tudo
+    flask --app wsgi sales-backfill --since 2026-10-01 # só daqui pra frente
+
+Horas no horário de São Paulo (como o resto do painel).
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import PurchaseTransition, SalesHourly
+
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+
+FIELDS = ("created", "people", "paid", "revenue_cents", "cancelled", "expired")
+CANCELLED = ("cancelled", "rejected")
+
+
+def now_sp():
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+def hour_of(dt: datetime) -> datetime:
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+def _sp_hour(utc_naive: datetime) -> datetime:
+    """Transições são gravadas em UTC; o rollup é por hora de SP."""
+    return hour_of(utc_naive.replace(tzinfo=timezone.utc).astimezone(SAO_PAULO_TZ).replace(tzinfo=None))
+
+
+def _deltas(r) -> Dict[str, int]:
+    d: Dict[str, int] = {}
+    if r["from_status"] is None:
+        d["created"] = 1
+        d["people"] = int(r["qty"] or 0)
+    to = r["to_status"]
+    if to == "paid":
+        d["paid"] = 1
+        d["revenue_cents"] = int(r["amount_cents"] or 0)
+    elif to in CANCELLED:
+        d["cancelled"] = 1
+    elif to == "expired":
+        d["expired"] = 1
+    return d
+
+
+def apply(s, records) -> None:
+    """Projeção: soma as transições nas linhas (show, hora)."""
+    acc: Dict[Tuple[str, datetime], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+    for r in records:
+        d = _deltas(r)
+        if d and r["show_name"]:
+            row = acc[(r["show_name"], _sp_hour(r["at"]))]
+            for k, v in d.items():
+                row[k] += v
+
+    now = datetime.utcnow()
+    for (show_name, hour), d in sorted(acc.items()):  # ordem fixa de travamento
+        if _bump(s, show_name, hour, d, now):
+            continue
+        try:
+            with s.begin_nested():
+                s.execute(insert(SalesHourly).values(show_name=show_name, hour=hour, updated_at=now, **d))
+        except IntegrityError:
+            _bump(s, show_name, hour, d, now)
+
+
+def _bump(s, show_name: str, hour: datetime, d: Dict[str, int], now: datetime) -> bool:
+    values = {k: getattr(SalesHourly, k) + v for k, v in d.items() if v}
+    res = s.execute(
+        update(SalesHourly)
+        .where(SalesHourly.show_name == show_name, SalesHourly.hour == hour)
+        .values(updated_at=now, **values)
+        .execution_options(synchronize_session=False)
+    )
+    return bool(res.rowcount)
+
+
+def backfill(s, since: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Refaz as horas >= since (ou todas) a partir de compras + arquivo. Sem
+    commit. Transições que chegarem durante o backfill podem ficar de fora:
+    rode fora do pico. Retorna {"hours", "purchases"}.
+    """
+    from app_services.archive import payments_union, purchases_union
+
+    p = purchases_union().subquery()
+    pay = payments_union().subquery()
+    acc: Dict[Tuple[str, datetime], Dict[str, int]] = defaultdict(lambda: dict.fromkeys(FIELDS, 0))
+
+    def add(show_name, at, **d):
+        if not show_name or at is None:
+            return
+        h = hour_of(at)
+        if since is not None and h < hour_of(since):
+            return
+        row = acc[(show_name, h)]
+        for k, v in d.items():
+            row[k] += v
+
+    created = select(p.c.show_name, p.c.created_at, p.c.ticket_qty)
+    if since is not None:
+        created = created.where(p.c.created_at >= hour_of(since))
+    n = 0
+    for show_name, at, qty in s.execute(created).yield_per(2000):
+        add(show_name, at, created=1, people=int(qty or 0))
+        n += 1
+
+    # pagas: do log de transições, como o apply() (UTC -> hora de SP, valor do
+    # log). paid_at não serve: webhook MP/PagSeguro grava UTC, admin e
+    # conciliação gravam SP.
+    paid_log = select(PurchaseTransition.show_name, PurchaseTransition.created_at, PurchaseTransition.amount_cents).where(
+        PurchaseTransition.to_status == "paid"
+    )
+    if since is not None:
+        # UTC = SP + 3h: o corte em SP sem converter pega tudo (add() refina)
+        paid_log = paid_log.where(PurchaseTransition.created_at >= hour_of(since))
+    for show_name, at, amount in s.execute(paid_log).yield_per(2000):
+        add(show_name, _sp_hour(at), paid=1, revenue_cents=int(amount or 0))
+
+    # compras pagas antes do log existir: 1º pagamento confirmado (valor como
+    # no log: qtd × preço congelado); melhor esforço, paid_at como gravado
+    logged = select(PurchaseTransition.purchase_id).where(PurchaseTransition.to_status == "paid")
+    paid = (
+        select(p.c.show_name, func.min(pay.c.paid_at), p.c.ticket_qty, p.c.ticket_unit_price_cents)
+        .join(pay, pay.c.purchase_id == p.c.id)
+        .where(pay.c.status == "paid", pay.c.paid_at.is_not(None), p.c.id.not_in(logged))
+        .group_by(p.c.id, p.c.show_name, p.c.ticket_qty, p.c.ticket_unit_price_cents)
+    )
+    if since is not None:
+        paid = paid.having(func.min(pay.c.paid_at) >= hour_of(since))
+    for show_name, at, qty, unit in s.execute(paid).yield_per(2000):
+        add(show_name, at, paid=1, revenue_cents=int(qty or 0) * int(unit or 0))
+
+    cancelled = select(p.c.show_name, p.c.rejected_at).where(
+        p.c.status.in_(CANCELLED), p.c.rejected_at.is_not(None)
+    )
+    if since is not None:
+        cancelled = cancelled.where(p.c.rejected_at >= hour_of(since))
+    for show_name, at in s.execute(cancelled).yield_per(2000):
+        add(show_name, at, cancelled=1)
+
+    # reservas expiradas não têm pagamento: caem na hora em que foram criadas
+    expired = (
+        select(p.c.show_name, func.coalesce(func.max(pay.c.expires_at), p.c.created_at))
+        .outerjoin(pay, pay.c.purchase_id == p.c.id)
+        .where(p.c.status == "expired")
+        .group_by(p.c.id, p.c.show_name, p.c.created_at)
+    )
+    for show_name, at in s.execute(expired).yield_per(2000):
+        add(show_name, at, expired=1)
+
+    stmt = delete(SalesHourly)
+    if since is not None:
+        stmt = stmt.where(SalesHourly.hour >= hour_of(since))
+    s.execute(stmt)
+    now = datetime.utcnow()
+    if acc:
+        s.execute(insert(SalesHourly), [
+            {"show_name": show_name, "hour": hour, "updated_at": now, **d}
+            for (show_name, hour), d in acc.items()
+        ])
+    return {"hours": len(acc), "purchases": n}
+
+
+def shows(s) -> List[str]:
+    return list(s.scalars(select(SalesHourly.show_name).distinct().order_by(SalesHourly.show_name)))
+
+
+def series(s, *, since: datetime, until: datetime, show_name: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Uma linha por hora em [since, until] (horas sem movimento = zeros), somando
+    os shows se show_name não vier. Lê só sales_hourly.
+    """
+    since, until = hour_of(since), hour_of(until)
+    cols = [func.coalesce(func.sum(getattr(SalesHourly, k)), 0).label(k) for k in FIELDS]
+    stmt = (
+        select(SalesHourly.hour, *cols)
+        .where(SalesHourly.hour >= since, SalesHourly.hour <= until)
+        .group_by(SalesHourly.hour)
+    )
+    if show_name:
+        stmt = stmt.where(SalesHourly.show_name == show_name)
+    by_hour = {row.hour: row for row in s.execute(stmt).all()}
+
+    out = []
+    h = since
+    while h <= until:
+        row = by_hour.get(h)
+        item = {"hour": h}
+        item.update({k: int(getattr(row, k)) if row is not None else 0 for k in FIELDS})
+        out.append(item)
+        h += timedelta(hours=1)
+    return out
@@ -0,0 +1,156 @@
+# app_services/show_images.py
+"""
+Imagens dos shows: variantes responsivas em vez da foto original do celular.
+
+O admin sobe a foto → ela fica em STORAGE_DIR/show_uploads/ e um job em
+background gera larguras SHOW_IMAGE_WIDTHS (padrão 480,960,1440) em WebP e
+JPEG, sem metadados (EXIF/GPS) e já rotacionadas, sobe tudo numa sessão FTP
+e grava as URLs em Show.image_variants (JSON). A home monta o srcset.
+
+Os nomes levam o hash do conteúdo (show-<slug>-<hash>-<w>.webp): arquivo
+novo = URL nova, então o host pode servir com cache longo/immutable.
+"""
+import hashlib
+import json
+import os
+import secrets
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from flask import current_app
+
+from db import db
+from models import Show
+
+FORMATS = ("webp", "jpeg")
+UPLOAD_EXTS = {"jpg", "jpeg", "png", "webp"}
+
+
+def widths() -> List[int]:
+    raw = os.getenv("SHOW_IMAGE_WIDTHS", "480,960,1440")
+    return sorted({int(w) for w in raw.split(",") if w.strip().isdigit() and int(w) > 0}) or [960]
+
+
+def _uploads_dir() -> Path:
+    d = Path(current_app.config["STORAGE_DIR"]) / "show_uploads"
+    d.mkdir(parents=True, exist_ok=True)
+    return d
+
+
+def stage_upload(file_storage, show_slug: str) -> Path:
+    """Guarda o upload original para o job processar (o request volta na hora)."""
+    fn = (file_storage.filename or "").lower().strip()
+    ext = fn.rsplit(".", 1)[-1] if "." in fn else ""
+    if ext not in UPLOAD_EXTS:
+        raise ValueError("Formato inválido. Use JPG, PNG ou WEBP.")
+
+    path = _uploads_dir() / f"{show_slug}-{secrets.token_hex(6)}.{ext}"
+    file_storage.save(path)
+    return path
+
+
+def build_variants(src: Path, out_dir: Path, show_slug: str) -> Tuple[List[Tuple[str, int, Path]], Tuple[int, int]]:
+    """
+    Gera as variantes locais. Retorna ([(formato, largura, caminho)], (w, h) original).
+    Nunca amplia: larguras maiores que a foto viram uma só, no tamanho original.
+    """
+    from PIL import Image, ImageOps
+
+    digest = hashlib.sha256(src.read_bytes()).hexdigest()[:10]
+    quality = int(os.getenv("SHOW_IMAGE_QUALITY", "80"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(src) as img:
+        # ✅ JPEG: decodifica já reduzido (draft) — foto de 12MP não vira 36MB de RAM
+        img.draft("RGB", (max(widths()), max(widths())))
+        img = ImageOps.exif_transpose(img)
+        if img.mode in ("RGBA", "LA", "P"):
+            rgba = img.convert("RGBA")
+            img = Image.new("RGB", rgba.size, (255, 255, 255))
+            img.paste(rgba, mask=rgba.getchannel("A"))
+        else:
+            img = img.convert("RGB")
+        orig_w, orig_h = img.size
+
+        targets = sorted({min(w, orig_w) for w in widths()})
+        out: List[Tuple[str, int, Path]] = []
+        for w in targets:
+            h = max(1, round(orig_h * w / orig_w))
+            resized = img if w == orig_w else img.resize((w, h), Image.LANCZOS, reducing_gap=3.0)
+            for fmt in FORMATS:
+                ext = "jpg" if fmt == "jpeg" else fmt
+                path = out_dir / f"show-{show_slug}-{digest}-{w}.{ext}"
+                # sem exif=/icc_profile=: metadados ficam de fora
+                if fmt == "jpeg":
+                    resized.save(path, format="JPEG", quality=quality, optimize=True, progressive=True)
+                else:
+                    resized.save(path, format="WEBP", quality=quality, method=4)
+                out.append((fmt, w, path))
+    return out, (orig_w, orig_h)
+
+
+def process_show_image(show_id: int, src: str) -> None:
+    """Job: variantes + upload FTP + Show.image_variants/image_url."""
+    from app_services.ftp_uploader import upload_files
+
+    src_path = Path(src)
+    if not src_path.exists():
+        return
+
+    with db() as s:
+        sh = s.get(Show, show_id)
+        if not sh:
+            src_path.unlink(missing_ok=True)
+            return
+        slug = sh.slug
+
+    out_dir = _uploads_dir() / f"{slug}-variants"
+    variants, (orig_w, orig_h) = build_variants(src_path, out_dir, slug)
+
+    ok, info = upload_files([(path, path.name) for _, _, path in variants])
+    if not ok:
+        # variantes são refeitas do original; o original fica para o GC (storage_gc)
+        for _, _, path in variants:
+            path.unlink(missing_ok=True)
+        raise RuntimeError(str(info))
+
+    urls = {item["file"]: item["public_url"] for item in info}
+    if not all(urls.values()):
+        raise RuntimeError("FTP_PUBLIC_BASE não configurado (URL pública dos arquivos).")
+    data: Dict[str, object] = {"w": orig_w, "h": orig_h}
+    for fmt in FORMATS:
+        data[fmt] = [[w, urls[path.name]] for f, w, path in variants if f == fmt]
+
+    with db() as s:
+        sh = s.get(Show, show_id)
+        if not sh:
+            return
+        sh.image_variants = json.dumps(data)
+        # ✅ image_url continua valendo (admin, e-mails): JPEG médio em vez do original
+        jpegs = data["jpeg"]
+        sh.image_url = jpegs[len(jpegs) // 2][1]
+        s.commit()
+
+    src_path.unlink(missing_ok=True)
+    for _, _, path in variants:
+        path.unlink(missing_ok=True)
+    current_app.logger.info("[SHOW IMAGE] show=%s variantes=%s", show_id, len(variants))
+
+
+def enqueue(show_id: int, src: Path) -> None:
+    from app_services import background
+
+    background.enqueue(process_show_image, show_id, str(src))
+
+
+def variants_of(show: Show) -> Optional[dict]:
+    try:
+        data = json.loads(getattr(show, "image_variants", None) or "")
+    except ValueError:
+        return None
+    return data if isinstance(data, dict) and data.get("jpeg") else None
+
+
+def srcset(entries: List[List]) -> str:
+    """[[480, url], [960, url]] → "url 480w, url 960w" """
+    return ", ".join(f"{url} {w}w" for w, url in entries)
@@ -0,0 +1,278 @@
+# app_services/storage_gc.py
+"""
+Coletor de lixo do STORAGE_DIR (disco efêmero do Render).
+
+O que pode sair:
+- tickets/<token>/ de compras já FINALIZADAS (tudo já está no FTP) ou cuja
+  compra morreu (expirada/cancelada/rejeitada/excluída): por idade
+  (STORAGE_TICKETS_KEEP_HOURS, padrão 24) e, se o total passar da cota
+  (STORAGE_QUOTA_MB, padrão 512; 0 = sem cota), as menos usadas primeiro
+  (LRU pelo último acesso/modificação) até 90% da cota;
+- temporários: .upload-*/.opt-* do store de comprovantes e originais/variantes
+  que sobraram em show_uploads/ quando o job falhou
+  (STORAGE_TEMP_MAX_AGE_HOURS, padrão 6).
+
+O que NUNCA sai: comprovantes (receipts/) e pré-render de compra ainda
+pendente (é ele que deixa a finalização instantânea).
+
+Roda a cada STORAGE_GC_SECONDS (padrão 900; 0 desliga), pelo CLI
+(`flask --app wsgi storage-gc`) ou pelo botão no painel. Uma trava em
+arquivo no próprio disco evita dois workers varrendo juntos.
+"""
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import select
+
+from db import db
+from models import Payment, Purchase
+
+# status em que o pré-render não serve mais para nada
+DEAD_STATUSES = ("expired", "cancelled", "rejected")
+
+AREAS = ("tickets", "receipts", "show_uploads", "profiles")
+
+_last: Dict[str, Any] = {}
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def quota_bytes() -> int:
+    return int(_env_float("STORAGE_QUOTA_MB", 512) * 1024 * 1024)
+
+
+def _walk(path: Path) -> Tuple[int, int, float]:
+    """(arquivos, bytes, último uso) de uma pasta, sem seguir links."""
+    files = size = 0
+    last = 0.0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except OSError:
+            continue
+        for e in entries:
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    stack.append(Path(e.path))
+                elif e.is_file(follow_symlinks=False):
+                    st = e.stat(follow_symlinks=False)
+                    files += 1
+                    size += st.st_size
+                    last = max(last, st.st_atime, st.st_mtime)
+            except OSError:
+                continue
+    return files, size, last
+
+
+def usage(storage_dir: Path) -> Dict[str, Any]:
+    """{"areas": {nome: {"files", "bytes"}}, "total_bytes", "quota_bytes"}"""
+    storage_dir = Path(storage_dir)
+    areas: Dict[str, Dict[str, int]] = {}
+    total = 0
+    for name in AREAS:
+        files, size, _ = _walk(storage_dir / name)
+        areas[name] = {"files": files, "bytes": size}
+        total += size
+    files, size, _ = _walk(storage_dir)
+    areas["outros"] = {"files": files - sum(a["files"] for a in areas.values()), "bytes": size - total}
+    return {"areas": areas, "total_bytes": size, "quota_bytes": quota_bytes()}
+
+
+@contextmanager
+def _disk_lock(storage_dir: Path) -> Iterator[bool]:
+    """Trava não bloqueante por disco (workers do mesmo container)."""
+    try:
+        import fcntl
+    except ImportError:  # pragma: no cover - Windows (dev)
+        yield True
+        return
+
+    fd = os.open(str(Path(storage_dir) / ".storage-gc.lock"), os.O_CREAT | os.O_RDWR, 0o644)
+    try:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+    finally:
+        os.close(fd)
+
+
+def _remove(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        path.unlink(missing_ok=True)
+
+
+def _sweep_temp(storage_dir: Path, now: float) -> Tuple[int, int]:
+    """Temporários esquecidos pelos caminhos de erro. Retorna (itens, bytes)."""
+    max_age = _env_float("STORAGE_TEMP_MAX_AGE_HOURS", 6) * 3600
+    victims: List[Path] = []
+
+    receipts = storage_dir / "receipts"
+    if receipts.is_dir():
+        for pattern in (".upload-*", "*/.opt-*"):
+            victims += list(receipts.glob(pattern))
+
+    uploads = storage_dir / "show_uploads"
+    if uploads.is_dir():
+        victims += list(uploads.iterdir())
+
+    removed = freed = 0
+    for p in victims:
+        try:
+            if p.is_dir():
+                _, size, last = _walk(p)
+                last = last or p.stat().st_mtime  # pasta vazia
+            else:
+                st = p.stat()
+                size, last = st.st_size, st.st_mtime
+        except OSError:
+            continue
+        if now - last < max_age:
+            continue
+        _remove(p)
+        removed += 1
+        freed += size
+    return removed, freed
+
+
+def _ticket_dirs(storage_dir: Path) -> List[Dict[str, Any]]:
+    base = storage_dir / "tickets"
+    if not base.is_dir():
+        return []
+    out = []
+    for d in base.iterdir():
+        if d.is_dir():
+            _, size, last = _walk(d)
+            out.append({"token": d.name, "path": d, "bytes": size, "last": last or d.stat().st_mtime})
+    return out
+
+
+def _evictable_tokens(tokens: List[str]) -> set:
+    """Tokens cujos arquivos locais já não são necessários."""
+    if not tokens:
+        return set()
+    keep_alive = set()
+    done = set()
+    size = 500
+    with db(fresh=True) as s:
+        for i in range(0, len(tokens), size):
+            chunk = tokens[i:i + size]
+            rows = s.execute(
+                select(Purchase.token, Purchase.status).where(Purchase.token.in_(chunk))
+            ).all()
+            for r in rows:
+                if (r.status or "").lower() not in DEAD_STATUSES:
+                    keep_alive.add(r.token)
+            done.update(s.scalars(
+                select(Purchase.token)
+                .join(Payment, Payment.purchase_id == Purchase.id)
+                .where(Purchase.token.in_(chunk), Payment.tickets_pdf_url.is_not(None))
+            ))
+    # vivas só saem se já finalizadas; sem compra (excluída) ou mortas saem sempre
+    return {t for t in tokens if t not in keep_alive or t in done}
+
+
+def collect(storage_dir: Path) -> Dict[str, Any]:
+    """
+    Uma passada. Retorna {"skipped", "temp_removed", "tickets_removed",
+    "freed_bytes", "over_quota", "usage"}.
+    """
+    storage_dir = Path(storage_dir)
+    result: Dict[str, Any] = {
+        "skipped": False, "temp_removed": 0, "tickets_removed": 0, "freed_bytes": 0, "over_quota": False,
+    }
+    with _disk_lock(storage_dir) as ok:
+        if not ok:
+            result["skipped"] = True
+            return result
+
+        now = time.time()
+        result["temp_removed"], result["freed_bytes"] = _sweep_temp(storage_dir, now)
+
+        dirs = _ticket_dirs(storage_dir)
+        evictable = _evictable_tokens([d["token"] for d in dirs])
+        keep_for = _env_float("STORAGE_TICKETS_KEEP_HOURS", 24) * 3600
+
+        # 1) idade
+        rest = []
+        for d in dirs:
+            if d["token"] in evictable and now - d["last"] >= keep_for:
+                _remove(d["path"])
+                result["tickets_removed"] += 1
+                result["freed_bytes"] += d["bytes"]
+            else:
+                rest.append(d)
+
+        # 2) cota: LRU entre os removíveis até 90% da cota
+        quota = quota_bytes()
+        total = usage(storage_dir)["total_bytes"]
+        if quota > 0 and total > quota:
+            target = int(quota * 0.9)
+            for d in sorted((d for d in rest if d["token"] in evictable), key=lambda d: d["last"]):
+                if total <= target:
+                    break
+                _remove(d["path"])
+                total -= d["bytes"]
+                result["tickets_removed"] += 1
+                result["freed_bytes"] += d["bytes"]
+            result["over_quota"] = total > quota
+
+        result["usage"] = usage(storage_dir)
+        result["finished_at"] = now
+        _publish(result["usage"])
+        _last.clear()
+        _last.update(result)
+    return result
+
+
+def _publish(u: Dict[str, Any]) -> None:
+    from app_services.metrics import STORAGE_BYTES
+
+    for name, a in u["areas"].items():
+        STORAGE_BYTES.labels(area=name).set(a["bytes"])
+
+
+def last_result() -> Optional[Dict[str, Any]]:
+    """Resultado da última passada neste processo (para o painel)."""
+    return dict(_last) if _last else None
+
+
+def _collect_and_log() -> None:
+    from flask import current_app
+
+    res = collect(current_app.config["STORAGE_DIR"])
+    if res["skipped"]:
+        return
+    if res["temp_removed"] or res["tickets_removed"]:
+        current_app.logger.info(
+            "[STORAGE GC] temporários=%s pastas de ingresso=%s liberados=%.1fMB",
+            res["temp_removed"], res["tickets_removed"], res["freed_bytes"] / 1024 / 1024,
+        )
+    if res["over_quota"]:
+        current_app.logger.warning(
+            "[STORAGE GC] acima da cota mesmo após a limpeza: %.1fMB (cota %.0fMB)",
+            res["usage"]["total_bytes"] / 1024 / 1024, quota_bytes() / 1024 / 1024,
+        )
+
+
+def init_app(app) -> None:
+    from app_services import background
+
+    background.periodic(app, "storage-gc", _env_float("STORAGE_GC_SECONDS", 900), _collect_and_log)
@@ -1,15 +1,18 @@
 # app_services/ticket_generator.py
+import os
 import re
 import unicodedata
 from io import BytesIO
 from pathlib import Path
-from typing import Tuple
+from typing import List, Optional, Tuple
 
 from config_ticket import QR_Y_FACTOR, QR_Y_OFFSET, QR_SIZE_PX
 
 import qrcode
 from qrcode.constants import ERROR_CORRECT_Q
-from PIL import Image, ImageDraw, ImageFont
+from PIL import Image, ImageChops, ImageDraw, ImageFont, features
+
+DERIVATIVE_FORMATS = ("webp", "avif")
 
 
 def slug_filename(texto: str) -> str:
@@ -27,14 +30,11 @@ def ensure_dir(p: Path) -> None:
 def _white_to_transparent(img: Image.Image) -> Image.Image:
     """Converte branco (#fff) em transparente (alpha=0), mantendo o restante opaco."""
     img = img.convert("RGBA")
-    data = img.getdata()
-    new_data = []
-    for r, g, b, a in data:
-        if r >= 250 and g >= 250 and b >= 250:
-            new_data.append((r, g, b, 0))
-        else:
-            new_data.append((r, g, b, 255))
-    img.putdata(new_data)
+    # ✅ máscara via point() (C) em vez de loop pixel a pixel em Python
+    r, g, b, _ = img.split()
+    white = [0] * 250 + [255] * 6
+    mask = ImageChops.multiply(ImageChops.multiply(r.point(white), g.point(white)), b.point(white))
+    img.putalpha(ImageChops.invert(mask))
     return img
 
 
@@ -58,8 +58,92 @@ def make_qr_image(data: str, size_px: int = 360) -> Image.Image:
     img = img.convert("RGBA")
     img = _white_to_transparent(img)  # deixa o fundo transparente
 
-    img = img.resize((size_px, size_px), Image.LANCZOS)
+    # ✅ NEAREST mantém os módulos 100% pretos/transparentes (LANCZOS gerava
+    # bordas cinza: paleta maior, PNG maior e leitura pior)
+    img = img.resize((size_px, size_px), Image.NEAREST)
     return img
+
+
+# =========================================================
+# Saída PNG (etapa de codificação)
+# =========================================================
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except ValueError:
+        return default
+
+
+def quantize_image(img: Image.Image, colors: int) -> Image.Image:
+    """
+    Paleta adaptativa (arte chapada + texto + QR cabem em poucas cores).
+    Sem dithering: o QR continua preto puro, sem pontilhado.
+    """
+    if img.mode == "RGBA" and img.getextrema()[3][0] == 255:
+        img = img.convert("RGB")  # alpha todo opaco: descarta o canal
+    return img.quantize(
+        colors=max(2, min(colors, 256)),
+        method=Image.Quantize.FASTOCTREE,
+        dither=Image.Dither.NONE,
+    )
+
+
+def encode_png(
+    img: Image.Image,
+    png_path: Path,
+    *,
+    colors: Optional[int] = None,
+    compress_level: Optional[int] = None,
+) -> Path:
+    """
+    Grava o PNG do ingresso.
+
+    TICKET_PNG_COLORS    paleta adaptativa (padrão 256; 0 = RGBA cheio)
+    TICKET_PNG_COMPRESS  nível zlib 0-9 (padrão 9; a arte é pequena e o
+                         arquivo ainda sobe no FTP, vai no ZIP e no celular)
+    """
+    colors = _env_int("TICKET_PNG_COLORS", 256) if colors is None else colors
+    compress_level = _env_int("TICKET_PNG_COMPRESS", 9) if compress_level is None else compress_level
+
+    out = quantize_image(img, colors) if colors else img
+    out.save(png_path, format="PNG", compress_level=max(0, min(compress_level, 9)))
+    return png_path
+
+
+def derivative_formats() -> List[str]:
+    """TICKET_PNG_DERIVATIVES="webp,avif" (padrão: nenhum). Ignora o que o Pillow não suporta."""
+    wanted = [f.strip().lower() for f in (os.getenv("TICKET_PNG_DERIVATIVES") or "").split(",")]
+    return [f for f in DERIVATIVE_FORMATS if f in wanted and features.check(f)]
+
+
+def save_derivatives(img: Image.Image, png_path: Path, formats: Optional[List[str]] = None) -> List[Path]:
+    """WebP/AVIF ao lado do PNG (mesmo nome, outra extensão)."""
+    quality = _env_int("TICKET_DERIVATIVE_QUALITY", 80)
+    out: List[Path] = []
+    for fmt in (derivative_formats() if formats is None else formats):
+        path = png_path.with_suffix(f".{fmt}")
+        img.save(path, format=fmt.upper(), quality=quality)
+        out.append(path)
+    return out
+
+
+def derivative_paths(png_path: Path) -> List[Path]:
+    """Derivados já gerados para este PNG (para upload/ZIP)."""
+    return [p for p in (png_path.with_suffix(f".{f}") for f in DERIVATIVE_FORMATS) if p.is_file()]
+
+
+def _qr_position(W: int, H: int, qW: int, qH: int, margin: int) -> Tuple[int, int]:
+    # X: centro horizontal
+    x = (W - qW) // 2
+
+    # Y: posição relativa inferior
+    y = int(H * float(QR_Y_FACTOR)) + int(QR_Y_OFFSET)
+
+    # trava para não sair do ticket
+    y = max(margin, min(H - qH - margin, y))
+    return x, y
+
+
 def generate_single_ticket_png(
     *,
     storage_dir: Path,
@@ -75,6 +159,8 @@ def generate_single_ticket_png(
     font_size_show: int = 56,
     font_size_name: int = 72,
     line_spacing: int = 12,
+    qr_img: Optional[Image.Image] = None,
+    qr_margin: int = 40,
 ) -> Path:
     ensure_dir(storage_dir)
     out_dir = storage_dir / event_slug
@@ -113,27 +199,21 @@ def generate_single_ticket_png(
         x = (W - nw) // 2
         draw.text((x, names_y), name_text, font=name_font, fill=(0, 0, 0, 255))
 
-    base_img.save(png_path)
+    # ✅ QR colado antes de gravar: 1 codificação só (antes: salva, reabre, salva)
+    if qr_img is not None:
+        base_img.paste(qr_img, _qr_position(W, H, *qr_img.size, qr_margin), qr_img)
+
+    encode_png(base_img, png_path)
+    save_derivatives(base_img, png_path)
     return png_path
 
 def paste_qr_on_png(png_path: Path, qr_img: Image.Image, *, pos=None, margin=40) -> None:
     img = Image.open(png_path).convert("RGBA")
     W, H = img.size
-    qW, qH = qr_img.size
 
     if pos is None:
-        # X: centro horizontal
-        x = (W - qW) // 2
-
-        # Y: posição relativa inferior
-        y = int(H * float(QR_Y_FACTOR)) + int(QR_Y_OFFSET)
-
-        # trava para não sair do ticket
-        y = max(margin, min(H - qH - margin, y))
-
-        pos = (x, y)
+        pos = _qr_position(W, H, *qr_img.size, margin)
 
     img.paste(qr_img, pos, qr_img)
-    img.save(png_path)
-
-
+    encode_png(img, png_path)
+    save_derivatives(img, png_path)
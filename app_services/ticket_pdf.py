@@ -0,0 +1,153 @@
+# app_services/ticket_pdf.py
+"""
+PDF dos ingressos em vetor (ReportLab), no lugar do PNG 1080x1920 rasterizado.
+
+- A arte base entra UMA vez por documento como Form XObject ("ticket_bg");
+  cada página só referencia o form (o PDF geral de 30 pessoas carrega 1 fundo).
+- Show e nome são texto (fonte TTF embutida, com subset) e o QR é desenhado
+  módulo a módulo como retângulos: nítido em qualquer impressora.
+- Mesmo layout do PNG (ticket_generator): coordenadas em px da arte,
+  convertidas para pontos pelo TICKET_PDF_DPI (padrão 144 → 540x960 pt).
+"""
+import os
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from config_ticket import QR_SIZE_PX, QR_Y_FACTOR, QR_Y_OFFSET
+
+# ✅ muda quando o desenho do PDF muda (invalida pré-render antigo)
+LAYOUT_VERSION = "vector-1"
+
+# mesmos padrões do generate_single_ticket_png
+SHOW_Y = 350
+NAMES_Y = 480
+FONT_SIZE_SHOW = 56
+FONT_SIZE_NAME = 72
+QR_MARGIN = 40
+
+_BG_FORM = "ticket_bg"
+
+
+def _register_font(path: Path, fallback: str = "Helvetica") -> str:
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+
+    name = f"ticket-{path.stem}"
+    if name in pdfmetrics.getRegisteredFontNames():
+        return name
+    try:
+        pdfmetrics.registerFont(TTFont(name, str(path)))
+    except Exception:
+        return fallback
+    return name
+
+
+def _qr_matrix(data: str) -> List[List[bool]]:
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_Q
+
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_CORRECT_Q, box_size=1, border=2)
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+class TicketPdfLayout:
+    """
+    Arte + fontes carregadas uma vez; depois é só desenhar páginas.
+
+        layout = TicketPdfLayout(base_image_path, font_show_path, font_names_path)
+        layout.write(pdf_path, [(show, nome, url_qr), ...])
+    """
+
+    def __init__(self, base_image_path: Path, font_show_path: Path, font_names_path: Path):
+        from PIL import Image
+
+        with Image.open(base_image_path) as img:
+            self.width_px, self.height_px = img.size
+        self.base_image_path = Path(base_image_path)
+        self.scale = 72.0 / float(os.getenv("TICKET_PDF_DPI", "144"))
+        self.page_size = (self.width_px * self.scale, self.height_px * self.scale)
+        self.font_show = _register_font(Path(font_show_path))
+        self.font_name = _register_font(Path(font_names_path))
+
+    # ---------- coordenadas ----------
+    def _pt(self, px: float) -> float:
+        return px * self.scale
+
+    def _baseline(self, top_px: int, font: str, size_px: int) -> float:
+        """Pillow posiciona pelo topo do texto; o PDF pela linha de base (y de baixo pra cima)."""
+        from reportlab.pdfbase import pdfmetrics
+
+        ascent_px = pdfmetrics.getAscent(font, size_px)
+        return self.page_size[1] - self._pt(top_px + ascent_px)
+
+    def _qr_box(self) -> Tuple[float, float, float]:
+        """(x, y, lado) do QR em pontos, mesma regra do paste_qr_on_png."""
+        y_px = int(self.height_px * float(QR_Y_FACTOR)) + int(QR_Y_OFFSET)
+        y_px = max(QR_MARGIN, min(self.height_px - QR_SIZE_PX - QR_MARGIN, y_px))
+        x_px = (self.width_px - QR_SIZE_PX) // 2
+        side = self._pt(QR_SIZE_PX)
+        return self._pt(x_px), self.page_size[1] - self._pt(y_px) - side, side
+
+    # ---------- desenho ----------
+    def _define_background(self, c) -> None:
+        w, h = self.page_size
+        c.beginForm(_BG_FORM, lowerx=0, lowery=0, upperx=w, uppery=h)
+        c.drawImage(str(self.base_image_path), 0, 0, w, h, mask="auto")
+        c.endForm()
+
+    def _draw_qr(self, c, data: str) -> None:
+        matrix = _qr_matrix(data)
+        x0, y0, side = self._qr_box()
+        cell = side / len(matrix)
+
+        # ✅ 1 retângulo por sequência de módulos pretos na linha (menos operadores)
+        path = c.beginPath()
+        top = y0 + side
+        for r, row in enumerate(matrix):
+            c_start = None
+            for col, dark in enumerate(row + [False]):
+                if dark and c_start is None:
+                    c_start = col
+                elif not dark and c_start is not None:
+                    path.rect(x0 + c_start * cell, top - (r + 1) * cell, (col - c_start) * cell, cell)
+                    c_start = None
+        c.setFillColorRGB(0, 0, 0)
+        c.drawPath(path, stroke=0, fill=1)
+
+    def _draw_page(self, c, show_name: str, person_name: str, qr_data: str) -> None:
+        w, _ = self.page_size
+        c.doForm(_BG_FORM)
+        c.setFillColorRGB(0, 0, 0)
+
+        if show_name:
+            c.setFont(self.font_show, self._pt(FONT_SIZE_SHOW))
+            c.drawCentredString(w / 2, self._baseline(SHOW_Y, self.font_show, FONT_SIZE_SHOW), show_name)
+
+        name_text = (person_name or "").strip()
+        if name_text:
+            c.setFont(self.font_name, self._pt(FONT_SIZE_NAME))
+            c.drawCentredString(w / 2, self._baseline(NAMES_Y, self.font_name, FONT_SIZE_NAME), name_text)
+
+        self._draw_qr(c, qr_data)
+        c.showPage()
+
+    def write(self, pdf_path: Path, pages: Iterable[Tuple[str, str, str]]) -> Path:
+        """Grava um PDF com 1 página por (show, nome, dado do QR); fundo compartilhado."""
+        from reportlab.pdfgen import canvas
+
+        pdf_path = Path(pdf_path)
+        pdf_path.parent.mkdir(parents=True, exist_ok=True)
+
+        c = canvas.Canvas(str(pdf_path), pagesize=self.page_size, pageCompression=1)
+        c.setTitle("Ingressos")
+        self._define_background(c)
+        count = 0
+        for show_name, person_name, qr_data in pages:
+            self._draw_page(c, show_name, person_name, qr_data)
+            count += 1
+        if not count:
+            raise RuntimeError("Nenhum ingresso para gerar PDF.")
+        c.save()
+        return pdf_path
@@ -0,0 +1,162 @@
+# app_services/ticket_sig.py
+"""
+QR do ingresso compacto e assinado: BASE_URL/T/<payload>.
+
+payload = base32 (sem "=") de:
+    1 byte   versão (4 bits) | kid da chave (4 bits)
+    varint   id do ticket
+    varint   id do show
+    varint   emissão (epoch, segundos)
+    10 bytes HMAC-SHA256(chave[kid], bytes acima) truncado (80 bits)
+
+Base32 + URL em maiúsculas cabem no modo ALFANUMÉRICO do QR (5,5 bits por
+caractere, contra 8 do modo byte do token_urlsafe): QR de versão menor,
+módulos maiores, leitura mais rápida na portaria escura.
+
+Chaves: TICKET_SIGNING_KEYS="2:segredo-novo,1:segredo-antigo" (kid 0–15).
+A primeira assina, todas verificam. Rotação: põe a nova na frente; tira a
+antiga depois que os shows com ingressos dela passarem. Sem a variável os
+ingressos continuam com /ticket/<token> (as duas rotas convivem).
+
+verify() não consulta o banco: QR falso/corrompido é recusado em
+microssegundos sem tocar no banco. Cancelamento depois da emissão só o banco
+sabe: /T/<payload> e /T/<payload>/check ainda olham ticket, compra e show
+numa query por PK. Chave malformada derruba o boot (init_app), não a leitura.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import time
+from functools import lru_cache
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+VERSION = 1
+MAC_BYTES = 10
+MAX_PAYLOAD_CHARS = 64
+
+
+@lru_cache(maxsize=4)
+def _parse_keys(raw: str) -> Tuple[Tuple[int, bytes], ...]:
+    keys = []
+    for item in raw.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        kid, sep, secret = item.partition(":")
+        if not sep or not kid.strip().isdigit() or not 0 <= int(kid) <= 15 or len(secret.strip()) < 16:
+            raise RuntimeError("TICKET_SIGNING_KEYS inválido: use kid:segredo (kid 0–15, segredo com 16+ caracteres).")
+        keys.append((int(kid), secret.strip().encode("utf-8")))
+    return tuple(keys)
+
+
+def _keys() -> Tuple[Tuple[int, bytes], ...]:
+    return _parse_keys((os.getenv("TICKET_SIGNING_KEYS") or "").strip())
+
+
+def init_app(app) -> None:
+    """Confere TICKET_SIGNING_KEYS no boot: chave malformada derruba o deploy, não cada leitura na portaria."""
+    kids = [kid for kid, _ in _keys()]
+    if len(set(kids)) != len(kids):
+        raise RuntimeError("TICKET_SIGNING_KEYS inválido: kid repetido.")
+
+
+def enabled() -> bool:
+    return bool(_keys())
+
+
+def active_kid() -> Optional[int]:
+    """kid que assina agora (None = QR antigo). Entra na impressão digital do pré-render."""
+    keys = _keys()
+    return keys[0][0] if keys else None
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        b = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(b | 0x80)
+        else:
+            out.append(b)
+            return bytes(out)
+
+
+def _read_varint(buf: bytes, i: int) -> Tuple[int, int]:
+    n = shift = 0
+    while i < len(buf) and shift <= 35:
+        b = buf[i]
+        i += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, i
+        shift += 7
+    raise ValueError("varint truncado")
+
+
+def _mac(key: bytes, body: bytes) -> bytes:
+    return hmac.new(key, body, hashlib.sha256).digest()[:MAC_BYTES]
+
+
+def sign(ticket_id: int, show_id: int, issued_at: Optional[int] = None) -> str:
+    keys = _keys()
+    if not keys:
+        raise RuntimeError("TICKET_SIGNING_KEYS não configurado.")
+    kid, key = keys[0]
+    issued_at = int(time.time()) if issued_at is None else int(issued_at)
+    body = bytes([(VERSION << 4) | kid]) + _varint(int(ticket_id)) + _varint(int(show_id or 0)) + _varint(issued_at)
+    return base64.b32encode(body + _mac(key, body)).decode("ascii").rstrip("=")
+
+
+def verify(payload: str) -> Optional[Dict[str, Any]]:
+    """
+    {"ticket_id", "show_id", "issued_at", "kid"} se a assinatura confere
+    com alguma chave ativa; None se não (sem exceção, sem banco).
+    """
+    payload = (payload or "").strip().upper()
+    if not payload or len(payload) > MAX_PAYLOAD_CHARS:
+        return None
+    try:
+        raw = base64.b32decode(payload + "=" * (-len(payload) % 8))
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) <= MAC_BYTES + 1:
+        return None
+
+    body, mac = raw[:-MAC_BYTES], raw[-MAC_BYTES:]
+    if body[0] >> 4 != VERSION:
+        return None
+    try:
+        key = dict(_keys()).get(body[0] & 0x0F)
+    except RuntimeError:  # já barrado no init_app; aqui só não vira 500
+        return None
+    if key is None or not hmac.compare_digest(mac, _mac(key, body)):
+        return None
+
+    try:
+        ticket_id, i = _read_varint(body, 1)
+        show_id, i = _read_varint(body, i)
+        issued_at, i = _read_varint(body, i)
+    except ValueError:
+        return None
+    if i != len(body):
+        return None
+    return {"ticket_id": ticket_id, "show_id": show_id, "issued_at": issued_at, "kid": body[0] & 0x0F}
+
+
+def _qr_base(base_url: str) -> str:
+    """Esquema + host em maiúsculas (DNS não diferencia): a URL inteira fica alfanumérica."""
+    parts = urlsplit(base_url.rstrip("/"))
+    if not parts.scheme or not parts.netloc:
+        return base_url.rstrip("/")
+    return f"{parts.scheme.upper()}://{parts.netloc.upper()}{parts.path}"
+
+
+def ticket_url(base_url: str, *, ticket_id: int, token: str, show_id: int, issued_at: Optional[int] = None) -> str:
+    """URL do QR: assinada (/T/<payload>) se houver chave, senão a antiga /ticket/<token>."""
+    if not enabled():
+        return f"{base_url}/ticket/{token}"
+    return f"{_qr_base(base_url)}/T/{sign(ticket_id, show_id, issued_at)}"
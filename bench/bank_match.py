@@ -0,0 +1,139 @@
+# bench/bank_match.py
+"""
+Casamento extrato × Pix manual pendente com dados sintéticos (sem banco/Flask).
+
+Gera N compras pendentes e um extrato CSV com M créditos: parte paga compras
+(com CPF inteiro, mascarado ou só o nome), parte é ruído com valores repetidos.
+Mede parse + match e confere que nenhuma proposta que já vem marcada na tela
+("alta"/"media") está errada. Roda duas vezes: preços variados e preço único
+(show com 1 valor só — o índice por valor não recorta nada, quem filtra é o
+índice por CPF/nome).
+
+    python bench/bank_match.py
+    python bench/bank_match.py --pending 3000 --credits 5000 --budget-ms 1000
+"""
+import argparse
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from app_services import bank_statement  # noqa: E402
+
+FIRST = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Íris", "João", "Luana", "Marcos"]
+LAST = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Araújo", "Costa", "Ribeiro", "Almeida"]
+# quem manda Pix que não é de ingresso (aluguel, fornecedor…) — outra gente
+NOISE_FIRST = ["Paulo", "Renata", "Sérgio", "Tatiane", "Ulisses", "Vera", "Wagner", "Yara"]
+PRICES = [5000, 8000, 10000, 12000, 15000, 16000, 24000]
+
+
+def _cpf() -> str:
+    return "".join(random.choice("0123456789") for _ in range(11))
+
+
+def _synthetic(n_pending: int, n_credits: int, paid_ratio: float, prices=PRICES, max_qty: int = 4):
+    base = datetime(2026, 3, 1, 12, 0)
+    pending = []
+    for i in range(n_pending):
+        qty = random.randint(1, max_qty)
+        pending.append({
+            "purchase_id": i + 1,
+            "token": f"tok{i}",
+            "buyer_name": f"{random.choice(FIRST)} {random.choice(LAST)} {random.choice(LAST)}",
+            "cpf_digits": _cpf(),
+            "amount_cents": random.choice(prices) * qty,
+            "created_at": base + timedelta(minutes=random.randint(0, 60 * 24 * 14)),
+        })
+
+    lines = ["Data;Histórico;Documento;Valor"]
+    truth = {}
+    payers = random.sample(pending, int(n_pending * paid_ratio))
+    for p in payers:
+        at = p["created_at"] + timedelta(minutes=random.randint(1, 60 * 30))
+        style = random.random()
+        cpf = p["cpf_digits"]
+        if style < 0.4:
+            who = f"{p['buyer_name'].upper()} {cpf[:3]}.{cpf[3:6]}.{cpf[6:9]}-{cpf[9:]}"
+        elif style < 0.8:
+            who = f"{p['buyer_name'].split()[0].upper()} ***.{cpf[3:6]}.{cpf[6:9]}-**"
+        else:
+            who = p["buyer_name"]
+        doc = f"D{len(truth)}"
+        truth[doc] = p["purchase_id"]
+        amount = f"{p['amount_cents'] // 100},{p['amount_cents'] % 100:02d}"
+        lines.append(f"{at:%d/%m/%Y %H:%M};PIX RECEBIDO {who};{doc};{amount}")
+
+    while len(lines) - 1 < n_credits:
+        at = datetime(2026, 3, 1) + timedelta(minutes=random.randint(0, 60 * 24 * 15))
+        cents = random.choice(prices) * random.randint(1, max_qty) if random.random() < 0.5 else random.randint(-90000, 90000)
+        who = f"{random.choice(NOISE_FIRST)} {random.choice(LAST)}".upper()
+        amount = f"{abs(cents) // 100},{abs(cents) % 100:02d}"
+        lines.append(f"{at:%d/%m/%Y %H:%M};PIX {'RECEBIDO' if cents > 0 else 'ENVIADO'} {who};N{len(lines)};"
+                     f"{'-' if cents < 0 else ''}{amount}")
+
+    body = lines[1:]
+    random.shuffle(body)
+    return pending, "\n".join(lines[:1] + body).encode("cp1252"), truth
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--pending", type=int, default=3000)
+    ap.add_argument("--credits", type=int, default=5000)
+    ap.add_argument("--paid-ratio", type=float, default=0.6)
+    ap.add_argument("--budget-ms", type=float, default=1000)
+    args = ap.parse_args()
+
+    # preço único (1 ingresso, 1 valor): o índice por valor não recorta nada
+    scenarios = [("preços variados", PRICES, 4), ("preço único", PRICES[:1], 1)]
+    problems = []
+    for label, prices, max_qty in scenarios:
+        random.seed(7)
+        problems += [f"{label}: {p}" for p in _run(label, args, prices, max_qty)]
+
+    for p in problems:
+        print(f"❌ {p}")
+    if not problems:
+        print("✅ dentro do orçamento, nenhuma proposta pré-marcada errada")
+    return 1 if problems else 0
+
+
+def _run(label: str, args, prices, max_qty: int) -> list:
+    pending, raw, truth = _synthetic(args.pending, args.credits, args.paid_ratio, prices, max_qty)
+
+    t0 = time.perf_counter()
+    credits = bank_statement.parse_statement(raw, "extrato.csv")
+    t1 = time.perf_counter()
+    rows = bank_statement.match_credits(credits, pending)
+    t2 = time.perf_counter()
+
+    by_conf = {"alta": [0, 0], "media": [0, 0], "baixa": [0, 0]}  # [certas, erradas]
+    for r in rows:
+        if not r["purchase"]:
+            continue
+        ok = truth.get(r["credit"]["fitid"]) == r["purchase"]["purchase_id"]
+        by_conf[r["confidence"]][0 if ok else 1] += 1
+    found = sum(v[0] for v in by_conf.values())
+
+    total_ms = (t2 - t0) * 1000
+    print(f"[{label}] créditos={len(credits)} pendentes={len(pending)} pagos de verdade={len(truth)} "
+          f"valores distintos={len({p['amount_cents'] for p in pending})}")
+    print(f"parse={(t1 - t0) * 1000:.1f}ms match={(t2 - t1) * 1000:.1f}ms total={total_ms:.1f}ms")
+    for conf, (good, bad) in by_conf.items():
+        print(f"  {conf:5}: {good} certas, {bad} erradas")
+    print(f"recall={found / max(1, len(truth)):.1%}")
+
+    problems = []
+    if total_ms > args.budget_ms:
+        problems.append(f"{total_ms:.0f}ms > orçamento de {args.budget_ms:.0f}ms")
+    for conf in ("alta", "media"):
+        if by_conf[conf][1]:
+            problems.append(f"{by_conf[conf][1]} proposta(s) de confiança {conf} erradas")
+    return problems
+
+if __name__ == "__main__":
+    sys.exit(main())
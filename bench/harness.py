@@ -0,0 +1,476 @@
+# bench/harness.py
+"""
+Benchmark ponta a ponta com dublês locais (nada sai da máquina).
+
+- Banco: SQLite temporário (padrão) ou Postgres local via --db-url.
+- FTP:   pyftpdlib numa thread (uploads da finalização).
+- SMTP:  aiosmtpd como "sink" (aceita login e descarta).
+
+Sobe create_app(), popula shows + milhares de compras com acompanhantes e roda
+os cenários com o test_client do Flask em N threads. Saída em JSON:
+throughput, p50/p95/p99 e RSS por cenário (início/pico/crescimento, amostrado
+durante o cenário) — guarde como baseline e compare depois de cada mudança de
+performance. "peak_rss_mb" no topo é o pico do processo na rodada inteira.
+
+    pip install pyftpdlib aiosmtpd
+    python bench/harness.py --out bench/baseline.json
+    python bench/harness.py --scenarios home,admin_pending --requests 500 -c 8
+    python bench/harness.py --db-url postgresql://localhost/bench_ingressos
+
+Sem pyftpdlib os cenários de finalização são pulados; sem aiosmtpd os
+e-mails falham rápido (e são registrados como erro, como em produção).
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import secrets
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+EVENT_SLUG = "sons-e-sabores"
+FIRST_NAMES = ["Ana", "Bruno", "Carla", "Diego", "Elisa", "Fábio", "Gabriela", "Heitor", "Íris", "João",
+               "Larissa", "Marcos", "Natália", "Otávio", "Paula", "Rafael", "Sofia", "Tiago", "Vitória"]
+LAST_NAMES = ["Silva", "Souza", "Oliveira", "Santos", "Pereira", "Lima", "Carvalho", "Ferreira", "Almeida"]
+
+
+# ---------------------------
+# dublês (FTP / SMTP)
+# ---------------------------
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_ftp(root: Path):
+    try:
+        from pyftpdlib.authorizers import DummyAuthorizer
+        from pyftpdlib.handlers import FTPHandler
+        from pyftpdlib.servers import ThreadedFTPServer
+    except ImportError:
+        return None
+
+    root.mkdir(parents=True, exist_ok=True)
+    auth = DummyAuthorizer()
+    auth.add_user("bench", "bench", str(root), perm="elradfmw")
+    handler = type("BenchFTPHandler", (FTPHandler,), {"authorizer": auth, "banner": "bench"})
+    port = _free_port()
+    server = ThreadedFTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, kwargs={"handle_exit": False}, daemon=True).start()
+
+    os.environ.update({
+        "FTP_HOSTS": "127.0.0.1",
+        "FTP_PORT": str(port),
+        "FTP_SECURITY": "none",
+        "FTP_PASSIVE": "1",
+        "FTP_USERNAME": "bench",
+        "FTP_PASSWORD": "bench",
+        "FTP_DIR": "/",
+        "FTP_PUBLIC_BASE": "http://127.0.0.1/bench-files",
+    })
+    return server
+
+
+def start_smtp():
+    try:
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+    except ImportError:
+        return None
+
+    class Sink:
+        count = 0
+
+        async def handle_DATA(self, server, session, envelope):
+            Sink.count += 1
+            return "250 OK"
+
+    port = _free_port()
+    controller = Controller(
+        Sink(), hostname="127.0.0.1", port=port,
+        auth_require_tls=False,
+        authenticator=lambda *args, **kwargs: AuthResult(success=True),
+    )
+    controller.start()
+
+    os.environ.update({
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(port),
+        "SMTP_TLS": "0",
+        "SMTP_USERNAME": "bench",
+        "SMTP_PASSWORD": "bench",
+        "SMTP_FROM": "bench@example.com",
+    })
+    return controller
+
+
+# ---------------------------
+# dados
+# ---------------------------
+def _cpf() -> str:
+    digits = [random.randint(0, 9) for _ in range(9)]
+    for n in (10, 11):
+        total = sum(d * w for d, w in zip(digits, range(n, 1, -1)))
+        dv = (total * 10) % 11
+        digits.append(0 if dv == 10 else dv)
+    return "".join(map(str, digits))
+
+
+def _name() -> str:
+    return f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
+
+
+def _phone() -> str:
+    return f"(31) 9{random.randint(1000, 9999)}-{random.randint(1000, 9999)}"
+
+
+def seed(purchases: int, group_sizes: list[int], per_group: int) -> dict:
+    """Popula o banco e devolve tokens/ids usados nos cenários."""
+    from db import db
+    from models import Event, Payment, Purchase, Show
+
+    statuses = ["pending_payment", "reservation_pending", "reservation_pending_price", "reserved", "paid", "cancelled"]
+    now = datetime.utcnow()
+    out = {"shows": [], "status_tokens": [], "finalize": {n: [] for n in group_sizes}}
+
+    with db() as s:
+        ev = Event(name="Sons & Sabores", slug=EVENT_SLUG)
+        s.add(ev)
+        s.flush()
+
+        shows = [
+            Show(name="Reserva Livre", slug="reserva-livre", date_text="Sex 20h", is_active=1,
+                 requires_ticket=0, capacity=0),
+            Show(name="Show Pago", slug="show-pago", date_text="Sáb 21h", is_active=1,
+                 requires_ticket=1, price_cents=5000, capacity=0),
+            Show(name="Show Preço a Definir", slug="show-preco", date_text="Dom 18h", is_active=1,
+                 requires_ticket=1, price_cents=None, capacity=0),
+        ]
+        s.add_all(shows)
+        s.flush()
+        out["shows"] = [sh.name for sh in shows]
+
+        rows = []
+        for i in range(purchases):
+            guests = [_name() for _ in range(random.choice([0, 0, 1, 1, 2, 3, 4]))]
+            status = random.choice(statuses)
+            rows.append(Purchase(
+                event_id=ev.id,
+                token=secrets.token_urlsafe(18),
+                show_name=random.choice(out["shows"]),
+                buyer_name=_name(),
+                buyer_cpf=_cpf(),
+                buyer_email=f"comprador{i}@example.com",
+                buyer_phone=_phone(),
+                guests_text="\n".join(guests),
+                status=status,
+                created_at=now - timedelta(minutes=random.randint(0, 60 * 24 * 30)),
+                ticket_qty=1 + len(guests),
+                ticket_unit_price_cents=5000,
+            ))
+        s.add_all(rows)
+        s.flush()
+        s.add_all([
+            Payment(purchase_id=p.id, provider="manual_pix", amount_cents=5000 * p.ticket_qty,
+                    status="paid" if p.status == "paid" else "pending")
+            for p in rows
+        ])
+        out["status_tokens"] = [p.token for p in rows[:200]]
+
+        # compras pendentes de pagamento para finalizar (grupos de 1/5/20 pessoas)
+        for size in group_sizes:
+            for _ in range(per_group):
+                p = Purchase(
+                    event_id=ev.id,
+                    token=secrets.token_urlsafe(18),
+                    show_name="Show Pago",
+                    buyer_name=_name(),
+                    buyer_cpf=_cpf(),
+                    buyer_email="grupo@example.com",
+                    buyer_phone=_phone(),
+                    guests_text="\n".join(_name() for _ in range(size - 1)),
+                    status="pending_payment",
+                    created_at=now,
+                    ticket_qty=size,
+                    ticket_unit_price_cents=5000,
+                )
+                s.add(p)
+                s.flush()
+                s.add(Payment(purchase_id=p.id, provider="manual_pix", amount_cents=5000 * size, status="pending"))
+                out["finalize"][size].append(p.token)
+        s.commit()
+    return out
+
+
+# ---------------------------
+# execução
+# ---------------------------
+def _percentile(sorted_vals: list[float], pct: float) -> float:
+    if not sorted_vals:
+        return 0.0
+    k = (len(sorted_vals) - 1) * pct / 100
+    lo, hi = int(k), min(int(k) + 1, len(sorted_vals) - 1)
+    return sorted_vals[lo] + (sorted_vals[hi] - sorted_vals[lo]) * (k - lo)
+
+
+def _peak_rss_mb() -> float:
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def _current_rss_mb() -> float | None:
+    """RSS atual (Linux, /proc); None onde não dá para ler."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class _RssSampler:
+    """
+    Pico de RSS DURANTE um cenário (amostra a cada `interval` s numa thread).
+    ru_maxrss é o pico do processo inteiro: carregaria os cenários anteriores.
+    Sem /proc (macOS) só sobra o crescimento do ru_maxrss no cenário.
+    """
+
+    def __init__(self, interval: float = 0.02):
+        self.interval = interval
+        self.start = _current_rss_mb()
+        self.peak = self.start
+        self._maxrss0 = _peak_rss_mb()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self) -> None:
+        rss = _current_rss_mb()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def __enter__(self):
+        if self.start is not None:
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._sample()
+
+    def result(self) -> dict:
+        r = lambda v: round(v, 1) if v is not None else None  # noqa: E731
+        if self.start is None:
+            return {"rss_start_mb": None, "rss_peak_mb": None,
+                    "rss_growth_mb": r(_peak_rss_mb() - self._maxrss0)}
+        return {"rss_start_mb": r(self.start), "rss_peak_mb": r(self.peak),
+                "rss_growth_mb": r(self.peak - self.start)}
+
+
+def run_scenario(app, name: str, make_request, total: int, concurrency: int, admin: bool) -> dict:
+    """make_request(client, i) -> response; roda `total` chamadas em `concurrency` threads."""
+    latencies: list[float] = []
+    errors = 0
+    lock = threading.Lock()
+    counter = iter(range(total))
+
+    def worker():
+        nonlocal errors
+        client = app.test_client()
+        if admin:
+            with client.session_transaction() as sess:
+                sess["is_admin"] = True
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            t0 = time.perf_counter()
+            try:
+                resp = make_request(client, i)
+                ok = resp.status_code < 400
+                resp.close()
+            except Exception:
+                ok = False
+            dt = time.perf_counter() - t0
+            with lock:
+                latencies.append(dt)
+                if not ok:
+                    errors += 1
+
+    with _RssSampler() as rss:
+        t_start = time.perf_counter()
+        threads = [threading.Thread(target=worker) for _ in range(max(1, concurrency))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        wall = time.perf_counter() - t_start
+
+    lat = sorted(latencies)
+    ms = lambda v: round(v * 1000, 2)  # noqa: E731
+    return {
+        "scenario": name,
+        "requests": len(lat),
+        "errors": errors,
+        "concurrency": concurrency,
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(lat) / wall, 2) if wall else 0.0,
+        "p50_ms": ms(_percentile(lat, 50)),
+        "p95_ms": ms(_percentile(lat, 95)),
+        "p99_ms": ms(_percentile(lat, 99)),
+        "max_ms": ms(lat[-1]) if lat else 0.0,
+        "mean_ms": ms(statistics.fmean(lat)) if lat else 0.0,
+        # deste cenário (início, pico e crescimento); o pico do processo todo fica no topo do JSON
+        **rss.result(),
+    }
+
+
+def build_scenarios(data: dict, args) -> dict:
+    shows = data["shows"]
+    tokens = data["status_tokens"]
+
+    def buy_post(client, i):
+        show = random.choice(shows)
+        return client.post(f"/buy/{EVENT_SLUG}", data={
+            "show_name": show,
+            "buyer_name": _name(),
+            "buyer_cpf": _cpf(),
+            "buyer_email": f"novo{i}-{secrets.token_hex(3)}@example.com",
+            "buyer_phone": _phone(),
+            "guests_text": "\n".join(_name() for _ in range(random.randint(0, 3))),
+        })
+
+    scenarios = {
+        # (função, total de requisições, concorrência, precisa de admin)
+        "home": (lambda c, i: c.get("/"), args.requests, args.concurrency, False),
+        "buy_page": (lambda c, i: c.get(f"/buy/{EVENT_SLUG}"), args.requests, args.concurrency, False),
+        "buy_post_burst": (buy_post, args.requests, args.concurrency, False),
+        "status_page": (lambda c, i: c.get(f"/status/{tokens[i % len(tokens)]}"), args.requests, args.concurrency, False),
+        "status_json": (lambda c, i: c.get(f"/api/status/{tokens[i % len(tokens)]}"), args.requests, args.concurrency, False),
+        "admin_pending": (lambda c, i: c.get("/admin/pending"), args.admin_requests, args.concurrency, True),
+        "admin_purchases": (lambda c, i: c.get("/admin/purchases"), args.admin_requests, args.concurrency, True),
+        "admin_reservations": (lambda c, i: c.get("/admin/reservations"), args.admin_requests, args.concurrency, True),
+        "portaria_pdf": (
+            lambda c, i: c.get("/admin/reservations/portaria.pdf", query_string={"show": shows[i % len(shows)]}),
+            args.admin_requests, args.concurrency, True,
+        ),
+    }
+
+    for size, group_tokens in data["finalize"].items():
+        if not group_tokens or not args.ftp:
+            continue
+        scenarios[f"mark_paid_finalize_{size}p"] = (
+            lambda c, i, toks=group_tokens: c.post(f"/admin/mark-paid/{toks[i]}"),
+            len(group_tokens), 1, True,
+        )
+    return scenarios
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--db-url", default="", help="padrão: SQLite temporário")
+    ap.add_argument("--purchases", type=int, default=3000)
+    ap.add_argument("--requests", type=int, default=300, help="requisições por cenário público")
+    ap.add_argument("--admin-requests", type=int, default=40, help="requisições por cenário admin")
+    ap.add_argument("--finalize-per-group", type=int, default=3)
+    ap.add_argument("--groups", default="1,5,20")
+    ap.add_argument("-c", "--concurrency", type=int, default=4)
+    ap.add_argument("--scenarios", default="", help="lista separada por vírgula (padrão: todos)")
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--out", default="", help="arquivo JSON de saída (padrão: stdout)")
+    args = ap.parse_args()
+
+    random.seed(args.seed)
+    tmp = Path(tempfile.mkdtemp(prefix="bench-harness-"))
+
+    os.environ["DATABASE_URL"] = args.db_url or f"sqlite:///{tmp}/bench.db"
+    os.environ["DB_AUTO_CREATE"] = "1"
+    os.environ["STORAGE_DIR"] = str(tmp / "storage")
+    os.environ["BASE_URL"] = "http://127.0.0.1:5005"
+    os.environ.setdefault("ADMIN_PASSWORD", "bench")
+    os.environ.setdefault("TICKET_FONT_SHOW", str(ROOT / "static/fonts/Poppins-SemiBold.ttf"))
+    os.environ.setdefault("TICKET_FONT_NAME", str(ROOT / "static/fonts/Poppins-SemiBold.ttf"))
+    os.environ.pop("PROMETHEUS_MULTIPROC_DIR", None)
+
+    args.ftp = start_ftp(tmp / "ftp") is not None
+    smtp = start_smtp()
+
+    os.chdir(ROOT)  # caminhos relativos de static/ no app
+    from app import create_app
+
+    app = create_app()
+    app.logger.setLevel("ERROR")
+
+    t0 = time.perf_counter()
+    data = seed(args.purchases, [int(x) for x in args.groups.split(",") if x.strip()], args.finalize_per_group)
+    seed_s = time.perf_counter() - t0
+
+    scenarios = build_scenarios(data, args)
+    wanted = [s.strip() for s in args.scenarios.split(",") if s.strip()] or list(scenarios)
+
+    results = []
+    for name in wanted:
+        if name not in scenarios:
+            print(f"cenário desconhecido/pulado: {name}", file=sys.stderr)
+            continue
+        fn, total, conc, admin = scenarios[name]
+        res = run_scenario(app, name, fn, total, conc, admin)
+        results.append(res)
+        print(f"{name:28s} {res['throughput_rps']:8.1f} req/s  p50 {res['p50_ms']:7.1f}  "
+              f"p95 {res['p95_ms']:7.1f}  p99 {res['p99_ms']:7.1f} ms  erros {res['errors']}",
+              file=sys.stderr)
+
+    if smtp is not None:
+        smtp.stop()
+
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True).stdout.strip()
+    except OSError:
+        rev = ""
+
+    report = {
+        "meta": {
+            "git_rev": rev,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "db": "sqlite" if not args.db_url else args.db_url.split(":", 1)[0],
+            "purchases": args.purchases,
+            "seed_s": round(seed_s, 2),
+            "ftp": args.ftp,
+            "smtp": smtp is not None,
+            "when": datetime.utcnow().isoformat() + "Z",
+        },
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "scenarios": results,
+    }
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        Path(args.out).write_text(text + "\n", encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
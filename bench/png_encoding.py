@@ -0,0 +1,152 @@
+# bench/png_encoding.py
+"""
+Codificação do PNG do ingresso: tamanho x tempo de encode por variante
+(RGBA cheio, paleta adaptativa, nível zlib, WebP/AVIF) — e se o QR continua
+legível depois da codificação.
+
+Leitura do QR, na ordem: pyzbar → OpenCV → verificador puro Python (confere
+módulo a módulo, no centro de cada célula, contra a matriz esperada).
+
+    python bench/png_encoding.py
+    python bench/png_encoding.py --repeat 10 --base-image static/ticket_base.png
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+from io import BytesIO
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+QR_DATA = "https://example.com/ticket/bench-TOKEN-0123456789abcdef"
+
+# (rótulo, formato, opções)
+VARIANTS = [
+    ("png rgba z6 (Pillow padrão)", "png", {"colors": 0, "compress_level": 6}),
+    ("png rgba z9", "png", {"colors": 0, "compress_level": 9}),
+    ("png pal256 z1", "png", {"colors": 256, "compress_level": 1}),
+    ("png pal256 z6", "png", {"colors": 256, "compress_level": 6}),
+    ("png pal256 z9", "png", {"colors": 256, "compress_level": 9}),
+    ("png pal64 z9", "png", {"colors": 64, "compress_level": 9}),
+    ("png pal16 z9", "png", {"colors": 16, "compress_level": 9}),
+    ("webp q80", "webp", {"quality": 80}),
+    ("webp lossless", "webp", {"lossless": True}),
+    ("avif q60", "avif", {"quality": 60}),
+]
+
+
+def _encode(img, fmt: str, opts: dict) -> bytes:
+    from app_services.ticket_generator import quantize_image
+
+    buf = BytesIO()
+    if fmt == "png":
+        out = quantize_image(img, opts["colors"]) if opts["colors"] else img
+        out.save(buf, format="PNG", compress_level=opts["compress_level"])
+    else:
+        img.save(buf, format=fmt.upper(), **opts)
+    return buf.getvalue()
+
+
+def _decode_external(img):
+    """Texto do QR via pyzbar/OpenCV; None se nenhum estiver instalado."""
+    try:
+        from pyzbar.pyzbar import decode
+
+        found = decode(img.convert("L"))
+        return "pyzbar", (found[0].data.decode("utf-8") if found else "")
+    except ImportError:
+        pass
+    try:
+        import cv2
+        import numpy as np
+
+        text, _, _ = cv2.QRCodeDetector().detectAndDecode(np.array(img.convert("RGB"))[:, :, ::-1])
+        return "opencv", text or ""
+    except ImportError:
+        return None
+
+
+def _module_grid_ok(img, box) -> bool:
+    """Puro Python: cada módulo do QR (centro da célula) tem a cor esperada."""
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_Q
+
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_CORRECT_Q, box_size=1, border=2)
+    qr.add_data(QR_DATA)
+    qr.make(fit=True)
+    matrix = qr.get_matrix()
+
+    x0, y0, side = box
+    cell = side / len(matrix)
+    gray = img.convert("L")
+    for r, row in enumerate(matrix):
+        for c, dark in enumerate(row):
+            px = gray.getpixel((int(x0 + (c + 0.5) * cell), int(y0 + (r + 0.5) * cell)))
+            if (px < 128) != dark:
+                return False
+    return True
+
+
+def _verify(data: bytes, box) -> str:
+    from PIL import Image
+
+    img = Image.open(BytesIO(data))
+    img.load()
+    external = _decode_external(img)
+    if external is not None:
+        name, text = external
+        return f"{name} {'ok' if text == QR_DATA else 'FALHOU'}"
+    return f"grade {'ok' if _module_grid_ok(img, box) else 'FALHOU'}"
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--base-image", default=str(ROOT / "static" / "ticket_base.png"))
+    ap.add_argument("--font", default=str(ROOT / "static" / "fonts" / "Kalam-Bold.ttf"))
+    args = ap.parse_args()
+
+    from PIL import Image, features
+
+    from app_services.ticket_generator import _qr_position, generate_single_ticket_png, make_qr_image
+    from config_ticket import QR_SIZE_PX
+
+    # ingresso de referência em RGBA cheio (sem quantizar, zlib rápido)
+    os.environ["TICKET_PNG_COLORS"] = "0"
+    os.environ["TICKET_PNG_COMPRESS"] = "1"
+    os.environ.pop("TICKET_PNG_DERIVATIVES", None)
+    png = generate_single_ticket_png(
+        storage_dir=Path(tempfile.mkdtemp(prefix="png-encoding-")),
+        event_slug="bench", ticket_id=1, person_name="Maria Conceição", show_name="Show Bench",
+        base_image_path=Path(args.base_image), font_show_path=Path(args.font), font_names_path=Path(args.font),
+        qr_img=make_qr_image(QR_DATA, size_px=QR_SIZE_PX), qr_margin=40,
+    )
+    img = Image.open(png).convert("RGBA")
+    W, H = img.size
+    box = (*_qr_position(W, H, QR_SIZE_PX, QR_SIZE_PX, 40), QR_SIZE_PX)
+
+    print(f"arte {W}x{H}, {args.repeat} repetições (mediana)\n")
+    print(f"{'variante':30s} {'KiB':>9s} {'encode ms':>10s}  QR")
+    failed = False
+    for label, fmt, opts in VARIANTS:
+        if fmt != "png" and not features.check(fmt):
+            print(f"{label:30s} {'-':>9s} {'-':>10s}  (Pillow sem suporte a {fmt})")
+            continue
+        times = []
+        for _ in range(max(1, args.repeat)):
+            t0 = time.perf_counter()
+            data = _encode(img, fmt, opts)
+            times.append((time.perf_counter() - t0) * 1000)
+        check = _verify(data, box)
+        failed = failed or "FALHOU" in check
+        print(f"{label:30s} {len(data) / 1024:9.1f} {statistics.median(times):10.1f}  {check}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
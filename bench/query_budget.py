@@ -0,0 +1,108 @@
+# bench/query_budget.py
+"""
+Orçamento de queries por página (pega N+1 antes de ir pro ar).
+
+Sobe o app com um SQLite temporário, cria N compras de exemplo e chama as
+páginas principais com o test_client dentro de max_queries(...). Sai com
+exit 1 se alguma página passar do orçamento — o número de queries não pode
+crescer com a quantidade de linhas.
+
+    python bench/query_budget.py            # 50 compras
+    python bench/query_budget.py --rows 300
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+# (rota, máximo de queries) — cada página deve ser O(1) em queries
+BUDGETS = [
+    ("/admin/pending", 8),
+    ("/admin/purchases", 8),
+    ("/admin/reservations", 8),
+    ("/api/status/{token}", 3),
+    ("/status/{token}", 6),
+]
+
+
+def _seed(rows: int) -> str:
+    from db import db
+    from models import Event, Payment, Purchase, Show, Ticket
+
+    with db() as s:
+        ev = Event(name="Sons & Sabores", slug="sons-e-sabores")
+        s.add(ev)
+        s.add(Show(name="Show Bench", slug="show-bench", date_text="01/01 20h", is_active=1))
+        s.flush()
+
+        token = ""
+        for i in range(rows):
+            status = ("pending_payment", "reservation_pending", "paid")[i % 3]
+            p = Purchase(
+                event_id=ev.id,
+                token=secrets.token_urlsafe(12),
+                show_name="Show Bench",
+                buyer_name=f"Comprador {i}",
+                buyer_email=f"c{i}@example.com",
+                status=status,
+                created_at=datetime.utcnow(),
+                ticket_qty=2,
+                ticket_unit_price_cents=5000,
+            )
+            s.add(p)
+            s.flush()
+            s.add(Payment(purchase_id=p.id, provider="manual_pix", amount_cents=10000,
+                          status="paid" if status == "paid" else "pending"))
+            if status == "paid":
+                for n in range(2):
+                    s.add(Ticket(event_id=ev.id, purchase_id=p.id, show_name=p.show_name,
+                                 buyer_name=p.buyer_name, person_name=f"Pessoa {n}",
+                                 token=secrets.token_urlsafe(12)))
+            token = token or p.token
+        s.commit()
+    return token
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=50)
+    args = ap.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="query-budget-")
+    os.environ["DATABASE_URL"] = f"sqlite:///{tmp}/bench.db"
+    os.environ["DB_AUTO_CREATE"] = "1"
+    os.environ.setdefault("STORAGE_DIR", tmp)
+
+    from app import create_app
+    from app_services.db_metrics import max_queries
+
+    app = create_app()
+    token = _seed(args.rows)
+
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess["is_admin"] = True
+
+    failed = False
+    for path, budget in BUDGETS:
+        url = path.format(token=token)
+        try:
+            with max_queries(budget) as counter:
+                resp = client.get(url)
+            result = "ok"
+        except AssertionError as e:
+            result = f"❌ {e}"
+            failed = True
+        print(f"{url:40s} HTTP {resp.status_code}  {counter['count']:3d}/{budget} queries  {result}")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,236 @@
+# bench/reconcile.py
+"""
+Conciliação contra um provedor FAKE local (PagBank /orders + MP /v1/payments/search).
+
+O servidor fake simula latência (--latency-ms ± --jitter-ms), falhas
+(--fail-rate: 500/429/timeout) e mede o pico de requisições simultâneas e a
+taxa — para conferir o pool limitado e o rate limit. Depois roda a
+conciliação até 3 vezes (falhas são re-tentadas na rodada seguinte) e confere:
+
+- toda compra paga no provedor virou "paid", nenhuma pendente virou paga;
+- cada compra foi finalizada exatamente 1 vez (transição idempotente).
+
+    python bench/reconcile.py
+    python bench/reconcile.py --payments 300 --paid-ratio 0.3 --fail-rate 0.1 --latency-ms 300
+    python bench/reconcile.py --serve --port 8765     # só o fake, para testar à mão
+"""
+import argparse
+import json
+import os
+import random
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+from zoneinfo import ZoneInfo
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+class FakeProvider:
+    """Estado do fake: quais ids estão pagos + estatísticas de carga."""
+
+    def __init__(self, *, latency_ms: float, jitter_ms: float, fail_rate: float):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.fail_rate = fail_rate
+        self.paid_orders: set[str] = set()
+        self.paid_refs: set[str] = set()
+        self.lock = threading.Lock()
+        self.active = 0
+        self.peak = 0
+        self.hits = Counter()
+        self.times: list[float] = []
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _json(self, code: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                with fake.lock:
+                    fake.active += 1
+                    fake.peak = max(fake.peak, fake.active)
+                    fake.times.append(time.monotonic())
+                try:
+                    time.sleep(max(0.0, fake.latency + random.uniform(-fake.jitter, fake.jitter)))
+                    roll = random.random()
+                    if roll < fake.fail_rate / 3:
+                        fake.hits["500"] += 1
+                        return self._json(500, {"error": "fake 500"})
+                    if roll < 2 * fake.fail_rate / 3:
+                        fake.hits["429"] += 1
+                        return self._json(429, {"error": "fake rate limit"})
+                    if roll < fake.fail_rate:
+                        fake.hits["timeout"] += 1
+                        time.sleep(float(os.getenv("RECONCILE_TIMEOUT_SECONDS", "10")) + 1)
+                        return
+
+                    url = urlparse(self.path)
+                    if url.path.startswith("/orders/"):
+                        order_id = url.path.rsplit("/", 1)[-1]
+                        fake.hits["pagbank"] += 1
+                        status = "PAID" if order_id in fake.paid_orders else "WAITING"
+                        return self._json(200, {"id": order_id, "charges": [{"status": status}] if status == "PAID" else []})
+                    if url.path == "/v1/payments/search":
+                        ref = (parse_qs(url.query).get("external_reference") or [""])[0]
+                        fake.hits["mercadopago"] += 1
+                        results = [{"id": 1, "status": "approved"}] if ref in fake.paid_refs else []
+                        return self._json(200, {"results": results})
+                    return self._json(404, {"error": "not found"})
+                finally:
+                    with fake.lock:
+                        fake.active -= 1
+
+        return Handler
+
+    def serve(self, port: int = 0) -> ThreadingHTTPServer:
+        server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    def peak_rate(self) -> float:
+        """Maior nº de requisições em qualquer janela de 1s."""
+        ts = sorted(self.times)
+        best, j = 0, 0
+        for i, t in enumerate(ts):
+            while ts[j] < t - 1:
+                j += 1
+            best = max(best, i - j + 1)
+        return float(best)
+
+
+def _seed(n: int, paid_ratio: float, fake: FakeProvider) -> set[int]:
+    from db import db
+    from models import Event, Payment, Purchase, Show
+
+    paid_purchases: set[int] = set()
+    # created_at é horário de SP (now_sp) em todo o app
+    created = datetime.now(ZoneInfo("America/Sao_Paulo")).replace(tzinfo=None) - timedelta(hours=1)
+    with db() as s:
+        ev = Event(name="Sons & Sabores", slug="sons-e-sabores")
+        s.add(ev)
+        s.add(Show(name="Show Bench", slug="show-bench", date_text="01/01 20h", is_active=1))
+        s.flush()
+        for i in range(n):
+            p = Purchase(
+                event_id=ev.id, token=secrets.token_urlsafe(12), show_name="Show Bench",
+                buyer_name=f"Comprador {i}", buyer_email=f"c{i}@example.com",
+                status="pending_payment", created_at=created, ticket_qty=1, ticket_unit_price_cents=5000,
+            )
+            s.add(p)
+            s.flush()
+            provider = "pagbank" if i % 2 == 0 else "mercadopago"
+            pay = Payment(purchase_id=p.id, provider=provider, amount_cents=5000, status="pending",
+                          external_id=f"ORDE_{secrets.token_hex(8)}")
+            s.add(pay)
+            s.flush()
+            if random.random() < paid_ratio:
+                paid_purchases.add(p.id)
+                if provider == "pagbank":
+                    fake.paid_orders.add(pay.external_id)
+                else:
+                    fake.paid_refs.add(f"purchase:{p.token}|payment:{pay.id}")
+        s.commit()
+    return paid_purchases
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--payments", type=int, default=120)
+    ap.add_argument("--paid-ratio", type=float, default=0.4)
+    ap.add_argument("--latency-ms", type=float, default=150)
+    ap.add_argument("--jitter-ms", type=float, default=100)
+    ap.add_argument("--fail-rate", type=float, default=0.05)
+    ap.add_argument("--serve", action="store_true", help="só sobe o provedor fake e espera")
+    ap.add_argument("--port", type=int, default=0)
+    args = ap.parse_args()
+
+    random.seed(42)
+    fake = FakeProvider(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, fail_rate=args.fail_rate)
+    server = fake.serve(args.port)
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    if args.serve:
+        print(f"provedor fake em {base} (Ctrl+C para sair)")
+        threading.Event().wait()
+
+    tmp = tempfile.mkdtemp(prefix="reconcile-")
+    os.environ.update({
+        "DATABASE_URL": f"sqlite:///{tmp}/bench.db",
+        "DB_AUTO_CREATE": "1",
+        "STORAGE_DIR": tmp,
+        "PAGBANK_API_BASE": base,
+        "PAGBANK_TOKEN": "fake",
+        "MP_API_BASE": base,
+        "MP_ACCESS_TOKEN": "fake",
+        "RECONCILE_TIMEOUT_SECONDS": os.getenv("RECONCILE_TIMEOUT_SECONDS", "2"),
+        "RECONCILE_BATCH": str(args.payments),
+    })
+
+    from sqlalchemy import select
+
+    from app import create_app
+    from app_services import reconcile
+    from db import db
+    from models import Purchase
+
+    app = create_app()
+    finalized = Counter()
+    # dublê da finalização: só conta (FTP/render ficam fora deste bench)
+    app.extensions["finalize_purchase"] = lambda pid: finalized.update([pid])
+
+    with app.app_context():
+        expected = _seed(args.payments, args.paid_ratio, fake)
+        rounds = []
+        for _ in range(3):
+            res = reconcile.reconcile(finalize_inline=True)
+            rounds.append(res)
+            if not res["errors"]:
+                break
+
+        with db() as s:
+            paid_now = set(s.scalars(select(Purchase.id).where(Purchase.status == "paid")))
+
+    workers = int(os.getenv("RECONCILE_WORKERS", "4"))
+    rate = float(os.getenv("RECONCILE_RATE_PER_SEC", "5"))
+    for i, r in enumerate(rounds, start=1):
+        print(f"rodada {i}: verificados={r['checked']} pagos={r['paid']} erros={r['errors']} em {r['seconds']}s")
+    print(f"provedor: {dict(fake.hits)}  pico simultâneo={fake.peak} (workers={workers})  "
+          f"pico/s={fake.peak_rate():.0f} (limite={rate:g} + burst)")
+
+    problems = []
+    if paid_now != expected:
+        problems.append(f"pagas divergem: faltam {len(expected - paid_now)}, sobram {len(paid_now - expected)}")
+    dup = [pid for pid, n in finalized.items() if n != 1]
+    if dup or set(finalized) != paid_now:
+        problems.append(f"finalização não idempotente: {len(dup)} duplicadas")
+    if fake.peak > workers:
+        problems.append(f"pool estourou: {fake.peak} simultâneas > {workers}")
+
+    for p in problems:
+        print(f"❌ {p}")
+    if not problems:
+        print(f"✅ {len(expected)} pagas recuperadas, 1 finalização cada")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
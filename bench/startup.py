@@ -0,0 +1,94 @@
+# bench/startup.py
+"""
+Benchmark de cold start: importa o wsgi num processo novo com
+`python -X importtime` e falha (exit 1) se:
+  - algum módulo pesado (reportlab, PIL, qrcode, mercadopago) carregar no boot;
+  - o import total de `wsgi` passar do limite em ms.
+
+Uso (na raiz do projeto):
+    python bench/startup.py                 # limite padrão STARTUP_MAX_MS=1500
+    python bench/startup.py --max-ms 900 --runs 5
+    python bench/startup.py --top 15        # mostra os imports mais caros
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = ("reportlab", "PIL", "qrcode", "mercadopago")
+
+
+def _import_profile() -> dict[str, tuple[int, int]]:
+    """{modulo: (self_us, cumulative_us)} de um import de wsgi num processo novo."""
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", "sqlite://")
+    env.pop("DB_AUTO_CREATE", None)
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import wsgi"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr[-4000:])
+        raise SystemExit(f"import wsgi falhou (exit {proc.returncode})")
+
+    out: dict[str, tuple[int, int]] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        name = parts[2].strip()
+        out[name] = (int(parts[0]), int(parts[1]))
+    return out
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--max-ms", type=float, default=float(os.getenv("STARTUP_MAX_MS", "1500")))
+    ap.add_argument("--runs", type=int, default=3)
+    ap.add_argument("--top", type=int, default=10)
+    args = ap.parse_args()
+
+    totals = []
+    last: dict[str, tuple[int, int]] = {}
+    for _ in range(max(1, args.runs)):
+        last = _import_profile()
+        if "wsgi" not in last:
+            raise SystemExit("wsgi não apareceu na saída do -X importtime")
+        totals.append(last["wsgi"][1] / 1000)
+
+    heavy = sorted({n for n in last if n.split(".")[0] in HEAVY_MODULES})
+
+    print(f"import wsgi: mediana {statistics.median(totals):.1f} ms "
+          f"(min {min(totals):.1f} / max {max(totals):.1f}, {len(totals)} execuções)")
+    print(f"limite: {args.max_ms:.0f} ms")
+
+    if args.top:
+        print("\nimports mais caros (self):")
+        for name, (self_us, cum_us) in sorted(last.items(), key=lambda kv: kv[1][0], reverse=True)[: args.top]:
+            print(f"  {self_us / 1000:8.1f} ms  (cum {cum_us / 1000:8.1f} ms)  {name}")
+
+    failed = False
+    if heavy:
+        print("\n❌ módulos pesados carregados no boot: " + ", ".join(heavy[:20]))
+        failed = True
+    if statistics.median(totals) > args.max_ms:
+        print(f"\n❌ import acima do limite ({statistics.median(totals):.1f} ms > {args.max_ms:.0f} ms)")
+        failed = True
+
+    if not failed:
+        print("\n✅ startup OK")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,67 @@
+# bench/ticket_pdf.py
+"""
+PDF geral rasterizado (Pillow, 1 PNG por página) x vetor (ReportLab, fundo
+compartilhado): tamanho do arquivo e tempo de geração.
+
+    python bench/ticket_pdf.py            # 10 pessoas
+    python bench/ticket_pdf.py --people 40
+"""
+import argparse
+import secrets
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--people", type=int, default=10)
+    ap.add_argument("--base-image", default=str(ROOT / "static" / "ticket_base.png"))
+    ap.add_argument("--font", default=str(ROOT / "static" / "fonts" / "Kalam-Bold.ttf"))
+    args = ap.parse_args()
+
+    from PIL import Image
+
+    from app_services.ticket_generator import generate_single_ticket_png, make_qr_image, paste_qr_on_png
+    from app_services.ticket_pdf import TicketPdfLayout
+
+    out = Path(tempfile.mkdtemp(prefix="ticket-pdf-"))
+    base_image, font = Path(args.base_image), Path(args.font)
+    pages = [("Show Bench", f"Pessoa Número {i}", f"https://example.com/ticket/{secrets.token_urlsafe(18)}")
+             for i in range(args.people)]
+
+    # raster: como era antes (PNG com QR → PDF via Pillow)
+    t0 = time.perf_counter()
+    pngs = []
+    for i, (show, name, url) in enumerate(pages, start=1):
+        png = generate_single_ticket_png(
+            storage_dir=out, event_slug="raster", ticket_id=i, person_name=name, show_name=show,
+            base_image_path=base_image, font_show_path=font, font_names_path=font,
+        )
+        paste_qr_on_png(png, make_qr_image(url), margin=40)
+        pngs.append(png)
+    png_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    imgs = [Image.open(p).convert("RGB") for p in pngs]
+    raster_pdf = out / "raster.pdf"
+    imgs[0].save(raster_pdf, save_all=True, append_images=imgs[1:])
+    raster_time = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    vector_pdf = TicketPdfLayout(base_image, font, font).write(out / "vector.pdf", pages)
+    vector_time = time.perf_counter() - t0
+
+    print(f"pessoas: {args.people}  (PNGs: {png_time:.2f}s, necessários só no raster)")
+    print(f"raster  {raster_pdf.stat().st_size / 1024:9.1f} KiB  {raster_time:6.2f}s")
+    print(f"vetor   {vector_pdf.stat().st_size / 1024:9.1f} KiB  {vector_time:6.2f}s")
+    print(f"arquivos em {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+# bench/ticket_qr.py
+"""
+QR do ingresso: URL antiga (/ticket/<token_urlsafe(18)>) × assinada
+(/T/<payload base32>, app_services/ticket_sig.py). Sem banco/Flask.
+
+Mostra versão do QR, módulos por lado e modo de codificação de cada um
+(nível Q, como o ticket_generator) e mede sign/verify.
+
+    python bench/ticket_qr.py
+    python bench/ticket_qr.py --base-url https://ingressos.exemplo.com.br --n 50000
+"""
+import argparse
+import os
+import secrets
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+os.environ.setdefault("TICKET_SIGNING_KEYS", "1:" + secrets.token_urlsafe(32))
+
+from app_services import ticket_sig  # noqa: E402
+
+
+def _qr_info(data: str) -> dict:
+    import qrcode
+    from qrcode.constants import ERROR_CORRECT_Q
+    from qrcode.util import MODE_ALPHA_NUM, optimal_data_chunks
+
+    qr = qrcode.QRCode(version=None, error_correction=ERROR_CORRECT_Q, box_size=1, border=0)
+    qr.add_data(data)
+    qr.make(fit=True)
+    alpha = all(chunk.mode == MODE_ALPHA_NUM for chunk in optimal_data_chunks(data.encode("utf-8")))
+    return {"chars": len(data), "version": qr.version, "modules": qr.modules_count, "alnum": alpha}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--base-url", default="https://borogodo-sons-sabores-ingressos.onrender.com")
+    ap.add_argument("--n", type=int, default=20000, help="assinaturas/verificações medidas")
+    args = ap.parse_args()
+
+    base = args.base_url.rstrip("/")
+    ticket_id, show_id = 123456, 42
+    old = f"{base}/ticket/{secrets.token_urlsafe(18)}"
+    new = ticket_sig.ticket_url(base, ticket_id=ticket_id, token="-", show_id=show_id)
+
+    for label, url in (("antigo", old), ("assinado", new)):
+        try:
+            info = _qr_info(url)
+        except ImportError:
+            info = {"chars": len(url)}
+        print(f"{label:9} {info}  {url}")
+
+    t0 = time.perf_counter()
+    payloads = [ticket_sig.sign(ticket_id + i, show_id) for i in range(args.n)]
+    t1 = time.perf_counter()
+    ok = sum(1 for p in payloads if ticket_sig.verify(p))
+    t2 = time.perf_counter()
+    forged = sum(1 for p in payloads[:1000] if ticket_sig.verify(p[:-2] + ("AA" if p[-2:] != "AA" else "BB")))
+
+    # a emissão assinada volta intacta (finalize reaproveita o issued_at do pré-render)
+    issued = 1_790_000_000
+    claims = ticket_sig.verify(ticket_sig.sign(ticket_id, show_id, issued)) or {}
+    roundtrip = (claims.get("ticket_id"), claims.get("show_id"), claims.get("issued_at")) == (ticket_id, show_id, issued)
+
+    print(f"sign   {(t1 - t0) / args.n * 1e6:.1f} µs/op")
+    print(f"verify {(t2 - t1) / args.n * 1e6:.1f} µs/op  válidos={ok}/{args.n}  falsos aceitos={forged}/1000")
+    print(f"ida e volta ticket/show/emissão: {'ok' if roundtrip else 'FALHOU'}")
+    if ok != args.n or forged or not roundtrip:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+# cli.py
+"""
+Comandos `flask` do projeto.
+
+    flask --app wsgi init-db     # cria tabelas + colunas novas (migração aditiva)
+    flask --app wsgi prerender-pending   # pré-renderiza ingressos de compras pendentes
+    flask --app wsgi expire-pending      # expira Pix/reservas vencidas (cron)
+    flask --app wsgi reconcile-payments  # consulta PagBank/MP e recupera pagos sem webhook
+    flask --app wsgi finalize-stuck      # finaliza compras pagas que ficaram sem ingressos
+    flask --app wsgi storage-gc          # limpa STORAGE_DIR (cota + idade)
+    flask --app wsgi archive-season      # move shows passados para as tabelas de arquivo
+    flask --app wsgi rebuild-occupancy   # recalcula o contador de lotação por show
+    flask --app wsgi sales-backfill      # refaz as vendas por hora (sales_hourly)
+
+O schema não é mais criado no import do app: no Render isso roda no build,
+então o boot (cold start do plano free) não fala com o banco.
+"""
+import click
+
+from db import ensure_schema
+from models import Base
+
+
+def register_cli(app) -> None:
+
+    @app.cli.command("init-db")
+    def init_db():
+        """Cria tabelas e adiciona colunas novas dos models."""
+        added = ensure_schema(Base.metadata)
+        if added:
+            click.echo("Colunas adicionadas: " + ", ".join(added))
+        click.echo("Schema OK ✅")
+
+    @app.cli.command("prerender-pending")
+    @click.option("--limit", default=500, show_default=True)
+    def prerender_pending(limit):
+        """Pré-renderiza ingressos das compras aguardando pagamento."""
+        from app_services import prerender
+
+        done = 0
+        for pid in prerender.pending_ids(limit):
+            try:
+                prerender.prerender_purchase(pid)
+                done += 1
+            except Exception as e:
+                click.echo(f"purchase {pid}: {e}", err=True)
+        click.echo(f"Pré-render OK ✅ {done} compra(s)")
+
+    @app.cli.command("expire-pending")
+    @click.option("--notify/--no-notify", default=None, help="Avisa os compradores (padrão: EXPIRY_NOTIFY).")
+    def expire_pending(notify):
+        """Expira Pix/reservas vencidas e libera a lotação."""
+        from app_services import expiry
+
+        res = expiry.sweep()
+        if res["skipped"]:
+            click.echo("Outra varredura em andamento (trava no banco); nada feito.")
+            return
+        if res["notify"] and (expiry.notify_enabled() if notify is None else notify):
+            expiry.notify_expired(res["notify"])
+        click.echo(f"Expiradas ✅ pix={res['payments']} reservas={res['reservations']}")
+
+    @app.cli.command("reconcile-payments")
+    def reconcile_payments():
+        """Consulta pagamentos pendentes nos provedores e aplica os pagos."""
+        from app_services import reconcile
+
+        res = reconcile.reconcile(finalize_inline=True)
+        if res["skipped"]:
+            click.echo("Outra conciliação em andamento (trava no banco); nada feito.")
+            return
+        click.echo(
+            f"Conciliação ✅ verificados={res['checked']} pagos={res['paid']} "
+            f"erros={res['errors']} ({res['seconds']}s)"
+        )
+
+    @app.cli.command("finalize-stuck")
+    def finalize_stuck():
+        """Gera os ingressos de compras pagas que ficaram sem (fila perdida no deploy)."""
+        from app_services import finalize_recovery
+
+        res = finalize_recovery.recover()
+        if res["skipped"]:
+            click.echo("Outra recuperação em andamento (trava no banco); nada feito.")
+            return
+        for pid, err in res["errors"]:
+            click.echo(f"purchase {pid}: {err}", err=True)
+        click.echo(f"Finalização ✅ encontradas={res['found']} finalizadas={res['finalized']}")
+
+    @app.cli.command("storage-gc")
+    def storage_gc_cmd():
+        """Apaga arquivos locais já enviados ao FTP e temporários velhos."""
+        from flask import current_app
+
+        from app_services import storage_gc
+
+        res = storage_gc.collect(current_app.config["STORAGE_DIR"])
+        if res["skipped"]:
+            click.echo("Outra limpeza em andamento (trava no disco); nada feito.")
+            return
+        u = res["usage"]
+        click.echo(
+            f"Storage ✅ pastas={res['tickets_removed']} temporários={res['temp_removed']} "
+            f"liberados={res['freed_bytes'] / 1024 / 1024:.1f}MB total={u['total_bytes'] / 1024 / 1024:.1f}MB"
+        )
+        if res["over_quota"]:
+            click.echo("⚠️ ainda acima da cota (STORAGE_QUOTA_MB): o resto não pode ser apagado.", err=True)
+
+    @app.cli.command("archive-season")
+    @click.option("--show", "shows", multiple=True, help="Nome exato do show (repetível). Padrão: shows que já passaram.")
+    @click.option("--dry-run", is_flag=True, help="Só mostra o que seria arquivado.")
+    def archive_season(shows, dry_run):
+        """Move compras/pagamentos/ingressos de shows passados para o arquivo."""
+        from app_services import archive
+
+        names = list(shows) or archive.past_shows()
+        per_show = archive.counts(names)
+        if not per_show:
+            click.echo("Nada para arquivar.")
+            return
+        for name, n in sorted(per_show.items()):
+            click.echo(f"  {name}: {n} compra(s)")
+        if dry_run:
+            click.echo("--dry-run: nada foi movido.")
+            return
+
+        res = archive.archive_shows(list(per_show))
+        click.echo(f"Arquivo ✅ {res['purchases']} compra(s) em {res['batches']} lote(s)")
+
+    @app.cli.command("rebuild-occupancy")
+    def rebuild_occupancy():
+        """Recalcula show_occupancy a partir das compras (se o contador divergir)."""
+        from db import db
+        from app_services import occupancy
+
+        with db(fresh=True) as s:
+            n = occupancy.rebuild(s)
+            s.commit()
+        click.echo(f"Lotação ✅ {n} show(s) recalculados")
+
+    @app.cli.command("sales-backfill")
+    @click.option("--since", default=None, help="AAAA-MM-DD (horário de SP). Padrão: tudo.")
+    def sales_backfill(since):
+        """Recalcula sales_hourly a partir das datas das compras (inclui o arquivo)."""
+        from datetime import datetime
+
+        from db import db
+        from app_services import sales_rollup
+
+        start = datetime.strptime(since, "%Y-%m-%d") if since else None
+        with db(fresh=True) as s:
+            res = sales_rollup.backfill(s, since=start)
+            s.commit()
+        click.echo(f"Vendas por hora ✅ {res['hours']} hora(s)/show de {res['purchases']} compra(s)")
@@ -1,7 +1,9 @@
 # db.py
+import hashlib
 import os
 from contextlib import contextmanager
-from sqlalchemy import create_engine
+from flask import g, has_request_context
+from sqlalchemy import create_engine, inspect, text
 from sqlalchemy.orm import sessionmaker
 
 DATABASE_URL = (os.getenv("DATABASE_URL") or "").strip()
@@ -21,15 +23,136 @@ SessionLocal = sessionmaker(
     expire_on_commit=False,  # ✅ ESSENCIAL
 )
 
+def _request_session():
+    """
+    Sessão única do request (aberta na 1ª chamada). Fora de request
+    (jobs em background, CLI, SSE) retorna None e cada bloco usa a sua.
+    """
+    if not has_request_context():
+        return None
+    s = g.get("_db_session")
+    if s is None:
+        s = SessionLocal()
+        g._db_session = s
+    return s
+
+
+def db_session():
+    """Sessão do request atual, sem bloco `with` (o teardown fecha)."""
+    s = _request_session()
+    if s is None:
+        raise RuntimeError("db_session() só funciona dentro de um request; use `with db()`.")
+    return s
+
+
+def _has_writes(s) -> bool:
+    # transições de status vão por Core (purchase_state): o ORM não as vê como "dirty"
+    return bool(s.new or s.dirty or s.deleted or s.info.get("pending_transitions"))
+
+
 @contextmanager
-def db():
-    s = SessionLocal()
+def db(fresh: bool = False):
+    """
+    Dentro de request reaproveita a sessão do request (1 checkout/ping por
+    request); o bloco continua fazendo commit no fim se houver mudanças.
+    fresh=True força sessão própria (streams longos, isolamento).
+    """
+    shared = None if fresh else _request_session()
+    s = shared or SessionLocal()
     try:
         yield s
-        if s.new or s.dirty or s.deleted:
+        if _has_writes(s):
             s.commit()
     except Exception:
         s.rollback()
         raise
     finally:
-        s.close()
+        if shared is None:
+            s.close()
+
+
+@contextmanager
+def unit_of_work():
+    """
+    Fronteira explícita de escrita: tudo dentro do bloco vira UMA transação,
+    com commit no fim (ou rollback se der erro). Usa a sessão do request.
+    """
+    with db() as s:
+        try:
+            yield s
+            s.commit()
+        except Exception:
+            s.rollback()
+            raise
+
+
+@contextmanager
+def advisory_lock(name: str):
+    """
+    Trava nomeada no banco, sem esperar: `with advisory_lock("x") as ok:`.
+    ok=False → outro worker/instância está com ela (pule a rodada).
+    Postgres: pg_try_advisory_lock; MySQL: GET_LOCK(name, 0). SQLite (dev)
+    não tem: sempre ok. A conexão fica presa até o fim do bloco.
+    """
+    dialect = engine.dialect.name
+    if dialect not in ("postgresql", "mysql", "mariadb"):
+        yield True
+        return
+
+    with engine.connect() as conn:
+        if dialect == "postgresql":
+            key = int.from_bytes(hashlib.sha1(name.encode("utf-8")).digest()[:8], "big", signed=True)
+            ok = bool(conn.scalar(text("SELECT pg_try_advisory_lock(:k)"), {"k": key}))
+            release, params = "SELECT pg_advisory_unlock(:k)", {"k": key}
+        else:
+            ok = conn.scalar(text("SELECT GET_LOCK(:n, 0)"), {"n": name[:64]}) == 1
+            release, params = "SELECT RELEASE_LOCK(:n)", {"n": name[:64]}
+        conn.commit()
+        try:
+            yield ok
+        finally:
+            if ok:
+                conn.execute(text(release), params)
+                conn.commit()
+
+
+def init_app(app) -> None:
+    """Fecha a sessão do request no teardown (commit pendente ou rollback)."""
+
+    @app.teardown_appcontext
+    def _close_request_session(exc):
+        s = g.pop("_db_session", None)
+        if s is None:
+            return
+        try:
+            if exc is None and _has_writes(s):
+                s.commit()
+            else:
+                s.rollback()
+        finally:
+            s.close()
+
+
+def ensure_schema(metadata) -> list[str]:
+    """
+    create_all + migração ADITIVA: adiciona colunas novas dos models em
+    tabelas que já existem (create_all sozinho não faz isso).
+    Nunca remove/altera colunas. Retorna a lista "tabela.coluna" adicionadas.
+    """
+    metadata.create_all(engine)
+
+    insp = inspect(engine)
+    quote = engine.dialect.identifier_preparer.quote
+    added: list[str] = []
+
+    with engine.begin() as conn:
+        for table in metadata.sorted_tables:
+            existing = {c["name"] for c in insp.get_columns(table.name)}
+            for col in table.columns:
+                if col.name in existing:
+                    continue
+                coltype = col.type.compile(dialect=engine.dialect)
+                conn.execute(text(f"ALTER TABLE {quote(table.name)} ADD COLUMN {quote(col.name)} {coltype}"))
+                added.append(f"{table.name}.{col.name}")
+
+    return added
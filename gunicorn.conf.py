@@ -0,0 +1,18 @@
+# gunicorn.conf.py (carregado automaticamente pelo gunicorn a partir da raiz)
+import os
+import shutil
+
+
+def on_starting(server):
+    # ✅ métricas multiprocess: começa cada deploy com a pasta limpa
+    d = (os.getenv("PROMETHEUS_MULTIPROC_DIR") or "").strip()
+    if d:
+        shutil.rmtree(d, ignore_errors=True)
+        os.makedirs(d, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if (os.getenv("PROMETHEUS_MULTIPROC_DIR") or "").strip():
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy import (
-    String, Integer, DateTime, Text, ForeignKey, UniqueConstraint
+    String, Integer, DateTime, Text, ForeignKey, UniqueConstraint, event, Table, Column, Index
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship, declarative_base
 
@@ -55,22 +55,35 @@ class Purchase(Base):
     qty_child: Mapped[int] = mapped_column(Integer, default=0)
 
     status: Mapped[str] = mapped_column(String(30), default="pending_payment")
+    # ✅ incrementa a cada mudança de status (ETag do /api/status/<token>)
+    status_version: Mapped[int] = mapped_column(Integer, default=1, nullable=True)
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow)
 
-    tickets: Mapped[list["Ticket"]] = relationship(back_populates="purchase")
-    payments: Mapped[list["Payment"]] = relationship(back_populates="purchase")
+    # ✅ ON DELETE CASCADE no banco; passive_deletes: o ORM não carrega os filhos para apagar
+    tickets: Mapped[list["Ticket"]] = relationship(
+        back_populates="purchase", cascade="all, delete-orphan", passive_deletes=True
+    )
+    payments: Mapped[list["Payment"]] = relationship(
+        back_populates="purchase", cascade="all, delete-orphan", passive_deletes=True
+    )
     rejection_reason: Mapped[str] = mapped_column(Text, nullable=True)
     rejected_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
 
 
+@event.listens_for(Purchase.status, "set")
+def _bump_status_version(target: Purchase, value, oldvalue, initiator):
+    if value != oldvalue:
+        target.status_version = (target.status_version or 0) + 1
+
+
 class Ticket(Base):
     __tablename__ = "tickets"
     __table_args__ = (UniqueConstraint("token", name="uq_ticket_token"),)
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     event_id: Mapped[int] = mapped_column(ForeignKey("events.id"), nullable=False)
-    purchase_id: Mapped[int] = mapped_column(ForeignKey("purchases.id"), nullable=True)
+    purchase_id: Mapped[int] = mapped_column(ForeignKey("purchases.id", ondelete="CASCADE"), nullable=True)
 
     show_name: Mapped[str] = mapped_column(String(180), nullable=False)
 
@@ -101,7 +114,7 @@ class Payment(Base):
     __tablename__ = "payments"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
-    purchase_id: Mapped[int] = mapped_column(ForeignKey("purchases.id"), nullable=True)
+    purchase_id: Mapped[int] = mapped_column(ForeignKey("purchases.id", ondelete="CASCADE"), nullable=True)
 
     provider: Mapped[str] = mapped_column(String(40), nullable=False)  # pagbank
     amount_cents: Mapped[int] = mapped_column(Integer, nullable=False)
@@ -111,18 +124,28 @@ class Payment(Base):
     external_id: Mapped[str] = mapped_column(String(120), nullable=True)  # order id PagBank
     checkout_url: Mapped[str] = mapped_column(String(600), nullable=True)
 
-    qr_text: Mapped[str] = mapped_column(Text, nullable=True)
-    qr_image_base64: Mapped[str] = mapped_column(Text, nullable=True)
+    # ✅ campos grandes: só carregam quando pedidos (undefer na página do Pix)
+    qr_text: Mapped[str] = mapped_column(Text, nullable=True, deferred=True, deferred_group="pix_qr")
+    qr_image_base64: Mapped[str] = mapped_column(Text, nullable=True, deferred=True, deferred_group="pix_qr")
     expires_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
     paid_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
+    # ✅ comprovante (Pix manual): hash do arquivo em STORAGE_DIR/receipts
+    receipt_sha256: Mapped[str] = mapped_column(String(64), nullable=True)
+    receipt_uploaded_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+
     purchase: Mapped["Purchase"] = relationship(back_populates="payments")
 
     tickets_pdf_url: Mapped[str] = mapped_column(String(500), nullable=True)
     tickets_zip_url: Mapped[str] = mapped_column(String(500), nullable=True)
     tickets_generated_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
 
+    # ✅ envio do e-mail com os ingressos (admin)
+    tickets_email_sent_at: Mapped[datetime] = mapped_column(DateTime, nullable=True)
+    tickets_email_sent_to: Mapped[str] = mapped_column(String(200), nullable=True)
+    tickets_email_last_error: Mapped[str] = mapped_column(Text, nullable=True)
+
 
 class AdminSetting(Base):
     __tablename__ = "admin_settings"
@@ -146,6 +169,103 @@ class Show(Base):
     title: Mapped[str] = mapped_column(String(220), nullable=True)
     description: Mapped[str] = mapped_column(Text, nullable=True)
     image_url: Mapped[str] = mapped_column(String(600), nullable=True)
+    # ✅ JSON {"w", "h", "webp": [[480, url], ...], "jpeg": [...]} (app_services/show_images.py)
+    image_variants: Mapped[str] = mapped_column(Text, nullable=True)
     capacity: Mapped[int] = mapped_column(Integer, nullable=True)
 
 
+
+
+class PurchaseEvent(Base):
+    """
+    Cursor de mudanças das compras (feed ao vivo do admin).
+    Append-only; cada worker lê "id > último visto", então funciona com
+    vários workers do gunicorn sem broker externo.
+    """
+    __tablename__ = "purchase_events"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    purchase_id: Mapped[int] = mapped_column(Integer, nullable=True)  # sem FK: sobrevive à exclusão
+    token: Mapped[str] = mapped_column(String(80), nullable=False)
+    kind: Mapped[str] = mapped_column(String(30), nullable=False)  # created/receipt/paid/confirmed/rejected/deleted
+    status: Mapped[str] = mapped_column(String(30), nullable=True)
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+
+class PurchaseTransition(Base):
+    """
+    Log append-only das mudanças de status (app_services/purchase_state.py).
+    Guarda o que os agregados precisam (show, pessoas, valor) para serem
+    atualizados por delta, sem reler a tabela de compras.
+    """
+    __tablename__ = "purchase_transitions"
+    __table_args__ = (Index("ix_purchase_transitions_purchase", "purchase_id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    purchase_id: Mapped[int] = mapped_column(Integer, nullable=False)  # sem FK: sobrevive à exclusão/arquivo
+    event_id: Mapped[int] = mapped_column(Integer, nullable=True)
+    show_name: Mapped[str] = mapped_column(String(180), nullable=True)
+    from_status: Mapped[str] = mapped_column(String(30), nullable=True)  # None = criação
+    to_status: Mapped[str] = mapped_column(String(30), nullable=False)
+    qty: Mapped[int] = mapped_column(Integer, default=0)
+    amount_cents: Mapped[int] = mapped_column(Integer, default=0)
+    actor: Mapped[str] = mapped_column(String(40), nullable=True)  # buyer/admin/webhook:mp/reconcile/expiry...
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, index=True)
+
+
+class ShowOccupancy(Base):
+    """Pessoas ocupando lugar por show (contador mantido pelas transições)."""
+    __tablename__ = "show_occupancy"
+
+    event_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    show_name: Mapped[str] = mapped_column(String(180), primary_key=True)
+    people: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=True)
+
+
+class SalesHourly(Base):
+    """
+    Vendas por show e hora (início da hora, horário de SP). Projeção do log de
+    transições (app_services/sales_rollup.py); o painel /admin/sales lê daqui.
+    """
+    __tablename__ = "sales_hourly"
+    __table_args__ = (Index("ix_sales_hourly_hour", "hour"),)
+
+    show_name: Mapped[str] = mapped_column(String(180), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    created: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # reservas/compras novas
+    people: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # pessoas nas novas
+    paid: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    revenue_cents: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # bruto dos pagos
+    cancelled: Mapped[int] = mapped_column(Integer, default=0, nullable=False)  # canceladas + rejeitadas
+    expired: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=True)
+
+def _archive_table(source: Table, name: str, *indexed: str) -> Table:
+    """
+    Cópia das colunas de `source` (mesmos nomes/tipos, mesmo id) sem FK,
+    unique nem default + archived_at. Coluna nova no model entra aqui também
+    (o ensure_schema adiciona nas duas tabelas).
+    """
+    cols = [
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=True if not c.primary_key else False,
+               autoincrement=False)
+        for c in source.columns
+    ]
+    cols.append(Column("archived_at", DateTime, nullable=True))
+    idx = [Index(f"ix_{name}_{col}", col) for col in indexed]
+    return Table(name, Base.metadata, *cols, *idx)
+
+
+class PurchaseArchive(Base):
+    """Compras de temporadas passadas (app_services/archive.py). Só leitura no app."""
+    __table__ = _archive_table(Purchase.__table__, "purchases_archive", "token", "show_name")
+
+
+class PaymentArchive(Base):
+    __table__ = _archive_table(Payment.__table__, "payments_archive", "purchase_id")
+
+
+class TicketArchive(Base):
+    __table__ = _archive_table(Ticket.__table__, "tickets_archive", "purchase_id", "token")
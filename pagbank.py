@@ -1,4 +1,3 @@
-import base64
 import hashlib
 import os
 from datetime import datetime, timedelta, timezone
@@ -8,6 +7,9 @@ import requests
 
 
 def pagbank_base_url() -> str:
+    override = (os.getenv("PAGBANK_API_BASE") or "").strip().rstrip("/")
+    if override:
+        return override  # ✅ provedor fake local (bench/reconcile.py) ou proxy
     env = (os.getenv("PAGBANK_ENV", "sandbox") or "sandbox").lower().strip()
     return "https://sandbox.api.pagseguro.com" if env == "sandbox" else "https://api.pagseguro.com"
 
@@ -122,24 +124,21 @@ def create_pix_order(
         raise RuntimeError(f"PagBank não retornou 'id'. Resposta: {data}")
 
     qr_text = ""
+    # ✅ o PNG não é mais baixado/guardado: o QR é renderizado localmente a
+    # partir do qr_text (GET /pix/qr/<token>.png). Mantido no retorno por compatibilidade.
     qr_image_b64 = ""
 
     try:
         qrs = data.get("qr_codes") or []
-        links = (qrs[0] or {}).get("links") or []
+        qr_text = ((qrs[0] or {}).get("text") or "").strip()
 
-        text_url = next((x["href"] for x in links if x.get("media") == "text/plain"), None)
-        img_url = next((x["href"] for x in links if x.get("media") == "image/png"), None)
-
-        if text_url:
-            tr = requests.get(text_url, headers=_auth_headers(), timeout=30)
-            tr.raise_for_status()
-            qr_text = tr.text.strip()
-
-        if img_url:
-            ir = requests.get(img_url, headers=_auth_headers(), timeout=30)
-            ir.raise_for_status()
-            qr_image_b64 = base64.b64encode(ir.content).decode("ascii")
+        if not qr_text:
+            links = (qrs[0] or {}).get("links") or []
+            text_url = next((x["href"] for x in links if x.get("media") == "text/plain"), None)
+            if text_url:
+                tr = requests.get(text_url, headers=_auth_headers(), timeout=30)
+                tr.raise_for_status()
+                qr_text = tr.text.strip()
 
     except Exception:
         pass
@@ -147,9 +146,9 @@ def create_pix_order(
     return order_id, qr_text, qr_image_b64, expires_at
 
 
-def get_order(*, order_id: str) -> dict:
+def get_order(*, order_id: str, session: Optional[requests.Session] = None, timeout: float = 30) -> dict:
     url = f"{pagbank_base_url()}/orders/{order_id}"
-    r = requests.get(url, headers=_auth_headers(), timeout=30)
+    r = (session or requests).get(url, headers=_auth_headers(), timeout=timeout)
     r.raise_for_status()
     return r.json()
 
@@ -0,0 +1,72 @@
+# routes/admin_archive.py
+from flask import Blueprint, render_template, request
+from sqlalchemy import select, desc, func, or_
+
+from db import db
+from models import PurchaseArchive, PaymentArchive, TicketArchive
+from routes.admin_auth import admin_required
+
+bp_admin_archive = Blueprint("admin_archive", __name__)
+
+PER_PAGE = 100
+
+
+@bp_admin_archive.get("/admin/archive")
+@admin_required
+def admin_archive():
+    """Temporadas passadas (só leitura)."""
+    q = (request.args.get("q") or "").strip()
+    show_selected = (request.args.get("show") or "").strip()
+    try:
+        page = max(1, int(request.args.get("page") or 1))
+    except ValueError:
+        page = 1
+
+    with db() as s:
+        show_options = list(s.scalars(
+            select(PurchaseArchive.show_name).distinct().order_by(PurchaseArchive.show_name)
+        ))
+
+        stmt = select(PurchaseArchive)
+        if show_selected:
+            stmt = stmt.where(PurchaseArchive.show_name == show_selected)
+        if q:
+            like = f"%{q}%"
+            stmt = stmt.where(or_(
+                PurchaseArchive.buyer_name.ilike(like),
+                PurchaseArchive.buyer_email.ilike(like),
+                PurchaseArchive.buyer_cpf.ilike(like),
+                PurchaseArchive.token == q,
+            ))
+        purchases = list(s.scalars(
+            stmt.order_by(desc(PurchaseArchive.id)).offset((page - 1) * PER_PAGE).limit(PER_PAGE + 1)
+        ))
+        has_next = len(purchases) > PER_PAGE
+        purchases = purchases[:PER_PAGE]
+
+        ids = [p.id for p in purchases]
+        payments = {}
+        tickets = {}
+        if ids:
+            for pay in s.scalars(
+                select(PaymentArchive).where(PaymentArchive.purchase_id.in_(ids)).order_by(PaymentArchive.id)
+            ):
+                # o último (ou o pago) representa a compra
+                if pay.purchase_id not in payments or (pay.status or "") == "paid":
+                    payments[pay.purchase_id] = pay
+            tickets = dict(s.execute(
+                select(TicketArchive.purchase_id, func.count())
+                .where(TicketArchive.purchase_id.in_(ids))
+                .group_by(TicketArchive.purchase_id)
+            ).all())
+
+    rows = [{"purchase": p, "payment": payments.get(p.id), "tickets": tickets.get(p.id, 0)} for p in purchases]
+    return render_template(
+        "admin_archive.html",
+        rows=rows,
+        q=q,
+        show_options=show_options,
+        show_selected=show_selected,
+        page=page,
+        has_next=has_next,
+    )
@@ -0,0 +1,110 @@
+# routes/admin_bank_import.py
+import os
+import time
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash
+from sqlalchemy import select
+
+from db import db
+from models import Purchase, Payment
+from routes.admin_auth import admin_required
+from app_services import bank_statement
+
+bp_admin_bank_import = Blueprint("admin_bank_import", __name__)
+
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+
+MAX_STATEMENT_BYTES = 10 * 1024 * 1024
+
+
+def now_sp():
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+
+def _window() -> timedelta:
+    return timedelta(hours=int(os.getenv("PIX_MATCH_WINDOW_HOURS", "72")))
+
+
+# expirada ainda casa: o Pix pode ter caído depois do prazo (expired -> paid é válido)
+MATCHABLE_STATUSES = ("pending_payment", "expired")
+
+
+def _pending_manual_pix(since: datetime) -> list[dict]:
+    """Compras com Pix manual em aberto ou vencido — 1 SELECT só com as colunas do match."""
+    with db() as s:
+        rows = s.execute(
+            select(
+                Purchase.id, Purchase.token, Purchase.buyer_name, Purchase.buyer_cpf_digits,
+                Purchase.show_name, Purchase.created_at, Purchase.status, Payment.amount_cents,
+            )
+            .join(Payment, Payment.purchase_id == Purchase.id)
+            .where(
+                Purchase.status.in_(MATCHABLE_STATUSES),
+                Payment.provider == "manual_pix",
+                Payment.status.in_(("pending", "expired")),
+                Purchase.created_at >= since,
+            )
+        ).all()
+    return [
+        {
+            "purchase_id": r.id,
+            "token": r.token,
+            "buyer_name": r.buyer_name,
+            "cpf_digits": r.buyer_cpf_digits or "",
+            "show_name": r.show_name,
+            "created_at": r.created_at,
+            "status": r.status,
+            "amount_cents": int(r.amount_cents or 0),
+        }
+        for r in rows
+    ]
+
+
+@bp_admin_bank_import.get("/admin/bank-import")
+@admin_required
+def admin_bank_import():
+    return render_template("admin_bank_import.html", rows=None, window_hours=int(_window().total_seconds() // 3600))
+
+
+@bp_admin_bank_import.post("/admin/bank-import")
+@admin_required
+def admin_bank_import_post():
+    f = request.files.get("statement")
+    if not f or not f.filename:
+        flash("Selecione o extrato (OFX ou CSV).", "error")
+        return redirect(url_for("admin_bank_import.admin_bank_import"))
+
+    raw = f.read(MAX_STATEMENT_BYTES + 1)
+    if len(raw) > MAX_STATEMENT_BYTES:
+        flash("Arquivo grande demais (máx. 10 MB).", "error")
+        return redirect(url_for("admin_bank_import.admin_bank_import"))
+
+    started = time.perf_counter()
+    try:
+        credits = bank_statement.parse_statement(raw, f.filename)
+    except ValueError as e:
+        flash(str(e), "error")
+        return redirect(url_for("admin_bank_import.admin_bank_import"))
+
+    window = _window()
+    dated = [c["posted_at"] for c in credits if c["posted_at"]]
+    since = (min(dated) if dated else now_sp()) - window - timedelta(days=1)
+    pending = _pending_manual_pix(since)
+    rows = bank_statement.match_credits(credits, pending, window=window)
+    elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    # casados primeiro (maior confiança no topo), depois os sem par
+    rows.sort(key=lambda r: (r["purchase"] is None, -r["score"]))
+    matched = sum(1 for r in rows if r["purchase"])
+    return render_template(
+        "admin_bank_import.html",
+        rows=rows,
+        filename=f.filename,
+        credits_count=len(credits),
+        pending_count=len(pending),
+        matched=matched,
+        elapsed_ms=elapsed_ms,
+        window_hours=int(window.total_seconds() // 3600),
+    )
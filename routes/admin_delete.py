@@ -5,8 +5,10 @@ from flask import Blueprint, redirect, url_for, flash, abort, request
 from sqlalchemy import select
 
 from db import db
-from models import Purchase, Payment, Ticket
+from models import Purchase, Ticket
 from routes.admin_auth import admin_required  # ✅ importante proteger
+from app_services.live_feed import publish_many
+from app_services.purchase_cleanup import delete_purchases, enqueue_cleanup
 
 
 bp_admin_delete = Blueprint("admin_delete", __name__, url_prefix="/admin")
@@ -26,24 +28,18 @@ def _safe_next(next_url: str) -> str:
 @admin_required
 def delete_purchase(token):
     with db() as s:
-        purchase = s.scalar(select(Purchase).where(Purchase.token == token))
-        if not purchase:
+        purchase_id = s.scalar(select(Purchase.id).where(Purchase.token == token))
+        if not purchase_id:
             abort(404)
 
-        # Apaga ingressos
-        tickets = s.scalars(select(Ticket).where(Ticket.purchase_id == purchase.id)).all()
-        for t in tickets:
-            s.delete(t)
-
-        # Apaga pagamentos
-        payments = s.scalars(select(Payment).where(Payment.purchase_id == purchase.id)).all()
-        for pay in payments:
-            s.delete(pay)
-
-        # Apaga compra
-        s.delete(purchase)
+        # ✅ ingressos + pagamentos + compra em 3 DELETEs (sem carregar objeto por objeto)
+        removed = delete_purchases(s, [purchase_id])
+        publish_many(s, [(purchase_id, token, None)], "deleted")
         s.commit()
 
+    # arquivos no FTP/disco saem em background
+    enqueue_cleanup(removed)
+
     flash("Compra excluída com sucesso.", "success")
 
     next_url = _safe_next(request.args.get("next", ""))
@@ -52,6 +48,31 @@ def delete_purchase(token):
     return redirect(next_url or url_for("admin_pending.admin_pending"))
 
 
+@bp_admin_delete.post("/bulk/delete")
+@admin_required
+def bulk_delete_purchases():
+    """JSON {tokens: [...]} (mesmo formato dos outros /admin/bulk/*)."""
+    from routes.admin_pending import _bulk_tokens
+
+    tokens = _bulk_tokens()
+    if not tokens:
+        return {"ok": False, "error": "Nenhum token informado.", "results": []}, 400
+
+    with db() as s:
+        found = {r.token: r.id for r in s.execute(select(Purchase.id, Purchase.token).where(Purchase.token.in_(tokens)))}
+        removed = delete_purchases(s, list(found.values()))
+        publish_many(s, [(pid, t, None) for t, pid in found.items()], "deleted")
+        s.commit()
+
+    enqueue_cleanup(removed)
+
+    results = [
+        {"token": t, "ok": True, "status": "deleted"} if t in found else {"token": t, "ok": False, "error": "não encontrada"}
+        for t in tokens
+    ]
+    return {"ok": True, "updated": len(found), "results": results}
+
+
 @bp_admin_delete.post("/delete-ticket/<int:ticket_id>")
 @admin_required
 def delete_ticket(ticket_id):
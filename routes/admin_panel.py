@@ -1,11 +1,14 @@
 # routes/admin_panel.py
-from flask import Blueprint, render_template
+from datetime import datetime
+
+from flask import Blueprint, render_template, redirect, url_for, flash, current_app
 from sqlalchemy import select, func
 
 from db import db
 from models import Payment, AdminSetting
 from routes.admin_auth import admin_required
 from app_services.email_service import send_email
+from app_services import storage_gc
 
 from models import Purchase
 
@@ -54,4 +57,26 @@ def inject_admin_badges():
 @bp_admin_panel.get("/admin", endpoint="home")
 @admin_required
 def admin_home():
-    return render_template("admin_home.html")
+    # ✅ usa a última passada do GC; sem ela (worker novo), mede o disco agora
+    last = storage_gc.last_result()
+    storage = last["usage"] if last else storage_gc.usage(current_app.config["STORAGE_DIR"])
+    return render_template(
+        "admin_home.html",
+        storage=storage,
+        storage_gc_at=datetime.fromtimestamp(last["finished_at"]).strftime("%d/%m %H:%M") if last else "",
+    )
+
+
+@bp_admin_panel.post("/admin/storage/gc")
+@admin_required
+def admin_storage_gc():
+    res = storage_gc.collect(current_app.config["STORAGE_DIR"])
+    if res["skipped"]:
+        flash("Outra limpeza em andamento; tente de novo em instantes.", "error")
+    else:
+        flash(
+            f"Limpeza ✅ {res['tickets_removed']} pasta(s) de ingresso, {res['temp_removed']} temporário(s), "
+            f"{res['freed_bytes'] / 1024 / 1024:.1f} MB liberados.",
+            "success",
+        )
+    return redirect(url_for("admin_panel.home"))
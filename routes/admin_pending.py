@@ -1,19 +1,84 @@
 # routes/admin_pending.py
 from datetime import datetime
+from zoneinfo import ZoneInfo
 
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
-from sqlalchemy import select, desc
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, send_file
+from sqlalchemy import select, desc, update
 import csv
 from io import StringIO
 from flask import Response
-from db import db
+from db import db, unit_of_work
 from models import Purchase, Payment, Show
 from routes.admin_auth import admin_required
-from app_services.email_service import send_email
+from app_services.email_service import send_email, send_emails
 from app_services.email_templates import build_reservation_email
+from app_services.live_feed import publish, publish_many, sse_stream, last_event_id, prune_events
+from app_services.receipts_store import MIME_BY_EXT, find_receipt
+from app_services import background, purchase_state
 
 bp_admin_pending = Blueprint("admin_pending", __name__)
 
+SAO_PAULO_TZ = ZoneInfo("America/Sao_Paulo")
+
+def now_sp():
+    return datetime.now(SAO_PAULO_TZ).replace(tzinfo=None)
+
+PENDING_STATUSES = ["pending_payment", "reservation_pending", "reservation_pending_price"]
+# rejeitar = cancelar, mas nunca uma compra já paga (isso é estorno)
+REJECTABLE_STATUSES = [st for st in purchase_state.sources("cancelled") if st != "paid"]
+BULK_PAYABLE_STATUSES = ["pending_payment", "expired"]
+
+
+def _matches(q: str, purchase: Purchase, payment) -> bool:
+    if not q:
+        return True
+    hay = " ".join([
+        (purchase.buyer_name or ""),
+        (purchase.buyer_cpf or ""),
+        (purchase.buyer_email or ""),
+        (purchase.buyer_phone or ""),
+        (purchase.show_name or ""),
+        (purchase.token or ""),
+        (purchase.status or ""),
+        (payment.provider if payment else ""),
+        (payment.status if payment else ""),
+    ]).lower()
+    return q in hay
+
+
+def _rejection_email(*, buyer_name: str, show_name: str, reason: str, token: str) -> tuple[str, str]:
+    subject = f"Reserva não confirmada — {show_name}"
+    body = (
+        f"Oi, {buyer_name}!\n\n"
+        "A gente recebeu sua reserva, mas infelizmente não conseguimos confirmar desta vez.\n\n"
+        f"Show: {show_name}\n"
+        f"Motivo: {reason}\n"
+        f"Token: {token}\n\n"
+        "Se quiser tentar outra data/atração, é só fazer uma nova reserva pelo site.\n\n"
+        "Com carinho,\n"
+        "Borogodó · Sons & Sabores"
+    )
+    return subject, body
+
+
+def _latest_payments_map(s, purchase_ids) -> dict:
+    """
+    {purchase_id: Payment mais recente} em UMA query (evita N+1 por linha).
+    Colunas grandes do Payment (qr_*) continuam deferidas.
+    """
+    payments_map = {}
+    if not purchase_ids:
+        return payments_map
+    payments = s.scalars(
+        select(Payment)
+        .where(Payment.purchase_id.in_(list(purchase_ids)))
+        .order_by(desc(Payment.id))
+    )
+    for pay in payments:
+        if pay.purchase_id not in payments_map:
+            payments_map[pay.purchase_id] = pay
+    return payments_map
+
 @bp_admin_pending.post("/admin/confirm-reservation/<token>")
 @admin_required
 def confirm_reservation(token: str):
@@ -22,8 +87,8 @@ def confirm_reservation(token: str):
     Agora inclui acompanhantes no e-mail (guests_text).
     """
 
-    # 1) Atualiza compra para RESERVED e coleta dados necessários (tudo dentro da sessão)
-    with db() as s:
+    # 1) Atualiza compra para RESERVED (transação curta, commit antes do SMTP)
+    with unit_of_work() as s:
         purchase = s.scalar(select(Purchase).where(Purchase.token == token))
         if not purchase:
             abort(404)
@@ -33,37 +98,25 @@ def confirm_reservation(token: str):
             flash("Esta reserva não está pendente.", "error")
             return redirect(url_for("admin_pending.admin_pending"))
 
-        purchase.status = "reserved"
+        purchase_state.transition(s, purchase, "reserved", actor="admin")
         purchase.reservation_confirmed_at = datetime.utcnow()
-        s.add(purchase)
+        publish(s, purchase, "confirmed")
 
         # pega data do show (opcional)
-        sh = s.scalar(select(Show).where(Show.name == purchase.show_name))
-        date_text = (sh.date_text if sh else "") or ""
-
-        buyer_email = (purchase.buyer_email or "").strip()
-        buyer_name = (purchase.buyer_name or "Cliente").strip()
-        show_name = (purchase.show_name or "Sons & Sabores").strip()
-        ticket_qty = int(purchase.ticket_qty or 1)
+        date_text = s.scalar(select(Show.date_text).where(Show.name == purchase.show_name)) or ""
 
-        # ✅ acompanhantes (uma pessoa por linha em guests_text)
-        guests = [g.strip() for g in (purchase.guests_text or "").splitlines() if g.strip()]
-
-        purchase_id = purchase.id
-
-        # ✅ garante persistência do status reserved antes de enviar e-mail
-        s.commit()
-
-    # 2) Envia e-mail fora da sessão (não travar transação por SMTP)
+    # 2) Envia e-mail fora da transação; registra resultado na mesma sessão do request
+    buyer_email = (purchase.buyer_email or "").strip()
     if buyer_email and "@" in buyer_email:
         try:
             subject, text, html = build_reservation_email(
-                buyer_name=buyer_name,
-                show_name=show_name,
+                buyer_name=(purchase.buyer_name or "Cliente").strip(),
+                show_name=(purchase.show_name or "Sons & Sabores").strip(),
                 date_text=date_text,
                 token=token,
-                ticket_qty=ticket_qty,
-                guests=guests,  # ✅ AQUI: acompanha no e-mail
+                ticket_qty=int(purchase.ticket_qty or 1),
+                # ✅ acompanhantes (uma pessoa por linha em guests_text)
+                guests=[g.strip() for g in (purchase.guests_text or "").splitlines() if g.strip()],
             )
 
             send_email(
@@ -73,24 +126,15 @@ def confirm_reservation(token: str):
                 body_html=html,
             )
 
-            # marca como enviado
-            with db() as s:
-                p2 = s.get(Purchase, purchase_id)
-                if p2:
-                    p2.reservation_email_sent_at = datetime.utcnow()
-                    p2.reservation_email_sent_to = buyer_email
-                    p2.reservation_email_last_error = None
-                    s.add(p2)
-                    s.commit()
+            with unit_of_work():
+                purchase.reservation_email_sent_at = datetime.utcnow()
+                purchase.reservation_email_sent_to = buyer_email
+                purchase.reservation_email_last_error = None
 
         except Exception as e:
             # registra erro (sem quebrar a confirmação)
-            with db() as s:
-                p2 = s.get(Purchase, purchase_id)
-                if p2:
-                    p2.reservation_email_last_error = str(e)[:2000]
-                    s.add(p2)
-                    s.commit()
+            with unit_of_work():
+                purchase.reservation_email_last_error = str(e)[:2000]
 
     flash("Reserva confirmada ✅ (e-mail enviado se disponível)", "success")
     return redirect(url_for("admin_pending.admin_pending"))
@@ -105,38 +149,18 @@ def admin_pending():
         purchases = list(
             s.scalars(
                 select(Purchase)
-                .where(
-                    Purchase.status.in_([
-                        "pending_payment",
-                        "reservation_pending",
-                        "reservation_pending_price",
-                    ])
-                )
+                .where(Purchase.status.in_(PENDING_STATUSES))
                 .order_by(desc(Purchase.id))
             )
         )
 
+        payments_map = _latest_payments_map(s, [p.id for p in purchases])
+
         rows = []
         for purchase in purchases:
-            payment = s.scalar(
-                select(Payment)
-                .where(Payment.purchase_id == purchase.id)
-                .order_by(desc(Payment.id))
-            )
+            payment = payments_map.get(purchase.id)
 
-            hay = " ".join([
-                (purchase.buyer_name or ""),
-                (purchase.buyer_cpf or ""),
-                (purchase.buyer_email or ""),
-                (purchase.buyer_phone or ""),
-                (purchase.show_name or ""),
-                (purchase.token or ""),
-                (purchase.status or ""),
-                (payment.provider if payment else ""),
-                (payment.status if payment else ""),
-            ]).lower()
-
-            if q and q not in hay:
+            if not _matches(q, purchase, payment):
                 continue
 
             rows.append({
@@ -148,8 +172,45 @@ def admin_pending():
         "admin_pending.html",
         rows=rows,
         q=q,
+        feed_last_id=last_event_id(),
     )
 
+
+@bp_admin_pending.get("/admin/pending/stream")
+@admin_required
+def admin_pending_stream():
+    """SSE: eventos de compras (criação, comprovante, pago, confirmada, rejeitada)."""
+    try:
+        last_id = int(request.headers.get("Last-Event-ID") or request.args.get("since") or 0)
+    except ValueError:
+        last_id = 0
+    if not last_id:
+        last_id = last_event_id()
+        prune_events()
+
+    resp = Response(sse_stream(last_id), mimetype="text/event-stream")
+    resp.headers["Cache-Control"] = "no-cache"
+    resp.headers["X-Accel-Buffering"] = "no"
+    return resp
+
+
+@bp_admin_pending.get("/admin/pending/row/<token>")
+@admin_required
+def admin_pending_row(token: str):
+    """Fragmento HTML de uma linha (204 se a compra não está mais pendente)."""
+    q = (request.args.get("q") or "").strip().lower()
+
+    with db() as s:
+        purchase = s.scalar(select(Purchase).where(Purchase.token == token))
+        if not purchase or (purchase.status or "").lower() not in PENDING_STATUSES:
+            return "", 204
+        payment = _latest_payments_map(s, [purchase.id]).get(purchase.id)
+
+    if not _matches(q, purchase, payment):
+        return "", 204
+
+    return render_template("_admin_pending_row.html", row={"purchase": purchase, "payment": payment})
+
 @bp_admin_pending.post("/admin/reject/<token>")
 @admin_required
 def admin_reject(token: str):
@@ -160,15 +221,15 @@ def admin_reject(token: str):
         if not purchase:
             abort(404)
 
-        st = (purchase.status or "").lower()
-        if st in {"paid", "cancelled"}:
+        if (purchase.status or "").lower() not in REJECTABLE_STATUSES:
             flash("Esta reserva não pode ser rejeitada.", "error")
             return redirect(url_for("admin_pending.admin_pending"))
 
-        purchase.status = "cancelled"
+        purchase_state.transition(s, purchase, "cancelled", actor="admin")
         purchase.rejection_reason = reason or "Não foi possível confirmar a reserva."
         purchase.rejected_at = datetime.utcnow()
         s.add(purchase)
+        publish(s, purchase, "rejected")
         s.commit()
 
         buyer_email = (purchase.buyer_email or "").strip()
@@ -178,16 +239,11 @@ def admin_reject(token: str):
     # e-mail pro cliente (best-effort)
     if buyer_email and "@" in buyer_email:
         try:
-            subject = f"Reserva não confirmada — {show_name}"
-            body = (
-                f"Oi, {buyer_name}!\n\n"
-                "A gente recebeu sua reserva, mas infelizmente não conseguimos confirmar desta vez.\n\n"
-                f"Show: {show_name}\n"
-                f"Motivo: {purchase.rejection_reason}\n"
-                f"Token: {token}\n\n"
-                "Se quiser tentar outra data/atração, é só fazer uma nova reserva pelo site.\n\n"
-                "Com carinho,\n"
-                "Borogodó · Sons & Sabores"
+            subject, body = _rejection_email(
+                buyer_name=buyer_name,
+                show_name=show_name,
+                reason=purchase.rejection_reason,
+                token=token,
             )
             send_email(to_email=buyer_email, subject=subject, body_text=body)
         except Exception as e:
@@ -211,12 +267,17 @@ def admin_mark_paid(purchase_token: str):
         if not payment:
             abort(404)
 
+        st = (purchase.status or "").lower()
+        if st != "paid" and not purchase_state.can(st, "paid"):
+            return {"ok": False, "error": f"status '{purchase.status}' não permite marcar como pago"}, 409
+
         payment.status = "paid"
         payment.paid_at = now_sp()   # ✅ São Paulo
-        purchase.status = "paid"
+        purchase_state.transition(s, purchase, "paid", actor="admin")
 
         s.add(payment)
         s.add(purchase)
+        publish(s, purchase, "paid")
         s.commit()
         purchase_id = purchase.id
 
@@ -234,28 +295,18 @@ def admin_pending_export_csv():
         purchases = list(
             s.scalars(
                 select(Purchase)
-                .where(Purchase.status.in_(["pending_payment", "reservation_pending", "reservation_pending_price"]))
+                .where(Purchase.status.in_(PENDING_STATUSES))
                 .order_by(desc(Purchase.id))
             )
         )
 
+        payments_map = _latest_payments_map(s, [p.id for p in purchases])
+
         rows = []
         for p in purchases:
-            pay = s.scalar(select(Payment).where(Payment.purchase_id == p.id).order_by(desc(Payment.id)))
-
-            hay = " ".join([
-                (p.buyer_name or ""),
-                (p.buyer_cpf or ""),
-                (p.buyer_email or ""),
-                (p.buyer_phone or ""),
-                (p.show_name or ""),
-                (p.token or ""),
-                (p.status or ""),
-                (pay.provider if pay else ""),
-                (pay.status if pay else ""),
-            ]).lower()
-
-            if q and q not in hay:
+            pay = payments_map.get(p.id)
+
+            if not _matches(q, p, pay):
                 continue
 
             rows.append((p, pay))
@@ -273,3 +324,236 @@ def admin_pending_export_csv():
     resp = Response(out.getvalue(), mimetype="text/csv; charset=utf-8")
     resp.headers["Content-Disposition"] = "attachment; filename=pending.csv"
     return resp
+
+
+# =========================================================
+# AÇÕES EM LOTE (confirmar / rejeitar / marcar pago)
+# 1 SELECT + 1 UPDATE set-based por ação; e-mails e finalização vão
+# para a fila de background.
+# =========================================================
+
+BULK_MAX_TOKENS = 300
+RESERVATION_PENDING_STATUSES = ["reservation_pending", "reservation_pending_price"]
+
+
+def _bulk_tokens() -> list[str]:
+    data = request.get_json(silent=True) or {}
+    raw = data.get("tokens") if data else request.form.getlist("tokens")
+    tokens: list[str] = []
+    for t in raw or []:
+        t = str(t or "").strip()
+        if t and t not in tokens:
+            tokens.append(t)
+    return tokens[:BULK_MAX_TOKENS]
+
+
+def _bulk_reason() -> str:
+    data = request.get_json(silent=True) or {}
+    return str(data.get("reason") or request.form.get("reason") or "").strip()
+
+
+def _bulk_results(tokens, found: dict, changed_ids: set, new_status: str) -> list[dict]:
+    results = []
+    for t in tokens:
+        p = found.get(t)
+        if not p:
+            results.append({"token": t, "ok": False, "error": "não encontrada"})
+        elif p.id in changed_ids:
+            results.append({"token": t, "ok": True, "status": new_status})
+        else:
+            results.append({"token": t, "ok": False, "error": f"status '{p.status}' não permite esta ação"})
+    return results
+
+
+def _reload_changed(s, ids, new_status: str) -> list[Purchase]:
+    if not ids:
+        return []
+    return list(s.scalars(
+        select(Purchase)
+        .where(Purchase.id.in_(ids), Purchase.status == new_status)
+        .execution_options(populate_existing=True)
+    ))
+
+
+def _send_reservation_emails(items: list[dict]) -> None:
+    """Job: envia confirmações numa conexão SMTP e registra envio/erro por compra."""
+    errors = send_emails([it["message"] for it in items])
+    now = datetime.utcnow()
+    with db() as s:
+        for it, err in zip(items, errors):
+            p = s.get(Purchase, it["purchase_id"])
+            if not p:
+                continue
+            if err is None:
+                p.reservation_email_sent_at = now
+                p.reservation_email_sent_to = it["message"]["to_email"]
+                p.reservation_email_last_error = None
+            else:
+                p.reservation_email_last_error = str(err)[:2000]
+        s.commit()
+
+
+def _send_rejection_emails(items: list[dict]) -> None:
+    errors = send_emails([it["message"] for it in items])
+    for it, err in zip(items, errors):
+        if err is not None:
+            current_app.logger.warning("[REJECT EMAIL] falhou token=%s err=%s", it["token"], err)
+
+
+def _finalize_many(purchase_ids: list[int]) -> None:
+    finalize_fn = current_app.extensions.get("finalize_purchase")
+    if not callable(finalize_fn):
+        return
+    for pid in purchase_ids:
+        try:
+            finalize_fn(pid)
+        except Exception:
+            current_app.logger.exception("[BULK FINALIZE] falhou purchase_id=%s", pid)
+
+
+@bp_admin_pending.post("/admin/bulk/confirm")
+@admin_required
+def admin_bulk_confirm():
+    tokens = _bulk_tokens()
+    if not tokens:
+        return {"ok": False, "error": "Nenhum token informado.", "results": []}, 400
+
+    with db() as s:
+        found = {p.token: p for p in s.scalars(select(Purchase).where(Purchase.token.in_(tokens)))}
+        ids = [p.id for p in found.values() if (p.status or "").lower() in RESERVATION_PENDING_STATUSES]
+
+        records = purchase_state.transition_many(
+            s, ids, "reserved", actor="admin",
+            from_statuses=RESERVATION_PENDING_STATUSES,
+            values={"reservation_confirmed_at": datetime.utcnow()},
+        )
+        changed = _reload_changed(s, [r["purchase_id"] for r in records], "reserved")
+        publish_many(s, [(p.id, p.token, p.status) for p in changed], "confirmed")
+
+        show_dates = dict(s.execute(
+            select(Show.name, Show.date_text).where(Show.name.in_({p.show_name for p in changed}))
+        ).all()) if changed else {}
+        s.commit()
+
+    items = []
+    for p in changed:
+        buyer_email = (p.buyer_email or "").strip()
+        if not buyer_email or "@" not in buyer_email:
+            continue
+        subject, text, html = build_reservation_email(
+            buyer_name=(p.buyer_name or "Cliente").strip(),
+            show_name=(p.show_name or "Sons & Sabores").strip(),
+            date_text=show_dates.get(p.show_name) or "",
+            token=p.token,
+            ticket_qty=int(p.ticket_qty or 1),
+            guests=[g.strip() for g in (p.guests_text or "").splitlines() if g.strip()],
+        )
+        items.append({
+            "purchase_id": p.id,
+            "message": {"to_email": buyer_email, "subject": subject, "body_text": text, "body_html": html},
+        })
+    if items:
+        background.enqueue(_send_reservation_emails, items)
+
+    results = _bulk_results(tokens, found, {p.id for p in changed}, "reserved")
+    return {"ok": True, "updated": len(changed), "results": results}
+
+
+@bp_admin_pending.post("/admin/bulk/reject")
+@admin_required
+def admin_bulk_reject():
+    tokens = _bulk_tokens()
+    if not tokens:
+        return {"ok": False, "error": "Nenhum token informado.", "results": []}, 400
+    reason = _bulk_reason() or "Não foi possível confirmar a reserva."
+
+    with db() as s:
+        found = {p.token: p for p in s.scalars(select(Purchase).where(Purchase.token.in_(tokens)))}
+        ids = [p.id for p in found.values() if (p.status or "").lower() in REJECTABLE_STATUSES]
+
+        records = purchase_state.transition_many(
+            s, ids, "cancelled", actor="admin",
+            from_statuses=REJECTABLE_STATUSES,
+            values={"rejection_reason": reason, "rejected_at": datetime.utcnow()},
+        )
+        changed = _reload_changed(s, [r["purchase_id"] for r in records], "cancelled")
+        publish_many(s, [(p.id, p.token, p.status) for p in changed], "rejected")
+        s.commit()
+
+    items = []
+    for p in changed:
+        buyer_email = (p.buyer_email or "").strip()
+        if not buyer_email or "@" not in buyer_email:
+            continue
+        subject, body = _rejection_email(
+            buyer_name=(p.buyer_name or "Cliente").strip(),
+            show_name=(p.show_name or "Sons & Sabores").strip(),
+            reason=reason,
+            token=p.token,
+        )
+        items.append({"token": p.token, "message": {"to_email": buyer_email, "subject": subject, "body_text": body}})
+    if items:
+        background.enqueue(_send_rejection_emails, items)
+
+    results = _bulk_results(tokens, found, {p.id for p in changed}, "cancelled")
+    return {"ok": True, "updated": len(changed), "results": results}
+
+
+@bp_admin_pending.post("/admin/bulk/mark-paid")
+@admin_required
+def admin_bulk_mark_paid():
+    tokens = _bulk_tokens()
+    if not tokens:
+        return {"ok": False, "error": "Nenhum token informado.", "results": []}, 400
+
+    with db() as s:
+        found = {p.token: p for p in s.scalars(select(Purchase).where(Purchase.token.in_(tokens)))}
+        # expired também: Pix manual que caiu depois do prazo (importação de extrato)
+        candidates = [p.id for p in found.values() if (p.status or "").lower() in BULK_PAYABLE_STATUSES]
+        payments_map = _latest_payments_map(s, candidates)
+        ids = [pid for pid in candidates if pid in payments_map]
+
+        records = purchase_state.transition_many(
+            s, ids, "paid", actor="admin", from_statuses=BULK_PAYABLE_STATUSES,
+        )
+        changed = _reload_changed(s, [r["purchase_id"] for r in records], "paid")
+
+        pay_ids = [payments_map[p.id].id for p in changed]
+        if pay_ids:
+            s.execute(
+                update(Payment)
+                .where(Payment.id.in_(pay_ids))
+                .values(status="paid", paid_at=now_sp())
+                .execution_options(synchronize_session=False)
+            )
+        publish_many(s, [(p.id, p.token, p.status) for p in changed], "paid")
+        s.commit()
+
+    if changed:
+        # fila in-process: se cair no deploy, app_services/finalize_recovery.py refaz
+        background.enqueue(_finalize_many, [p.id for p in changed])
+
+    results = _bulk_results(tokens, found, {p.id for p in changed}, "paid")
+    for r in results:
+        p = found.get(r["token"])
+        if not r["ok"] and p and p.id in candidates and p.id not in payments_map:
+            r["error"] = "compra sem pagamento registrado"
+    return {"ok": True, "updated": len(changed), "results": results}
+
+
+@bp_admin_pending.get("/admin/receipts/<sha>")
+@admin_required
+def admin_receipt(sha: str):
+    """Comprovante enviado pelo comprador (arquivo do store, pelo hash)."""
+    path = find_receipt(current_app.config["STORAGE_DIR"], sha)
+    if not path:
+        abort(404)
+    resp = send_file(
+        path,
+        mimetype=MIME_BY_EXT.get(path.suffix.lstrip("."), "application/octet-stream"),
+        download_name=f"comprovante-{sha[:12]}{path.suffix}",
+        conditional=True,
+        max_age=3600,
+    )
+    resp.headers["Cache-Control"] = "private, max-age=3600"
+    return resp
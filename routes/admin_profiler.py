@@ -0,0 +1,73 @@
+# routes/admin_profiler.py
+from datetime import datetime
+
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app, send_file
+
+from routes.admin_auth import admin_required
+from app_services import profiler
+
+bp_admin_profiler = Blueprint("admin_profiler", __name__)
+
+
+@bp_admin_profiler.get("/admin/profiler")
+@admin_required
+def admin_profiler():
+    storage_dir = current_app.config["STORAGE_DIR"]
+    files = profiler.list_profiles(storage_dir)
+    for f in files:
+        f["when"] = datetime.fromtimestamp(f["mtime"]).strftime("%d/%m/%Y %H:%M:%S")
+    endpoints = sorted({r.endpoint for r in current_app.url_map.iter_rules() if r.endpoint != "static"})
+    return render_template(
+        "admin_profiler.html",
+        armed=profiler.current(storage_dir),
+        files=files,
+        endpoints=endpoints,
+        modes=profiler.MODES,
+    )
+
+
+@bp_admin_profiler.post("/admin/profiler/arm")
+@admin_required
+def admin_profiler_arm():
+    pattern = (request.form.get("pattern") or "").strip()
+    mode = (request.form.get("mode") or "cprofile").strip()
+    try:
+        count = int(request.form.get("count") or 5)
+    except ValueError:
+        count = 5
+    if not pattern:
+        flash("Informe o endpoint (ou padrão, ex.: admin_pending.*).", "error")
+        return redirect(url_for("admin_profiler.admin_profiler"))
+
+    cfg = profiler.arm(current_app.config["STORAGE_DIR"], pattern=pattern, count=count, mode=mode)
+    flash(f"Profiler armado ✅ próximas {cfg['remaining']} requisições de {cfg['pattern']} ({cfg['mode']}).", "success")
+    return redirect(url_for("admin_profiler.admin_profiler"))
+
+
+@bp_admin_profiler.post("/admin/profiler/disarm")
+@admin_required
+def admin_profiler_disarm():
+    profiler.disarm(current_app.config["STORAGE_DIR"])
+    flash("Profiler desarmado.", "success")
+    return redirect(url_for("admin_profiler.admin_profiler"))
+
+
+@bp_admin_profiler.get("/admin/profiler/files/<name>")
+@admin_required
+def admin_profiler_download(name: str):
+    d = profiler.profiles_dir(current_app.config["STORAGE_DIR"])
+    path = (d / name).resolve()
+    if path.parent != d.resolve() or not path.is_file():
+        abort(404)
+    mimetype = "text/plain" if path.suffix in {".txt", ".collapsed"} else "application/octet-stream"
+    return send_file(path, mimetype=mimetype, as_attachment=path.suffix != ".txt", download_name=path.name)
+
+
+@bp_admin_profiler.post("/admin/profiler/files/<name>/delete")
+@admin_required
+def admin_profiler_delete(name: str):
+    d = profiler.profiles_dir(current_app.config["STORAGE_DIR"])
+    path = (d / name).resolve()
+    if path.parent == d.resolve() and path.is_file():
+        path.unlink()
+    return redirect(url_for("admin_profiler.admin_profiler"))
@@ -1,18 +1,13 @@
 # routes/admin_purchases.py
 from datetime import datetime
 from zoneinfo import ZoneInfo
-from flask import Blueprint, render_template, request, abort, flash, redirect, url_for
+from flask import Blueprint, render_template, request, abort, flash, redirect, url_for, send_file
 from sqlalchemy import select, desc, func
 from io import BytesIO
 import csv
 from io import StringIO
 from flask import Response
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from db import db
+from db import db, db_session, unit_of_work
 from models import Purchase, Payment, Ticket
 from routes.admin_auth import admin_required
 from sqlalchemy import select, desc, func
@@ -57,6 +52,13 @@ def admin_purchases_table():
 
         pairs = list(s.execute(stmt).all())
 
+        # ✅ contagem de tickets em 1 query (antes: 1 COUNT por linha)
+        ticket_counts = dict(s.execute(
+            select(Ticket.purchase_id, func.count())
+            .where(Ticket.purchase_id.in_({p.id for p, _ in pairs}), Ticket.status != "pending")
+            .group_by(Ticket.purchase_id)
+        ).all()) if pairs else {}
+
         rows = []
         for p, pay in pairs:
             if show_selected and (p.show_name or "") != show_selected:
@@ -76,14 +78,10 @@ def admin_purchases_table():
             if q and q not in hay:
                 continue
 
-            ticket_count = s.scalar(
-                select(func.count()).select_from(Ticket).where(Ticket.purchase_id == p.id)
-            ) or 0
-
             rows.append({
                 "purchase": p,
                 "payment": pay,
-                "ticket_count": ticket_count,
+                "ticket_count": ticket_counts.get(p.id, 0),
             })
 
     return render_template(
@@ -95,47 +93,31 @@ def admin_purchases_table():
     )
 
 
-@bp_admin_purchases.post("/admin/purchases/send-email/<int:purchase_id>")
-@admin_required
-def admin_send_purchase_email(purchase_id: int):
-    to_email = (request.form.get("to_email") or "").strip()
-    if not to_email or "@" not in to_email:
-        flash("Informe um e-mail válido.", "error")
-        return redirect(url_for("admin_purchases.admin_purchases_table"))
-
-    # carrega purchase/payment/tickets
-    with db() as s:
-        purchase = s.get(Purchase, purchase_id)
-        if not purchase:
-            abort(404)
-
-        payment_paid = s.scalar(
-            select(Payment)
-            .where(Payment.purchase_id == purchase.id, Payment.status == "paid")
-            .order_by(desc(Payment.id))
-        )
-        payment = payment_paid or s.scalar(
-            select(Payment)
-            .where(Payment.purchase_id == purchase.id)
-            .order_by(desc(Payment.id))
-        )
-
-        tickets = list(
-            s.scalars(
-                select(Ticket).where(Ticket.purchase_id == purchase.id).order_by(Ticket.id.asc())
-            )
+def _send_tickets_email(purchase: Purchase, to_email: str) -> Exception | None:
+    """
+    Monta e envia o e-mail dos ingressos e registra envio/erro no payment mais
+    recente. Usa a sessão do request: leitura e registro na mesma sessão, com
+    o SMTP fora da transação de escrita.
+    """
+    s = db_session()
+    payments = list(s.scalars(
+        select(Payment).where(Payment.purchase_id == purchase.id).order_by(desc(Payment.id))
+    ))
+    latest = payments[0] if payments else None
+    payment = next((p for p in payments if p.status == "paid"), latest)
+
+    tickets = list(
+        s.scalars(
+            select(Ticket)
+            .where(Ticket.purchase_id == purchase.id, Ticket.status != "pending")
+            .order_by(Ticket.id.asc())
         )
+    )
 
     pdf_all_url = (payment.tickets_pdf_url or "") if payment else ""
     zip_url = (payment.tickets_zip_url or "") if payment else ""
 
-    ticket_rows = []
-    for t in tickets:
-        ticket_rows.append({
-            "name": t.person_name,
-            "pdf": t.pdf_path or "",
-            "png": t.png_path or "",
-        })
+    ticket_rows = [{"name": t.person_name, "pdf": t.pdf_path or "", "png": t.png_path or ""} for t in tickets]
 
     subject, text, html = build_tickets_email(
         buyer_name=purchase.buyer_name or "Cliente",
@@ -149,127 +131,78 @@ def admin_send_purchase_email(purchase_id: int):
         tickets=ticket_rows,
     )
 
+    # fecha a leitura antes do SMTP (não segura transação aberta)
+    s.commit()
 
+    error: Exception | None = None
     try:
-        send_email(
-            to_email=to_email,
-            subject=subject,
-            body_text=text,
-            body_html=html,
-        )
+        send_email(to_email=to_email, subject=subject, body_text=text, body_html=html)
+    except Exception as e:
+        error = e
 
-        # marca como enviado no payment mais recente
-        with db() as s:
-            pay_db = s.scalar(
-                select(Payment)
-                .where(Payment.purchase_id == purchase.id)
-                .order_by(desc(Payment.id))
-            )
-            if pay_db:
-                pay_db.tickets_email_sent_at = datetime.utcnow()
-                pay_db.tickets_email_sent_to = to_email
-                pay_db.tickets_email_last_error = None
-                s.add(pay_db)
+    if latest:
+        with unit_of_work():
+            if error is None:
+                latest.tickets_email_sent_at = datetime.utcnow()
+                latest.tickets_email_sent_to = to_email
+                latest.tickets_email_last_error = None
+            else:
+                latest.tickets_email_last_error = str(error)[:2000]
 
-        flash("E-mail enviado ✅", "success")
+    return error
 
-    except Exception as e:
-        with db() as s:
-            pay_db = s.scalar(
-                select(Payment)
-                .where(Payment.purchase_id == purchase.id)
-                .order_by(desc(Payment.id))
-            )
-            if pay_db:
-                pay_db.tickets_email_last_error = str(e)[:2000]
-                s.add(pay_db)
 
-        flash(f"Falha ao enviar e-mail: {e}", "error")
+@bp_admin_purchases.post("/admin/purchases/send-email/<int:purchase_id>")
+@admin_required
+def admin_send_purchase_email(purchase_id: int):
+    to_email = (request.form.get("to_email") or "").strip()
+    if not to_email or "@" not in to_email:
+        flash("Informe um e-mail válido.", "error")
+        return redirect(url_for("admin_purchases.admin_purchases_table"))
+
+    purchase = db_session().get(Purchase, purchase_id)
+    if not purchase:
+        abort(404)
+
+    error = _send_tickets_email(purchase, to_email)
+    if error is None:
+        flash("E-mail enviado ✅", "success")
+    else:
+        flash(f"Falha ao enviar e-mail: {error}", "error")
 
     return redirect(url_for("admin_purchases.admin_purchases_table"))
 
 @bp_admin_purchases.post("/admin/purchases/send-email-buyer/<int:purchase_id>")
 @admin_required
 def admin_send_purchase_email_buyer(purchase_id: int):
-    # Busca compra/pagamento/tickets
-    with db() as s:
-        purchase = s.get(Purchase, purchase_id)
-        if not purchase:
-            abort(404)
-
-        to_email = (purchase.buyer_email or "").strip()
-        if not to_email or "@" not in to_email:
-            flash("Esta compra não tem e-mail válido do comprador.", "error")
-            return redirect(url_for("admin_purchases.admin_purchases_table"))
-
-        payment_paid = s.scalar(
-            select(Payment)
-            .where(Payment.purchase_id == purchase.id, Payment.status == "paid")
-            .order_by(desc(Payment.id))
-        )
-        payment = payment_paid or s.scalar(
-            select(Payment)
-            .where(Payment.purchase_id == purchase.id)
-            .order_by(desc(Payment.id))
-        )
+    purchase = db_session().get(Purchase, purchase_id)
+    if not purchase:
+        abort(404)
 
-        tickets = list(
-            s.scalars(select(Ticket).where(Ticket.purchase_id == purchase.id).order_by(Ticket.id.asc()))
-        )
-
-    pdf_all_url = (payment.tickets_pdf_url or "") if payment else ""
-    zip_url = (payment.tickets_zip_url or "") if payment else ""
-
-    ticket_rows = [{"name": t.person_name, "pdf": t.pdf_path or "", "png": t.png_path or ""} for t in tickets]
-
-    subject, text, html = build_tickets_email(
-        buyer_name=purchase.buyer_name or "Cliente",
-        show_name=purchase.show_name or "Sons & Sabores",
-        total_brl=((payment.amount_cents or 0) / 100) if payment else 0.0,
-        token=purchase.token,
-        ticket_qty=int(purchase.ticket_qty or len(tickets) or 1),                 # ✅
-        unit_price_cents=int(purchase.ticket_unit_price_cents or 0),              # ✅
-        pdf_all_url=pdf_all_url,
-        zip_url=zip_url,
-        tickets=ticket_rows,
-    )
-
-
-    try:
-        send_email(to_email=to_email, subject=subject, body_text=text, body_html=html)
-
-        # marca status enviado
-        with db() as s:
-            pay_db = s.scalar(
-                select(Payment)
-                .where(Payment.purchase_id == purchase.id)
-                .order_by(desc(Payment.id))
-            )
-            if pay_db:
-                pay_db.tickets_email_sent_at = datetime.utcnow()
-                pay_db.tickets_email_sent_to = to_email
-                pay_db.tickets_email_last_error = None
-                s.add(pay_db)
+    to_email = (purchase.buyer_email or "").strip()
+    if not to_email or "@" not in to_email:
+        flash("Esta compra não tem e-mail válido do comprador.", "error")
+        return redirect(url_for("admin_purchases.admin_purchases_table"))
 
+    error = _send_tickets_email(purchase, to_email)
+    if error is None:
         flash("E-mail enviado para o comprador ✅", "success")
+    else:
+        flash(f"Falha ao enviar e-mail: {error}", "error")
 
-    except Exception as e:
-        with db() as s:
-            pay_db = s.scalar(
-                select(Payment)
-                .where(Payment.purchase_id == purchase.id)
-                .order_by(desc(Payment.id))
-            )
-            if pay_db:
-                pay_db.tickets_email_last_error = str(e)[:2000]
-                s.add(pay_db)
+    return redirect(url_for("admin_purchases.admin_purchases_table"))
 
-        flash(f"Falha ao enviar e-mail: {e}", "error")
 
-    return redirect(url_for("admin_purchases.admin_purchases_table"))
 @bp_admin_purchases.get("/admin/purchases/export.pdf")
 @admin_required
 def admin_purchases_export_pdf():
+    # reportlab só quando alguém exporta PDF (não pesa no boot)
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
     q = (request.args.get("q") or "").strip().lower()
     show_filter = (request.args.get("show") or "").strip().lower()
 
@@ -384,29 +317,42 @@ def admin_purchases_export_pdf():
 @bp_admin_purchases.get("/admin/purchases/summary")
 @admin_required
 def admin_purchases_summary():
+    from app_services import archive
+
+    # ✅ ?all=1 soma também as temporadas arquivadas (UNION ALL quente + arquivo)
+    include_archive = request.args.get("all") == "1"
+    if include_archive:
+        pu = archive.purchases_union().subquery()
+        pa = archive.payments_union().subquery()
+    else:
+        pu, pa = Purchase.__table__, Payment.__table__
+
     with db() as s:
-        pairs = list(
-            s.execute(
-                select(Purchase, Payment)
-                .join(Payment, Payment.purchase_id == Purchase.id)
-                .where(Payment.status == "paid")
-                .order_by(desc(Purchase.id))
-            ).all()
-        )
+        rows = s.execute(
+            select(
+                pu.c.show_name,
+                func.count(),
+                func.sum(func.coalesce(func.nullif(pu.c.ticket_qty, 0), 1)),
+                func.sum(func.coalesce(pa.c.amount_cents, 0)),
+            )
+            .select_from(pu.join(pa, pa.c.purchase_id == pu.c.id))
+            .where(pa.c.status == "paid")
+            .group_by(pu.c.show_name)
+        ).all()
 
     summary = {}
-    for p, pay in pairs:
-        key = (p.show_name or "—").strip()
+    for show_name, vendas, pessoas, cents in rows:
+        key = (show_name or "—").strip()
         if key not in summary:
             summary[key] = {"show": key, "pessoas": 0, "vendas": 0, "total": 0.0}
-        summary[key]["vendas"] += 1
-        summary[key]["pessoas"] += int(p.ticket_qty or 1)
-        summary[key]["total"] += float((pay.amount_cents or 0) / 100)
+        summary[key]["vendas"] += int(vendas or 0)
+        summary[key]["pessoas"] += int(pessoas or 0)
+        summary[key]["total"] += float((cents or 0) / 100)
 
     # ordena por total desc
     items = sorted(summary.values(), key=lambda x: x["total"], reverse=True)
 
-    return render_template("admin_purchases_summary.html", items=items)
+    return render_template("admin_purchases_summary.html", items=items, include_archive=include_archive)
 
 @bp_admin_purchases.post("/admin/purchases/mark-paid/<token>")
 @admin_required
@@ -439,6 +385,13 @@ def _parse_guests_text(guests_text: str) -> list[str]:
 @bp_admin_purchases.get("/admin/purchases/portaria.pdf")
 @admin_required
 def admin_portaria_pdf():
+    # reportlab só quando alguém exporta PDF (não pesa no boot)
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
     """
     PDF "Portaria" por show (somente pagamentos confirmados).
     1 linha por pessoa (comprador + acompanhantes), exibindo CPF e telefone do comprador.
@@ -2,6 +2,7 @@
 
 from io import BytesIO
 from datetime import datetime
+from pathlib import Path
 from zoneinfo import ZoneInfo
 
 from flask import (
@@ -13,17 +14,16 @@ from flask import (
     redirect,
     url_for,
     flash,
+    current_app,
 )
 from sqlalchemy import select, desc, func
 
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
 
 from db import db
 from models import Purchase
+from app_services import occupancy, prerender, purchase_state
+from app_services.live_feed import publish_many
+from app_services.purchase_cleanup import delete_purchases, enqueue_cleanup
 from routes.admin_auth import admin_required
 
 
@@ -180,6 +180,10 @@ def admin_reservation_edit_post(purchase_id: int):
         if not p:
             abort(404)
 
+        before = (p.buyer_name, p.show_name, p.token, p.guests_text)
+        old_token = p.token
+        old_seats = (p.event_id, p.show_name, p.ticket_qty)
+
         p.buyer_name = _clean(request.form.get("buyer_name")) or p.buyer_name
         p.buyer_email = _clean(request.form.get("buyer_email")) or None
         p.buyer_phone = _clean(request.form.get("buyer_phone")) or None
@@ -198,11 +202,25 @@ def admin_reservation_edit_post(purchase_id: int):
 
         status = _clean(request.form.get("status"))
         if status in EDITABLE_STATUSES:
-            p.status = status
+            # edição do admin pode corrigir qualquer coisa, mas fica no log
+            purchase_state.transition(s, p, status, actor="admin:edit", force=True)
+
+        # show/qtd mudaram por fora da máquina de estados: recalcula a lotação dos dois shows
+        if (p.event_id, p.show_name, p.ticket_qty) != old_seats:
+            occupancy.invalidate(s, [old_seats[:2], (p.event_id, p.show_name)])
+
+        # ✅ nomes/show/token mudaram: pré-render dos ingressos não serve mais
+        rerender = (p.buyer_name, p.show_name, p.token, p.guests_text) != before
+        if rerender:
+            prerender.discard(s, p.id, Path(current_app.config["STORAGE_DIR"]) / "tickets" / old_token)
+        requeue = rerender and (p.status or "").lower() == "pending_payment"
 
         s.add(p)
         s.commit()
 
+    if requeue:
+        prerender.enqueue(purchase_id)
+
     flash("Reserva atualizada com sucesso.", "success")
     return redirect(url_for("admin_reservations.admin_reservations", show=back_show, q=back_q))
 
@@ -226,9 +244,12 @@ def admin_reservation_delete(purchase_id: int):
             flash("Reserva já está como PAID. Use cancelamento ao invés de excluir.", "error")
             return redirect(url_for("admin_reservations.admin_reservations", show=back_show, q=back_q))
 
-        s.delete(p)
+        # ✅ mesmo caminho do /admin/delete-purchase (DELETEs em conjunto + limpeza do FTP)
+        removed = delete_purchases(s, [p.id])
+        publish_many(s, [(p.id, p.token, None)], "deleted")
         s.commit()
 
+    enqueue_cleanup(removed)
     flash("Reserva excluída.", "success")
     return redirect(url_for("admin_reservations.admin_reservations", show=back_show, q=back_q))
 
@@ -249,7 +270,7 @@ def admin_reservation_cancel(purchase_id: int):
         if not p:
             abort(404)
 
-        p.status = "cancelled"
+        purchase_state.transition(s, p, "cancelled", actor="admin")
         p.rejection_reason = reason or p.rejection_reason
         p.rejected_at = now_sp()
 
@@ -270,6 +291,13 @@ def admin_reservation_cancel(purchase_id: int):
 )
 @admin_required
 def portaria_pdf():
+    # reportlab só quando alguém exporta PDF (não pesa no boot)
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet
+    from reportlab.lib.units import cm
+    from reportlab.platypus import Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
     show_name = (request.args.get("show") or "").strip()
     if not show_name:
         abort(400, description="Parâmetro obrigatório: show")
@@ -0,0 +1,50 @@
+# routes/admin_sales.py
+from datetime import timedelta
+
+from flask import Blueprint, render_template, request
+
+from db import db
+from routes.admin_auth import admin_required
+from app_services import sales_rollup
+
+bp_admin_sales = Blueprint("admin_sales", __name__)
+
+RANGES = {"24": 24, "72": 72, "168": 168, "720": 720}  # horas
+
+
+def _args() -> tuple[str, int]:
+    show = (request.args.get("show") or "").strip()
+    hours = RANGES.get((request.args.get("hours") or "").strip(), 72)
+    return show, hours
+
+
+@bp_admin_sales.get("/admin/sales")
+@admin_required
+def admin_sales():
+    """Velocidade de vendas por hora (lê só sales_hourly)."""
+    show, hours = _args()
+    with db() as s:
+        show_options = sales_rollup.shows(s)
+    return render_template(
+        "admin_sales.html",
+        show_options=show_options,
+        show_selected=show,
+        hours=hours,
+        ranges=sorted(RANGES.values()),
+    )
+
+
+@bp_admin_sales.get("/admin/sales/data")
+@admin_required
+def admin_sales_data():
+    show, hours = _args()
+    until = sales_rollup.now_sp()
+    with db() as s:
+        rows = sales_rollup.series(s, since=until - timedelta(hours=hours - 1), until=until, show_name=show or None)
+
+    totals = {k: sum(r[k] for r in rows) for k in sales_rollup.FIELDS}
+    return {
+        "labels": [r["hour"].strftime("%d/%m %Hh") for r in rows],
+        "series": {k: [r[k] for r in rows] for k in sales_rollup.FIELDS},
+        "totals": totals,
+    }
@@ -1,17 +1,14 @@
 # routes/admin_shows.py
-import os
 import re
 import unicodedata
-from pathlib import Path
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, current_app
 from sqlalchemy import select, desc
-from werkzeug.utils import secure_filename
 
 from db import db
 from models import Show
 from routes.admin_auth import admin_required
-from app_services.ftp_uploader import upload_file  # ✅ precisa existir
+from app_services import show_images
 
 bp_admin_shows = Blueprint("admin_shows", __name__)
 
@@ -65,55 +62,18 @@ def slugify(texto: str) -> str:
     return texto or "show"
 
 
-def _allowed_image_ext(filename: str) -> str | None:
-    fn = (filename or "").lower().strip()
-    if "." not in fn:
-        return None
-    ext = fn.rsplit(".", 1)[-1]
-    if ext in {"jpg", "jpeg", "png", "webp"}:
-        return ext
-    return None
-
-
-def _get_ftp_public_base() -> str:
-    public_base = (os.getenv("FTP_PUBLIC_BASE") or "").strip().rstrip("/")
-    if not public_base:
-        raise RuntimeError("FTP_PUBLIC_BASE não configurado (URL pública dos arquivos).")
-    if not public_base.startswith("http"):
-        raise RuntimeError(f"FTP_PUBLIC_BASE inválido (precisa começar com http/https): {public_base}")
-    return public_base
-
-
-def _save_show_image_to_ftp(*, file_storage, show_slug: str) -> str:
-    """
-    Recebe um FileStorage do Flask, salva em /tmp e faz upload via FTP.
-    Retorna URL pública final.
-    """
-    ext = _allowed_image_ext(file_storage.filename)
-    if not ext:
-        raise ValueError("Formato inválido. Use JPG, PNG ou WEBP.")
-
-    tmp_dir = Path("/tmp/shows").resolve()
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-
-    safe = secure_filename(file_storage.filename) or f"{show_slug}.{ext}"
-    # Nome remoto padronizado (evita colisão e não usa pastas)
-    remote_name = f"show-{show_slug}.{ext}"
-
-    tmp_path = tmp_dir / f"{show_slug}-{safe}"
-    file_storage.save(tmp_path)
-
-    ok, info = upload_file(tmp_path, remote_name)
+def _queue_image(file_storage, show_id: int, show_slug: str, what: str) -> None:
+    """Guarda a foto e enfileira as variantes (480/960/1440, WebP+JPEG) + upload FTP."""
+    if not (file_storage and file_storage.filename):
+        return
     try:
-        tmp_path.unlink(missing_ok=True)
-    except Exception:
-        pass
-
-    if not ok:
-        raise RuntimeError(str(info))
-
-    public_base = _get_ftp_public_base()
-    return f"{public_base}/{remote_name}"
+        src = show_images.stage_upload(file_storage, show_slug)
+    except Exception as e:
+        current_app.logger.warning("[SHOW IMAGE] upload falhou: %s", e)
+        flash(f"{what}, mas a imagem não subiu: {e}", "error")
+        return
+    show_images.enqueue(show_id, src)
+    flash("Imagem recebida ✅ as versões otimizadas ficam prontas em instantes.", "success")
 
 
 # -----------------------------
@@ -177,18 +137,12 @@ def shows_create():
         if hasattr(sh, "description"):
             sh.description = description or ""
 
-        # upload imagem (opcional)
-        if image_file and image_file.filename:
-            try:
-                img_url = _save_show_image_to_ftp(file_storage=image_file, show_slug=slug)
-                if hasattr(sh, "image_url"):
-                    sh.image_url = img_url
-            except Exception as e:
-                current_app.logger.warning("[SHOW IMAGE] upload falhou: %s", e)
-                flash(f"Show criado, mas a imagem não subiu: {e}", "error")
-
         s.add(sh)
         s.commit()
+        show_id = sh.id
+
+    # upload imagem (opcional): variantes + FTP em background
+    _queue_image(image_file, show_id, slug, "Show criado")
 
     flash("Show criado ✅", "success")
     return redirect(url_for("admin_shows.shows_list"))
@@ -237,18 +191,12 @@ def shows_update(show_id: int):
         # (recomendação) não mudar slug automaticamente
         # sh.slug = slugify(name)
 
-        # upload imagem (opcional)
-        if image_file and image_file.filename:
-            try:
-                img_url = _save_show_image_to_ftp(file_storage=image_file, show_slug=sh.slug)
-                if hasattr(sh, "image_url"):
-                    sh.image_url = img_url
-            except Exception as e:
-                current_app.logger.warning("[SHOW IMAGE] upload falhou: %s", e)
-                flash(f"Show atualizado, mas a imagem não subiu: {e}", "error")
-
         s.add(sh)
         s.commit()
+        slug = sh.slug
+
+    # upload imagem (opcional): variantes + FTP em background
+    _queue_image(image_file, show_id, slug, "Show atualizado")
 
     flash("Show atualizado ✅", "success")
     return redirect(url_for("admin_shows.shows_list"))
@@ -14,7 +14,7 @@ def admin_tickets_table():
     q = (request.args.get("q") or "").strip().lower()
 
     with db() as s:
-        tickets = list(s.scalars(select(Ticket).order_by(desc(Ticket.id)).limit(600)))
+        tickets = list(s.scalars(select(Ticket).where(Ticket.status != "pending").order_by(desc(Ticket.id)).limit(600)))
 
         purchase_ids = sorted({t.purchase_id for t in tickets if t.purchase_id})
         purchases_map = {}
@@ -5,11 +5,12 @@ from datetime import datetime
 from pathlib import Path
 from zoneinfo import ZoneInfo
 
-from flask import Blueprint, render_template, abort, url_for
+from flask import Blueprint, render_template, abort, request, url_for
 from sqlalchemy import select, desc as sa_desc
 
 from db import db
 from models import Event, Show
+from app_services import show_images
 
 bp_home = Blueprint("home", __name__)
 
@@ -140,6 +141,15 @@ def _parse_show_datetime(date_text: str) -> datetime | None:
     return None
 
 
+@bp_home.after_app_request
+def _cache_show_images(resp):
+    """Fotos locais dos shows (static/shows/*) mudam raramente: cache de 1 dia."""
+    if request.endpoint == "static" and (request.view_args or {}).get("filename", "").startswith("shows/"):
+        resp.cache_control.public = True
+        resp.cache_control.max_age = int(os.getenv("SHOW_IMAGE_MAX_AGE", "86400"))
+    return resp
+
+
 @bp_home.get("/")
 def home():
     event_slug = (os.getenv("DEFAULT_EVENT_SLUG") or "sons-e-sabores").strip()
@@ -178,6 +188,11 @@ def home():
         if not img_url:
             img_url = _static_show_image_url(sh.slug)
 
+        # ✅ variantes responsivas (WebP + JPEG) quando já processadas
+        variants = show_images.variants_of(sh)
+        img_srcset_webp = show_images.srcset(variants["webp"]) if variants else ""
+        img_srcset_jpeg = show_images.srcset(variants["jpeg"]) if variants else ""
+
         cards.append({
             "name": title,
             "original_name": sh.name,
@@ -190,6 +205,10 @@ def home():
             "subtitle": subtitle,
             "desc": description,
             "img": img_url,
+            "img_srcset_webp": img_srcset_webp,
+            "img_srcset_jpeg": img_srcset_jpeg,
+            "img_w": variants["w"] if variants else None,
+            "img_h": variants["h"] if variants else None,
         })
 
     # ORDEM:
@@ -9,6 +9,7 @@ from sqlalchemy import select, desc
 
 from db import db
 from models import Purchase, Payment
+from app_services import purchase_state
 
 bp_mp = Blueprint("mp", __name__)
 
@@ -171,7 +172,14 @@ def mp_webhook():
             payment.provider = "mercadopago"
             payment.external_id = str(mp_payment.get("id") or payment.external_id)
 
-            purchase.status = "paid"
+            try:
+                purchase_state.transition(s, purchase, "paid", actor="webhook:mp")
+            except purchase_state.InvalidTransition as e:
+                # o dinheiro entrou (pagamento fica registrado), mas a compra não pode
+                # virar paga (ex.: cancelada): não finaliza, o admin resolve
+                s.commit()
+                current_app.logger.warning("[MP WEBHOOK] %s token=%s", e, purchase_token)
+                return {"ok": True}
             s.add(payment)
             s.add(purchase)
             s.commit()
@@ -1,18 +1,24 @@
 # routes/purchase.py
 import os
+import hashlib
 import secrets
 from datetime import datetime, timedelta
 from zoneinfo import ZoneInfo
 from pathlib import Path
 
 from werkzeug.utils import secure_filename
-from flask import Blueprint, abort, flash, redirect, render_template, request, url_for, current_app
-from sqlalchemy import select, desc, func
+from flask import Blueprint, abort, flash, redirect, render_template, request, url_for, current_app, Response, jsonify
+from sqlalchemy import select, desc
+from sqlalchemy.orm import undefer
 
 from db import db
 from models import Event, Purchase, Payment, Show
 from app_services.email_service import send_email
 from app_services.email_templates import build_reservation_received_email
+from app_services.pix_brcode import manual_pix_payload, render_qr_png
+from app_services.live_feed import publish
+from app_services.receipts_store import MIME_BY_EXT, find_receipt, optimize_image, save_stream
+from app_services import background, expiry, occupancy, prerender, purchase_state
 
 bp_purchase = Blueprint("purchase", __name__)
 
@@ -91,6 +97,7 @@ def _status_label(st: str, *, admin: bool = False) -> str:
             "reserved": "Reserva confirmada ✅",
             "cancelled": "Cancelada ❌",
             "failed": "Falhou / expirada",
+            "expired": "Expirada (prazo encerrado)",
         }
     else:
         labels = {
@@ -101,6 +108,7 @@ def _status_label(st: str, *, admin: bool = False) -> str:
             "reserved": "Reserva confirmada ✅",
             "cancelled": "Reserva cancelada",
             "failed": "Falhou / expirada",
+            "expired": "Prazo encerrado (lugares liberados)",
         }
     return labels.get(st, st or "—")
 
@@ -175,6 +183,20 @@ def buy(event_slug: str):
         show_couverts_map=show_couverts_map,  # ✅ novo
         preselect_slug=preselect_slug,
     )
+
+
+def _admit(s, purchase: Purchase, cap: int) -> bool:
+    """
+    Loga a criação (o contador do show sobe e fica travado até o commit) e
+    confere a lotação de novo. Estourou (corrida com outra compra) -> rollback.
+    """
+    purchase_state.record_created(s, purchase, actor="buyer")
+    if cap > 0 and occupancy.current(s, purchase.event_id, purchase.show_name) > cap:
+        s.rollback()
+        return False
+    return True
+
+
 @bp_purchase.post("/buy/<event_slug>")
 def buy_post(event_slug: str):
     base_url = (os.getenv("BASE_URL") or "").strip().rstrip("/")
@@ -262,26 +284,12 @@ def buy_post(event_slug: str):
         # =========================================================
         # ✅ LOTAÇÃO (capacity) — corrigido (indent + filtro por event)
         # =========================================================
+        # contador por show (app_services/occupancy.py) em vez de SUM nas compras;
+        # conferido de novo depois de entrar (_admit), com a linha do show travada
         cap = int(getattr(sh, "capacity", 0) or 0)
-        if cap > 0:
-            used = s.scalar(
-                select(func.coalesce(func.sum(Purchase.ticket_qty), 0))
-                .where(
-                    Purchase.event_id == ev.id,
-                    Purchase.show_name == show_name,
-                    Purchase.status.in_([
-                        "reservation_pending",
-                        "reservation_pending_price",
-                        "pending_payment",
-                        "paid",
-                        "reserved",
-                    ]),
-                )
-            ) or 0
-
-            if used + total_people > cap:
-                flash("Este show já atingiu a lotação. Selecione outra atração.", "error")
-                return redirect(url_for("purchase.buy", event_slug=event_slug))
+        if cap > 0 and occupancy.current(s, ev.id, show_name) + total_people > cap:
+            flash("Este show já atingiu a lotação. Selecione outra atração.", "error")
+            return redirect(url_for("purchase.buy", event_slug=event_slug))
 
         # =========================================================
         # ✅ DEDUPE (evita clique duplo) — com horário SP
@@ -327,6 +335,11 @@ def buy_post(event_slug: str):
                 ticket_unit_price_cents=0,
             )
             s.add(purchase)
+            s.flush()
+            if not _admit(s, purchase, cap):
+                flash("Este show já atingiu a lotação. Selecione outra atração.", "error")
+                return redirect(url_for("purchase.buy", event_slug=event_slug))
+            publish(s, purchase, "created")
             s.commit()
 
             send_reservation_notification(purchase)
@@ -351,12 +364,9 @@ def buy_post(event_slug: str):
                 purchase.reservation_received_email_sent_at = now_sp()
                 purchase.reservation_received_email_sent_to = buyer_email
                 purchase.reservation_received_email_last_error = None
-                s.add(purchase)
-                s.commit()
             except Exception as e:
                 purchase.reservation_received_email_last_error = str(e)[:2000]
-                s.add(purchase)
-                s.commit()
+            s.commit()
 
             flash("Reserva enviada ✅ Você receberá a confirmação por e-mail.", "success")
 
@@ -384,6 +394,11 @@ def buy_post(event_slug: str):
                 ticket_unit_price_cents=0,
             )
             s.add(purchase)
+            s.flush()
+            if not _admit(s, purchase, cap):
+                flash("Este show já atingiu a lotação. Selecione outra atração.", "error")
+                return redirect(url_for("purchase.buy", event_slug=event_slug))
+            publish(s, purchase, "created")
             s.commit()
 
             send_reservation_notification(purchase)
@@ -407,12 +422,9 @@ def buy_post(event_slug: str):
                 purchase.reservation_received_email_sent_at = now_sp()
                 purchase.reservation_received_email_sent_to = buyer_email
                 purchase.reservation_received_email_last_error = None
-                s.add(purchase)
-                s.commit()
             except Exception as e:
                 purchase.reservation_received_email_last_error = str(e)[:2000]
-                s.add(purchase)
-                s.commit()
+            s.commit()
 
             if auto_whats:
                 return redirect(url_for("purchase.purchase_status", token=purchase.token, wa="1"))
@@ -440,7 +452,10 @@ def buy_post(event_slug: str):
             ticket_unit_price_cents=unit_price_cents,  # ✅ preço do show congelado
         )
         s.add(purchase)
-        s.commit()
+        s.flush()  # ✅ id da compra sem fechar a transação (1 commit para compra + pagamento)
+        if not _admit(s, purchase, cap):
+            flash("Este show já atingiu a lotação. Selecione outra atração.", "error")
+            return redirect(url_for("purchase.buy", event_slug=event_slug))
 
         payment = Payment(
             purchase_id=purchase.id,
@@ -449,12 +464,31 @@ def buy_post(event_slug: str):
             currency="BRL",
             status="pending",
             external_id=None,
+            expires_at=expiry.manual_pix_expires_at(),  # ✅ sem isso ficava pendente para sempre
         )
         s.add(payment)
+        publish(s, purchase, "created")
         s.commit()
 
         send_reservation_notification(purchase)
+
+        # ✅ adianta a renderização dos ingressos enquanto o Pix não é confirmado
+        prerender.enqueue(purchase.id)
         return redirect(url_for("purchase.pay_manual", token=purchase.token))
+
+
+def _pix_payload_for(purchase: Purchase, payment: Payment | None) -> str:
+    """
+    Pix copia e cola da compra:
+    - se o provedor (PagBank) já emitiu o código, usa ele;
+    - senão gera localmente (BR Code) com valor e txid da compra.
+    """
+    if not payment:
+        return ""
+    if (payment.qr_text or "").strip():
+        return payment.qr_text.strip()
+    return manual_pix_payload(amount_cents=payment.amount_cents, token=purchase.token)
+
 # ---------------------------
 # PÁGINA PIX MANUAL + UPLOAD
 # ---------------------------
@@ -465,8 +499,6 @@ def pay_manual(token: str):
     receiver = (os.getenv("PIX_MANUAL_RECEIVER_NAME") or "").strip()
     bank = (os.getenv("PIX_MANUAL_BANK") or "").strip()
 
-    qr_image_url = url_for("static", filename="pix_qr.png") if os.path.exists("static/pix_qr.png") else ""
-
     with db() as s:
         purchase = s.scalar(select(Purchase).where(Purchase.token == token))
         if not purchase:
@@ -478,10 +510,22 @@ def pay_manual(token: str):
         if st != "pending_payment":
             return redirect(url_for("purchase.purchase_status", token=purchase.token))
 
-        payment = s.scalar(select(Payment).where(Payment.purchase_id == purchase.id).order_by(desc(Payment.id)))
+        payment = s.scalar(
+            select(Payment)
+            .options(undefer(Payment.qr_text))
+            .where(Payment.purchase_id == purchase.id)
+            .order_by(desc(Payment.id))
+        )
         if not payment:
             return redirect(url_for("purchase.purchase_status", token=purchase.token))
 
+    # ✅ QR com o valor exato da compra (BR Code local); fallback: imagem estática
+    pix_payload = _pix_payload_for(purchase, payment)
+    if pix_payload:
+        qr_image_url = url_for("purchase.pix_qr_png", token=purchase.token)
+    else:
+        qr_image_url = url_for("static", filename="pix_qr.png") if os.path.exists("static/pix_qr.png") else ""
+
     max_mb = int(os.getenv("RECEIPT_MAX_MB", "6"))
     unit_price_cents = int(purchase.ticket_unit_price_cents or int(os.getenv("TICKET_PRICE_CENTS", "5000")))
     unit_price_brl = unit_price_cents / 100
@@ -492,6 +536,7 @@ def pay_manual(token: str):
         purchase=purchase,
         payment=payment,
         pix_key=pix_key,
+        pix_payload=pix_payload,
         qr_image_url=qr_image_url,
         whatsapp_number=whatsapp_number,
         receiver=receiver,
@@ -503,6 +548,88 @@ def pay_manual(token: str):
         ticket_qty=ticket_qty,
     )
 
+@bp_purchase.get("/pix/qr/<token>.png")
+def pix_qr_png(token: str):
+    """PNG do QR Pix da compra (gerado sob demanda, cache em memória + HTTP)."""
+    with db() as s:
+        purchase = s.scalar(select(Purchase).where(Purchase.token == token))
+        if not purchase:
+            abort(404)
+        payment = s.scalar(
+            select(Payment)
+            .options(undefer(Payment.qr_text))
+            .where(Payment.purchase_id == purchase.id)
+            .order_by(desc(Payment.id))
+        )
+
+    payload = _pix_payload_for(purchase, payment)
+    if not payload:
+        abort(404)
+
+    resp = Response(render_qr_png(payload), mimetype="image/png")
+    resp.set_etag(hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16])
+    resp.headers["Cache-Control"] = "private, max-age=300"
+    return resp.make_conditional(request)
+
+def _send_receipt_notification(payment_id: int, filename: str) -> None:
+    """
+    Job: reduz a foto do comprovante e avisa RECEIPT_TO_EMAIL.
+    Anexa o arquivo se couber em RECEIPT_ATTACH_MAX_MB; senão manda o link do admin.
+    """
+    to_email = (os.getenv("RECEIPT_TO_EMAIL") or "").strip()
+    if not to_email:
+        raise RuntimeError("RECEIPT_TO_EMAIL não configurado no Render.")
+
+    with db() as s:
+        payment = s.get(Payment, payment_id)
+        purchase = s.get(Purchase, payment.purchase_id) if payment else None
+    if not payment or not purchase or not payment.receipt_sha256:
+        return
+
+    storage_dir = current_app.config["STORAGE_DIR"]
+    try:
+        path = optimize_image(storage_dir, payment.receipt_sha256)
+    except Exception:
+        current_app.logger.exception("[RECEIPT] falha ao otimizar %s", payment.receipt_sha256)
+        path = find_receipt(storage_dir, payment.receipt_sha256)
+    if not path:
+        return
+
+    total_brl = (payment.amount_cents or 0) / 100
+    ticket_qty = int(purchase.ticket_qty or 1)
+    unit_brl = (int(purchase.ticket_unit_price_cents or 0) / 100)
+    base_url = (current_app.config.get("BASE_URL") or "").rstrip("/")
+    receipt_url = f"{base_url}/admin/receipts/{payment.receipt_sha256}"
+
+    subject = f"Comprovante PIX · {purchase.buyer_name} · {purchase.show_name}"
+    body = (
+        "Novo comprovante enviado pelo site.\n\n"
+        f"Show: {purchase.show_name}\n"
+        f"Comprador: {purchase.buyer_name}\n"
+        f"CPF: {purchase.buyer_cpf}\n"
+        f"Email: {purchase.buyer_email}\n"
+        f"Telefone: {purchase.buyer_phone}\n"
+        f"Token: {purchase.token}\n"
+        f"Ingressos/Pessoas: {ticket_qty} × R$ {unit_brl:.2f}\n"
+        f"Valor total: R$ {total_brl:.2f}\n"
+        f"Comprovante: {receipt_url}\n\n"
+        "Abra o painel Admin → Pendências/Compras para confirmar o pagamento.\n"
+        "Os ingressos serão enviados em até 72 horas.\n"
+    )
+
+    attachments = []
+    attach_max = int(float(os.getenv("RECEIPT_ATTACH_MAX_MB", "2")) * 1024 * 1024)
+    if path.stat().st_size <= attach_max:
+        ext = path.suffix.lstrip(".")
+        attachments.append({
+            "filename": f"{Path(filename).stem or 'comprovante'}.{ext}",
+            "content_type": MIME_BY_EXT.get(ext, "application/octet-stream"),
+            "data": path.read_bytes(),
+        })
+
+    send_email(to_email=to_email, subject=subject, body_text=body, attachments=attachments)
+
+
 @bp_purchase.post("/pay/manual/upload/<token>")
 def upload_receipt(token: str):
     with db() as s:
@@ -512,6 +639,9 @@ def upload_receipt(token: str):
         payment = s.scalar(select(Payment).where(Payment.purchase_id == purchase.id).order_by(desc(Payment.id)))
         if not payment:
             abort(404)
+        if (purchase.status or "").lower() == "expired":
+            flash("O prazo deste Pix terminou. Faça uma nova reserva ou fale com a gente.", "error")
+            return redirect(url_for("purchase.purchase_status", token=token))
 
     f = request.files.get("receipt_file")
     if not f or not f.filename:
@@ -534,54 +664,30 @@ def upload_receipt(token: str):
         flash("Formato inválido. Envie imagem ou PDF.", "error")
         return redirect(url_for("purchase.pay_manual", token=token))
 
-    tmp_dir = Path("/tmp/receipts").resolve()
-    tmp_dir.mkdir(parents=True, exist_ok=True)
-
-    safe = secure_filename(f.filename) or "comprovante"
-    tmp_path = tmp_dir / f"{token}-{safe}"
-    f.save(tmp_path)
-
-    to_email = (os.getenv("RECEIPT_TO_EMAIL") or "").strip()
-    if not to_email:
-        raise RuntimeError("RECEIPT_TO_EMAIL não configurado no Render.")
-
-    total_brl = (payment.amount_cents or 0) / 100
-    ticket_qty = int(purchase.ticket_qty or 1)
-    unit_brl = (int(purchase.ticket_unit_price_cents or 0) / 100)
-
-    subject = f"Comprovante PIX · {purchase.buyer_name} · {purchase.show_name}"
-    body = (
-        "Novo comprovante enviado pelo site.\n\n"
-        f"Show: {purchase.show_name}\n"
-        f"Comprador: {purchase.buyer_name}\n"
-        f"CPF: {purchase.buyer_cpf}\n"
-        f"Email: {purchase.buyer_email}\n"
-        f"Telefone: {purchase.buyer_phone}\n"
-        f"Token: {purchase.token}\n"
-        f"Ingressos/Pessoas: {ticket_qty} × R$ {unit_brl:.2f}\n"
-        f"Valor total: R$ {total_brl:.2f}\n\n"
-        "Abra o painel Admin → Pendências/Compras para confirmar o pagamento.\n"
-        "Os ingressos serão enviados em até 72 horas.\n"
-    )
+    # ✅ grava uma vez no store (em blocos, com hash); e-mail sai em background
+    try:
+        stored = save_stream(
+            f.stream,
+            storage_dir=current_app.config["STORAGE_DIR"],
+            content_type=mime,
+            max_bytes=max_bytes,
+        )
+    except ValueError:
+        flash(f"Arquivo muito grande (máx {max_mb}MB).", "error")
+        return redirect(url_for("purchase.pay_manual", token=token))
 
-    file_bytes = tmp_path.read_bytes()
-    attachments = [{
-        "filename": safe,
-        "content_type": mime or "application/octet-stream",
-        "data": file_bytes,
-    }]
-
-    send_email(
-        to_email=to_email,
-        subject=subject,
-        body_text=body,
-        attachments=attachments,
-    )
+    with db() as s:
+        pay2 = s.get(Payment, payment.id)
+        if pay2:
+            pay2.receipt_sha256 = stored["sha256"]
+            pay2.receipt_uploaded_at = now_sp()
+        p2 = s.get(Purchase, purchase.id)
+        if p2:
+            publish(s, p2, "receipt")
+        s.commit()
 
-    try:
-        tmp_path.unlink(missing_ok=True)
-    except Exception:
-        pass
+    safe = secure_filename(f.filename) or "comprovante"
+    background.enqueue(_send_receipt_notification, payment.id, safe)
 
     flash("Comprovante enviado ✅ Obrigado!", "success")
     return redirect(url_for("purchase.purchase_status", token=token))
@@ -604,3 +710,33 @@ def purchase_status(token: str):
         app_name=os.getenv("APP_NAME", "Sons & Sabores"),
     )
 
+
+
+# status em que o comprador ainda está esperando alguma ação nossa
+WAITING_STATUSES = {"reservation_pending", "reservation_pending_price", "pending_payment"}
+
+@bp_purchase.get("/api/status/<token>")
+def purchase_status_json(token: str):
+    """
+    Status compacto para polling da página /status/<token>.
+    ETag = versão do status da compra -> If-None-Match responde 304 sem corpo.
+    """
+    with db() as s:
+        row = s.execute(
+            select(Purchase.status, Purchase.status_version).where(Purchase.token == token)
+        ).first()
+    if not row:
+        abort(404)
+
+    status = (row.status or "").lower()
+    version = int(row.status_version or 0)
+
+    resp = jsonify({
+        "status": status,
+        "label": _status_label(status),
+        "version": version,
+        "waiting": status in WAITING_STATUSES,
+    })
+    resp.set_etag(f"v{version}")
+    resp.headers["Cache-Control"] = "no-cache"
+    return resp.make_conditional(request)
@@ -1,9 +1,10 @@
 # routes/tickets.py
 from flask import Blueprint, render_template, abort, redirect, url_for
-from sqlalchemy import select, desc
+from sqlalchemy import and_, select, desc
 import os
 from db import db
-from models import Purchase, Ticket, Payment
+from models import Purchase, Ticket, Payment, Show
+from app_services import ticket_sig
 from app_services.email_service import send_email
 
 bp_tickets = Blueprint("tickets", __name__)
@@ -53,3 +54,77 @@ def ticket_public(token: str):
         is_valid=is_valid,
         app_name=os.getenv("APP_NAME", "Sons & Sabores"),
     )
+
+
+def _signed_lookup(claims: dict):
+    """
+    (ticket, compra, válido) do QR assinado em 1 query, ou None se o ticket
+    não existe ou é de outro show (o show_id assinado tem que bater).
+    """
+    with db() as s:
+        row = s.execute(
+            select(Ticket, Purchase, Show.id)
+            .join(Purchase, Purchase.id == Ticket.purchase_id)
+            # shows.name não é único: casa pelo id assinado + nome do ticket (1 linha no máximo)
+            .outerjoin(Show, and_(Show.id == claims["show_id"], Show.name == Ticket.show_name))
+            .where(Ticket.id == claims["ticket_id"])
+        ).first()
+    # show_id 0 = show já não existia na emissão (show_id_for)
+    if not row or (row[2] is None and claims["show_id"] != 0):
+        return None
+    t, purchase, _ = row
+
+    # compra paga + ticket emitido (o pagamento já foi conferido na transição para "paid")
+    is_valid = (purchase.status or "").lower() == "paid" and (t.status or "").lower() == "issued"
+    return t, purchase, is_valid
+
+
+def _invalid_signed_page():
+    return render_template(
+        "ticket_public.html",
+        ticket=None,
+        purchase=None,
+        is_valid=False,
+        app_name=os.getenv("APP_NAME", "Sons & Sabores"),
+    ), 404
+
+
+@bp_tickets.get("/T/<payload>")
+def ticket_signed(payload: str):
+    """
+    QR assinado (app_services/ticket_sig.py): assinatura conferida sem banco;
+    QR falso/corrompido nem chega a consultar. Os válidos fazem 1 query
+    (ticket + compra + show) para mostrar nome e pegar cancelamento.
+    """
+    claims = ticket_sig.verify(payload)
+    if not claims:
+        return _invalid_signed_page()
+
+    found = _signed_lookup(claims)
+    if not found:
+        return _invalid_signed_page()
+    t, purchase, is_valid = found
+
+    return render_template(
+        "ticket_public.html",
+        ticket=t,
+        purchase=purchase,
+        is_valid=is_valid,
+        app_name=os.getenv("APP_NAME", "Sons & Sabores"),
+    )
+
+
+@bp_tickets.get("/T/<payload>/check")
+def ticket_signed_check(payload: str):
+    """
+    Leitor da portaria: QR falso sai sem query; o resto confere na mesma
+    query da página se o ticket ainda vale (cancelado/estornado = ok false).
+    """
+    claims = ticket_sig.verify(payload)
+    if not claims:
+        return {"ok": False}, 404
+    found = _signed_lookup(claims)
+    if not found:
+        return {"ok": False}, 404
+    t, purchase, is_valid = found
+    return {"ok": is_valid, **claims, "ticket_status": t.status, "purchase_status": purchase.status}
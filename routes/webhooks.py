@@ -1,10 +1,30 @@
 # Exemplo simples (ajuste conforme seu webhooks.py)
 from flask import request
 # routes/webhooks.py
+from datetime import datetime, timezone
+
 from flask import Blueprint, request, current_app
 
+from app_services.metrics import WEBHOOK_LAG
+
 bp_webhooks = Blueprint("webhooks", __name__)
 
+
+
+def _observe_lag(provider: str, created: str | None) -> None:
+    """Atraso entre o evento no provedor (date_created ISO) e a chegada aqui."""
+    if not created:
+        return
+    try:
+        dt = datetime.fromisoformat(str(created).replace("Z", "+00:00"))
+    except ValueError:
+        return
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    WEBHOOK_LAG.labels(provider=provider).observe(
+        max(0.0, (datetime.now(timezone.utc) - dt).total_seconds())
+    )
+
 # (Se tiver outros webhooks aqui, ficam abaixo)
 
 @bp_webhooks.post("/webhooks/mercadopago")
@@ -12,8 +32,11 @@ def mp_webhook():
     # Mercado Pago pode mandar eventos diferentes; normalmente você consulta o pagamento/preference
     data = request.get_json(silent=True) or {}
     current_app.logger.info("[MP WEBHOOK] %s", data)
+    _observe_lag("mercadopago", data.get("date_created"))
 
     # TODO: você vai precisar buscar detalhes no MP API (payment/preference)
     # e, ao confirmar approved/paid, setar:
-    # payment.status="paid"; payment.paid_at=...; purchase.status="paid"; chamar finalize_purchase
+    # payment.status="paid"; payment.paid_at=...;
+    # purchase_state.transition(s, purchase, "paid", actor="webhook:mp") (InvalidTransition -> só logar);
+    # chamar finalize_purchase
     return {"ok": True}
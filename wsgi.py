@@ -1,6 +1,7 @@
 # wsgi.py
 from app import create_app
 
+# ✅ única construção do app (app.py não cria mais no import)
 app = create_app()
 
 @app.get("/health")